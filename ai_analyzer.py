@@ -1,86 +1,188 @@
 import json
 import os
 import pandas as pd
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 import streamlit as st
 from google import genai
 from google.genai import types
+from cassette import Cassette
+from prompt_encoding import (
+    PromptSection, build_prompt, count_levels, encode_date_range, encode_labels,
+    encode_mapping, hourly_levels
+)
+from singleflight import get_single_flight
+from utils import notify
 
 class AIAnalyzer:
     """Handles AI-powered analysis of flight data using Google Gemini"""
     
     def __init__(self):
         self.gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
+        self.model = "gemini-2.5-flash"
+        
+        # Record/replay of raw Gemini responses (FLIGHT_CASSETTE_MODE)
+        self.cassette = Cassette.from_env()
+        
         if self.gemini_api_key:
             self.client = genai.Client(api_key=self.gemini_api_key)
         else:
             self.client = None
-            st.warning("Gemini API key not found. AI analysis features will be limited.")
+            if not self.cassette.replaying:
+                st.warning("Gemini API key not found. AI analysis features will be limited.")
+    
+    @property
+    def ai_enabled(self) -> bool:
+        """Whether Gemini responses are available, live or from a replay cassette"""
+        return self.client is not None or self.cassette.replaying
+    
+    def _generate(self, call: str, prompt: str, usage: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        Run a prompt through Gemini, recording or replaying the response text
+        
+        Prompts embed data-dependent values such as timestamps, so replay falls
+        back to the latest recording for the same call when the exact prompt
+        was never recorded. Concurrent identical prompts share one request.
+        Token counts reported by the API are added to usage[call].
+        """
+        key = Cassette.request_key("gemini", self.model, {"contents": prompt})
+        alias = f"gemini:{call}"
+        
+        if self.cassette.replaying:
+            body = self.cassette.replay(key, alias=alias)
+            if body is None:
+                raise RuntimeError(f"No recorded Gemini response for '{call}' (cassette replay mode)")
+            return body.decode("utf-8")
+        
+        def generate():
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=prompt
+            )
+            text = response.text or ""
+            
+            if self.cassette.recording:
+                self.cassette.record(key, text.encode("utf-8"), alias=alias)
+            
+            metadata = response.usage_metadata
+            tokens = {
+                'prompt_tokens': getattr(metadata, 'prompt_token_count', None),
+                'response_tokens': getattr(metadata, 'candidates_token_count', None)
+            }
+            return text, tokens
+        
+        # Sessions analyzing the same dataset build identical prompts; share one call
+        text, tokens = get_single_flight("gemini").do(key, generate)
+        if usage is not None:
+            usage.setdefault(call, {}).update(tokens)
+        return text
     
-    def analyze_flight_data(self, df: pd.DataFrame, analysis_types: List[str]) -> Dict[str, Any]:
+    def analyze_flight_data(self, df: pd.DataFrame, analysis_types: List[str],
+                            route_flights: Optional[pd.DataFrame] = None,
+                            demand_forecast: Optional[Dict[str, Any]] = None,
+                            history_summary: Optional[Dict[str, Any]] = None,
+                            progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
         """
         Analyze flight data using AI to extract insights
         
         Args:
             df: Flight data DataFrame
             analysis_types: List of analysis types to perform
+            route_flights: Flights with origin/destination to use for route
+                statistics when df has none (e.g. reconstructed OpenSky flights)
+            demand_forecast: Local forecast summary from forecasting.summarize_forecast
+            history_summary: Long-range summary from flight_history.rollup_summary,
+                used instead of statistics over df where present
+            progress: Called as progress(stage, done, total) before each
+                Gemini call; may raise to stop the analysis there
             
         Returns:
             Dictionary containing analysis results
         """
-        if not self.client:
-            return self._generate_basic_analysis(df, analysis_types)
+        if route_flights is None and 'origin' in df.columns and 'destination' in df.columns:
+            route_flights = df
+        
+        if not self.ai_enabled:
+            return self._generate_basic_analysis(df, analysis_types, route_flights, demand_forecast)
         
         try:
             # Prepare data summary for AI analysis
-            data_summary = self._prepare_data_summary(df)
+            data_summary = self._prepare_data_summary(df, route_flights, history_summary)
+            if demand_forecast:
+                data_summary['demand_forecast'] = demand_forecast
             
             results = {}
+            usage: Dict[str, Dict[str, Any]] = {}
+            
+            # Gemini calls to make, for progress reporting
+            calls = sum(t in analysis_types for t in ("Route Popularity", "Demand Trends", "Peak Hours")) + 2
+            done = 0
+            
+            def step(stage: str) -> None:
+                nonlocal done
+                if progress is not None:
+                    progress(stage, done, calls)
+                done += 1
             
             # Perform different types of analysis
             if "Route Popularity" in analysis_types:
-                results['popular_routes'] = self._analyze_route_popularity(data_summary)
+                step("Analyzing route popularity")
+                results['popular_routes'] = self._analyze_route_popularity(data_summary, usage)
             
             if "Demand Trends" in analysis_types:
-                results['demand_patterns'] = self._analyze_demand_trends(data_summary)
+                step("Analyzing demand trends")
+                results['demand_patterns'] = self._analyze_demand_trends(data_summary, usage)
             
             if "Peak Hours" in analysis_types:
-                results['peak_hours'] = self._analyze_peak_hours(data_summary)
+                step("Analyzing peak hours")
+                results['peak_hours'] = self._analyze_peak_hours(data_summary, usage)
             
             if "Aircraft Types" in analysis_types:
                 results['aircraft_analysis'] = self._analyze_aircraft_types(data_summary)
             
             # Generate overall market trends
-            results['market_trends'] = self._generate_market_trends(data_summary)
+            step("Generating market trends")
+            results['market_trends'] = self._generate_market_trends(data_summary, usage)
             
             # Generate recommendations
-            results['recommendations'] = self._generate_recommendations(data_summary)
+            step("Generating recommendations")
+            results['recommendations'] = self._generate_recommendations(data_summary, usage)
             
             # Extract key metrics
-            results['key_metrics'] = self._extract_key_metrics(df)
+            results['key_metrics'] = self._extract_key_metrics(df, history_summary)
+            
+            # Prompt size per call: estimated tokens, trimming, and API counts when live
+            results['token_usage'] = usage
             
             return results
             
         except Exception as e:
-            st.error(f"Error in AI analysis: {str(e)}")
-            return self._generate_basic_analysis(df, analysis_types)
+            notify('error', f"Error in AI analysis: {str(e)}")
+            return self._generate_basic_analysis(df, analysis_types, route_flights, demand_forecast)
     
-    def _prepare_data_summary(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Prepare a summary of the data for AI analysis"""
-        summary = {
-            'total_flights': len(df),
-            'data_columns': list(df.columns),
-            'date_range': {
-                'start': df['timestamp'].min().isoformat() if 'timestamp' in df.columns else None,
-                'end': df['timestamp'].max().isoformat() if 'timestamp' in df.columns else None
+    def _prepare_data_summary(self, df: pd.DataFrame, route_flights: Optional[pd.DataFrame] = None,
+                              history_summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Prepare a summary of the data for AI analysis, from the rollups when given"""
+        if history_summary:
+            summary = {'data_columns': list(df.columns), **history_summary}
+        else:
+            summary = {
+                'total_flights': len(df),
+                'data_columns': list(df.columns),
+                'date_range': {
+                    'start': df['timestamp'].min().isoformat() if 'timestamp' in df.columns else None,
+                    'end': df['timestamp'].max().isoformat() if 'timestamp' in df.columns else None
+                }
             }
-        }
         
         # Add route information if available
-        if 'origin' in df.columns and 'destination' in df.columns:
-            df['route'] = df['origin'] + ' → ' + df['destination']
-            top_routes = df['route'].value_counts().head(10).to_dict()
+        if 'top_routes' not in summary and route_flights is not None and not route_flights.empty:
+            routes = route_flights['origin'] + ' → ' + route_flights['destination']
+            top_routes = routes.value_counts().head(10).to_dict()
             summary['top_routes'] = top_routes
+            summary['route_flights'] = len(route_flights)
+        
+        if history_summary:
+            return summary
         
         # Add country information
         if 'origin_country' in df.columns:
@@ -94,82 +196,98 @@ class AIAnalyzer:
         
         # Add time-based patterns
         if 'timestamp' in df.columns:
-            df['hour'] = df['timestamp'].dt.hour
-            hourly_distribution = df['hour'].value_counts().sort_index().to_dict()
+            hourly_distribution = df['timestamp'].dt.hour.value_counts().sort_index().to_dict()
             summary['hourly_distribution'] = hourly_distribution
         
         return summary
     
-    def _analyze_route_popularity(self, data_summary: Dict[str, Any]) -> str:
+    def _prompt(self, call: str, intro: str, sections: List[PromptSection], request: str,
+                usage: Optional[Dict[str, Dict[str, Any]]]) -> str:
+        """Build a prompt within the token budget, noting its size in usage"""
+        prompt, tokens, trimmed = build_prompt(intro, sections, request)
+        if usage is not None:
+            usage[call] = {'estimated_tokens': tokens, 'trimmed': trimmed}
+        return prompt
+    
+    def _analyze_route_popularity(self, data_summary: Dict[str, Any],
+                                  usage: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
         """Analyze route popularity using AI"""
-        if not self.client:
+        if not self.ai_enabled:
             return "AI analysis not available. Please check API key configuration."
         
         try:
-            prompt = f"""
-            Analyze the following flight route data and provide insights about route popularity:
-
-            Data Summary:
-            - Total flights: {data_summary.get('total_flights', 0)}
-            - Top routes: {data_summary.get('top_routes', {})}
-            - Top countries: {data_summary.get('top_countries', {})}
-
-            Please provide:
-            1. Analysis of the most popular routes
-            2. Market demand patterns
-            3. Geographic distribution insights
-            4. Competitive landscape observations
-            
-            Keep the analysis concise and actionable for a hostel business looking to understand travel patterns.
-            """
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            prompt = self._prompt(
+                "route_popularity",
+                "Analyze the following flight route data and provide insights about route popularity. "
+                "Counts are 'label flights share%'.",
+                [
+                    PromptSection("Total flights", [str(data_summary.get('total_flights', 0))], priority=3),
+                    PromptSection("Top routes", count_levels(
+                        data_summary.get('top_routes', {}), data_summary.get('route_flights')
+                    ), priority=2),
+                    PromptSection("Top countries", count_levels(
+                        data_summary.get('top_countries', {}), data_summary.get('total_flights')
+                    ), priority=1)
+                ],
+                "Please provide:\n"
+                "1. Analysis of the most popular routes\n"
+                "2. Market demand patterns\n"
+                "3. Geographic distribution insights\n"
+                "4. Competitive landscape observations\n"
+                "Keep the analysis concise and actionable for a hostel business looking to understand travel patterns.",
+                usage
             )
             
-            return response.text or "No analysis generated"
+            return self._generate("route_popularity", prompt, usage) or "No analysis generated"
             
         except Exception as e:
             return f"Error analyzing route popularity: {str(e)}"
     
-    def _analyze_demand_trends(self, data_summary: Dict[str, Any]) -> str:
+    def _analyze_demand_trends(self, data_summary: Dict[str, Any],
+                               usage: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
         """Analyze demand trends using AI"""
-        if not self.client:
+        if not self.ai_enabled:
             return "AI analysis not available. Please check API key configuration."
         
         try:
-            prompt = f"""
-            Analyze the following flight demand data and identify trends:
-
-            Data Summary:
-            - Total flights: {data_summary.get('total_flights', 0)}
-            - Date range: {data_summary.get('date_range', {})}
-            - Hourly distribution: {data_summary.get('hourly_distribution', {})}
-            - Top airlines: {data_summary.get('top_airlines', {})}
-
-            Please provide:
-            1. Demand trend analysis
-            2. Peak vs off-peak patterns
-            3. Seasonal considerations
-            4. Market opportunity identification
-            
-            Focus on actionable insights for hospitality businesses.
-            """
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            forecast = data_summary.get('demand_forecast')
+            prompt = self._prompt(
+                "demand_trends",
+                "Analyze the following flight demand data and identify trends. "
+                "Counts are 'label flights share%'.",
+                [
+                    PromptSection("Total flights", [str(data_summary.get('total_flights', 0))], priority=4),
+                    PromptSection("Date range", [encode_date_range(data_summary.get('date_range', {}))], priority=4),
+                    PromptSection("Flights by hour", hourly_levels(
+                        data_summary.get('hourly_distribution', {})
+                    ), priority=3),
+                    PromptSection("Top airlines", count_levels(
+                        data_summary.get('top_airlines', {}), data_summary.get('total_flights')
+                    ), priority=1),
+                    PromptSection("Local statistical forecast (hour-of-week baseline)", [
+                        encode_mapping(forecast),
+                        encode_mapping(forecast, skip=('recent_anomalies',)),
+                        ""
+                    ] if forecast else [""], priority=2)
+                ],
+                "Please provide:\n"
+                "1. Demand trend analysis\n"
+                "2. Peak vs off-peak patterns\n"
+                "3. Seasonal considerations\n"
+                "4. Market opportunity identification\n"
+                "Focus on actionable insights for hospitality businesses.",
+                usage
             )
             
-            return response.text or "No analysis generated"
+            return self._generate("demand_trends", prompt, usage) or "No analysis generated"
             
         except Exception as e:
             return f"Error analyzing demand trends: {str(e)}"
     
-    def _analyze_peak_hours(self, data_summary: Dict[str, Any]) -> str:
+    def _analyze_peak_hours(self, data_summary: Dict[str, Any],
+                            usage: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
         """Analyze peak hours using AI"""
-        if not self.client:
+        if not self.ai_enabled:
             return "Peak hours analysis not available without AI."
         
         try:
@@ -178,108 +296,96 @@ class AIAnalyzer:
             if not hourly_data:
                 return "No hourly data available for peak hours analysis."
             
-            prompt = f"""
-            Analyze the following hourly flight distribution data:
-
-            Hourly Distribution: {hourly_data}
-
-            Please provide:
-            1. Identification of peak hours
-            2. Low-demand periods
-            3. Business implications for hospitality
-            4. Recommended strategies based on patterns
-            
-            Be specific about timing and provide actionable recommendations.
-            """
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            prompt = self._prompt(
+                "peak_hours",
+                "Analyze the following hourly flight distribution data.",
+                [
+                    PromptSection("Flights by hour", hourly_levels(hourly_data, top=8)[:-1])
+                ],
+                "Please provide:\n"
+                "1. Identification of peak hours\n"
+                "2. Low-demand periods\n"
+                "3. Business implications for hospitality\n"
+                "4. Recommended strategies based on patterns\n"
+                "Be specific about timing and provide actionable recommendations.",
+                usage
             )
             
-            return response.text or "No analysis generated"
+            return self._generate("peak_hours", prompt, usage) or "No analysis generated"
             
         except Exception as e:
             return f"Error analyzing peak hours: {str(e)}"
     
     def _analyze_aircraft_types(self, data_summary: Dict[str, Any]) -> str:
         """Analyze aircraft types if data is available"""
-        if not self.client:
+        if not self.ai_enabled:
             return "Aircraft analysis not available without AI."
         
         return "Aircraft type analysis requires more detailed flight data. Consider upgrading data sources for comprehensive aircraft insights."
     
-    def _generate_market_trends(self, data_summary: Dict[str, Any]) -> str:
+    def _generate_market_trends(self, data_summary: Dict[str, Any],
+                                usage: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
         """Generate overall market trends analysis"""
-        if not self.client:
+        if not self.ai_enabled:
             return "Market trends analysis not available without AI."
         
         try:
-            prompt = f"""
-            Based on the following aviation data, provide a comprehensive market trends analysis:
-
-            Flight Data Summary:
-            - Total flights analyzed: {data_summary.get('total_flights', 0)}
-            - Geographic coverage: {list(data_summary.get('top_countries', {}).keys())[:5]}
-            - Major routes: {list(data_summary.get('top_routes', {}).keys())[:5]}
-            - Time period: {data_summary.get('date_range', {})}
-
-            Please provide:
-            1. Overall market health assessment
-            2. Growth indicators
-            3. Competitive landscape
-            4. Future outlook
-            5. Strategic recommendations for hospitality businesses
-
-            Make it relevant for a hostel chain looking to understand travel patterns.
-            """
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            prompt = self._prompt(
+                "market_trends",
+                "Based on the following aviation data, provide a comprehensive market trends analysis.",
+                [
+                    PromptSection("Total flights analyzed", [str(data_summary.get('total_flights', 0))], priority=3),
+                    PromptSection("Geographic coverage", [encode_labels(data_summary.get('top_countries', {}), 5)], priority=1),
+                    PromptSection("Major routes", [encode_labels(data_summary.get('top_routes', {}), 5)], priority=2),
+                    PromptSection("Time period", [encode_date_range(data_summary.get('date_range', {}))], priority=3)
+                ],
+                "Please provide:\n"
+                "1. Overall market health assessment\n"
+                "2. Growth indicators\n"
+                "3. Competitive landscape\n"
+                "4. Future outlook\n"
+                "5. Strategic recommendations for hospitality businesses\n"
+                "Make it relevant for a hostel chain looking to understand travel patterns.",
+                usage
             )
             
-            return response.text or "No analysis generated"
+            return self._generate("market_trends", prompt, usage) or "No analysis generated"
             
         except Exception as e:
             return f"Error generating market trends: {str(e)}"
     
-    def _generate_recommendations(self, data_summary: Dict[str, Any]) -> str:
+    def _generate_recommendations(self, data_summary: Dict[str, Any],
+                                  usage: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
         """Generate actionable recommendations"""
-        if not self.client:
+        if not self.ai_enabled:
             return "Recommendations not available without AI."
         
         try:
-            prompt = f"""
-            Based on the aviation market data analysis, provide specific recommendations for a hostel chain:
-
-            Key Data Points:
-            - Flight volume: {data_summary.get('total_flights', 0)} flights analyzed
-            - Top destinations: {list(data_summary.get('top_countries', {}).keys())[:3]}
-            - Popular routes: {list(data_summary.get('top_routes', {}).keys())[:3]}
-
-            Please provide:
-            1. Location strategy recommendations
-            2. Pricing optimization suggestions
-            3. Marketing timing recommendations
-            4. Capacity planning insights
-            5. Partnership opportunities
-
-            Make recommendations specific and actionable.
-            """
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            prompt = self._prompt(
+                "recommendations",
+                "Based on the aviation market data analysis, provide specific recommendations for a hostel chain.",
+                [
+                    PromptSection("Flights analyzed", [str(data_summary.get('total_flights', 0))], priority=3),
+                    PromptSection("Top destinations", [encode_labels(data_summary.get('top_countries', {}), 3)], priority=1),
+                    PromptSection("Popular routes", [encode_labels(data_summary.get('top_routes', {}), 3)], priority=2)
+                ],
+                "Please provide:\n"
+                "1. Location strategy recommendations\n"
+                "2. Pricing optimization suggestions\n"
+                "3. Marketing timing recommendations\n"
+                "4. Capacity planning insights\n"
+                "5. Partnership opportunities\n"
+                "Make recommendations specific and actionable.",
+                usage
             )
             
-            return response.text or "No recommendations generated"
+            return self._generate("recommendations", prompt, usage) or "No recommendations generated"
             
         except Exception as e:
             return f"Error generating recommendations: {str(e)}"
     
-    def _extract_key_metrics(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Extract key metrics from the data"""
+    def _extract_key_metrics(self, df: pd.DataFrame, history_summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Extract key metrics from the data, with totals over the rollups when given"""
         metrics = {}
         
         try:
@@ -300,21 +406,27 @@ class AIAnalyzer:
                 date_range = (df['timestamp'].max() - df['timestamp'].min()).days
                 metrics['Date Range (Days)'] = max(1, date_range)
             
+            if history_summary:
+                metrics['Total Flights'] = history_summary['total_flights']
+                metrics['Date Range (Days)'] = history_summary['days']
+            
             return metrics
             
         except Exception as e:
-            st.error(f"Error extracting metrics: {str(e)}")
+            notify('error', f"Error extracting metrics: {str(e)}")
             return {'Total Records': len(df)}
     
-    def _generate_basic_analysis(self, df: pd.DataFrame, analysis_types: List[str]) -> Dict[str, Any]:
+    def _generate_basic_analysis(self, df: pd.DataFrame, analysis_types: List[str],
+                                 route_flights: Optional[pd.DataFrame] = None,
+                                 demand_forecast: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Generate basic analysis without AI when API is not available"""
         results = {}
         
         try:
             # Basic route analysis
-            if "Route Popularity" in analysis_types and 'origin' in df.columns and 'destination' in df.columns:
-                df['route'] = df['origin'] + ' → ' + df['destination']
-                top_routes = df['route'].value_counts().head(5)
+            if "Route Popularity" in analysis_types and route_flights is not None and not route_flights.empty:
+                routes = route_flights['origin'] + ' → ' + route_flights['destination']
+                top_routes = routes.value_counts().head(5)
                 results['popular_routes'] = f"Top routes by frequency:\n" + "\n".join([f"• {route}: {count} flights" for route, count in top_routes.items()])
             
             # Basic demand analysis
@@ -326,6 +438,14 @@ class AIAnalyzer:
                     results['demand_patterns'] = f"Average daily flights: {avg_daily:.1f}\nTotal flights analyzed: {total_flights}"
                 else:
                     results['demand_patterns'] = f"Total flights in dataset: {total_flights}"
+                
+                if demand_forecast:
+                    results['demand_patterns'] += (
+                        f"\nForecast next 24h: {demand_forecast['next_24h_expected']:.0f} flights "
+                        f"({demand_forecast['next_24h_lower']:.0f}–{demand_forecast['next_24h_upper']:.0f})"
+                        f"\nForecast peak hour: {demand_forecast['forecast_peak_hour']}:00"
+                        f"\nAnomalous hours in history: {demand_forecast['anomalous_hours']}"
+                    )
             
             # Basic recommendations
             results['recommendations'] = "• Monitor peak travel periods for pricing optimization\n• Focus on popular routes for marketing\n• Consider seasonal variations in demand\n• Analyze competitor presence on key routes"
@@ -0,0 +1,111 @@
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+AIRPORTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Main hubs listed first in the airport dropdown, in this order
+HUB_AIRPORTS = {
+    "AU": ["YSSY", "YMML", "YBBN", "YPPH", "YPAD"],
+    "US": ["KATL", "KLAX", "KORD", "KDFW", "KDEN", "KJFK"],
+    "GB": ["EGLL", "EGKK", "EGCC", "EGSS"],
+    "DE": ["EDDF", "EDDM", "EDDB", "EDDL", "EDDH"],
+    "FR": ["LFPG", "LFPO", "LFMN", "LFLL"],
+    "JP": ["RJTT", "RJAA", "RJBB", "RJCC", "RJFF"],
+    "SG": ["WSSS"],
+    "CA": ["CYYZ", "CYVR", "CYUL", "CYYC"],
+    "NL": ["EHAM", "EHRD", "EHEH"],
+}
+
+
+def _to_unit_vectors(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """Convert degrees to points on the unit sphere"""
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+class AirportIndex:
+    """
+    Nearest-airport lookups over the bundled airport table
+
+    Airports are indexed in a KD-tree over 3D unit vectors. Straight-line
+    (chord) distance on the unit sphere is monotonic in great-circle distance,
+    so the nearest neighbour by chord is the nearest by haversine distance.
+    """
+
+    def __init__(self, airports: Optional[pd.DataFrame] = None):
+        if airports is None:
+            airports = pd.read_csv(AIRPORTS_PATH, keep_default_na=False, na_values={'latitude': [''], 'longitude': ['']})
+        self.airports = airports.reset_index(drop=True)
+        self._tree = cKDTree(_to_unit_vectors(self.airports['latitude'], self.airports['longitude']))
+
+    def nearest(self, latitude, longitude, max_distance_km: Optional[float] = None) -> pd.DataFrame:
+        """
+        Find the nearest airport for each position in one vectorized query
+
+        Args:
+            latitude: Latitudes in degrees (array-like)
+            longitude: Longitudes in degrees (array-like)
+            max_distance_km: Positions farther than this from any airport get no match
+
+        Returns:
+            DataFrame aligned with the inputs with icao, iata and distance_km;
+            unmatched or invalid positions have empty codes and NaN distance
+        """
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        valid = np.isfinite(latitude) & np.isfinite(longitude)
+
+        icao = np.full(len(latitude), '', dtype=object)
+        iata = np.full(len(latitude), '', dtype=object)
+        distance_km = np.full(len(latitude), np.nan)
+
+        if valid.any():
+            upper_bound = np.inf
+            if max_distance_km is not None:
+                upper_bound = 2 * np.sin(min(max_distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+            chord, index = self._tree.query(
+                _to_unit_vectors(latitude[valid], longitude[valid]),
+                distance_upper_bound=upper_bound
+            )
+            found = np.isfinite(chord)
+            rows = np.flatnonzero(valid)[found]
+            index = index[found]
+
+            icao[rows] = self.airports['icao'].to_numpy()[index]
+            iata[rows] = self.airports['iata'].to_numpy()[index]
+            distance_km[rows] = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord[found] / 2, 1.0))
+
+        return pd.DataFrame({'icao': icao, 'iata': iata, 'distance_km': distance_km})
+
+    def airport_options(self, country_code: str) -> Dict[str, str]:
+        """Dropdown labels mapped to ICAO codes for a country, hubs first"""
+        airports = self.airports[self.airports['country'] == country_code]
+        if airports.empty:
+            return {}
+
+        hubs = HUB_AIRPORTS.get(country_code, [])
+        hub_rank = airports['icao'].map({code: i for i, code in enumerate(hubs)})
+        is_international = airports['name'].str.contains('International', case=False)
+        ordered = airports.assign(
+            _hub_rank=hub_rank.fillna(len(hubs)),
+            _domestic=~is_international
+        ).sort_values(['_hub_rank', '_domestic', 'city', 'iata'])
+
+        labels = ordered['city'].where(ordered['city'] != '', ordered['name']) + ' (' + ordered['iata'] + ')'
+        return dict(zip(labels, ordered['icao']))
+
+
+@lru_cache(maxsize=1)
+def get_airport_index() -> AirportIndex:
+    """Return the process-wide airport index, loading the bundled table once"""
+    return AirportIndex()
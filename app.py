@@ -4,9 +4,23 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from data_fetcher import DataFetcher
 from ai_analyzer import AIAnalyzer
-from utils import format_currency, cache_data, get_country_code, validate_api_keys
+from dataset_registry import get_dataset_registry
+from airports import get_airport_index
+from demand_counters import get_demand_counters, TIME_RANGE_WINDOWS
+from forecasting import SeasonalForecaster, summarize_forecast
+from comparison import compare_countries, summarize
+from downsampling import downsample
+from quota import get_quota_scheduler
+from flight_history import ROLLUP_RANGES, get_flight_history, rollup_summary
+from snapshot_buffer import get_snapshot_buffer
+from snapshot_delta import get_delta_engine
+from metrics_api import start_metrics_api
+from snapshot_archiver import get_snapshot_archiver
+from jobs import get_job_runner
+from utils import format_currency, cache_data, get_country_code, notify, validate_api_keys
 
 # Configure page with maximum width utilization
 st.set_page_config(
@@ -40,10 +54,244 @@ if 'data_fetcher' not in st.session_state:
     st.session_state.data_fetcher = DataFetcher()
 if 'ai_analyzer' not in st.session_state:
     st.session_state.ai_analyzer = AIAnalyzer()
-if 'flight_data' not in st.session_state:
-    st.session_state.flight_data = None
+if 'dataset_handle' not in st.session_state:
+    st.session_state.dataset_handle = None
 if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
+if 'comparison' not in st.session_state:
+    st.session_state.comparison = None
+
+# Starting queries for the ad-hoc query panel
+QUERY_EXAMPLES = {
+    "flights": (
+        "SELECT origin, destination, count(*) AS flights, avg(departure_delay) AS avg_delay\n"
+        "FROM flights\nGROUP BY ALL\nORDER BY flights DESC\nLIMIT 20"
+    ),
+    "snapshots": (
+        "SELECT region, date_trunc('hour', snapshot_time) AS hour, count(DISTINCT icao24) AS aircraft\n"
+        "FROM snapshots\nGROUP BY ALL\nORDER BY hour DESC, aircraft DESC"
+    )
+}
+
+# Width the activity timeline is drawn at (half of the wide layout); it is
+# downsampled to one point per pixel
+TIMELINE_WIDTH_PX = 640
+
+# Window of buffered snapshots the live recent-activity metrics cover
+LIVE_ACTIVITY_MINUTES = 15
+
+# Demand counter source for each data source option
+COUNTER_SOURCES = {
+    "OpenSky Network": "opensky",
+    "AviationStack": "aviationstack"
+}
+
+def acquire_dataset(data_fetcher, data_source, country, airport_code, time_range):
+    """Get a registry handle to the flight dataset for these parameters, fetching it if needed"""
+    def load_flight_data():
+        if data_source == "OpenSky Network":
+            return data_fetcher.fetch_opensky_data(
+                country=country,
+                time_range=time_range
+            )
+        return data_fetcher.fetch_aviationstack_data(
+            country=country,
+            airport_code=airport_code,
+            time_range=time_range
+        )
+    
+    # Sessions requesting the same data within a snapshot interval share one
+    # dataset; an older one is served while the current snapshot loads
+    registry = get_dataset_registry()
+    key = registry.snapshot_key(data_source, country, airport_code, time_range)
+    return registry.acquire_swr(key, load_flight_data)
+
+def refresh_session_dataset():
+    """
+    Move this session to the newest dataset for its parameters, starting a
+    background refresh once the held one is past the soft TTL
+    """
+    handle = st.session_state.get('dataset_handle')
+    if handle is None:
+        return
+    
+    try:
+        latest = acquire_dataset(st.session_state.data_fetcher, **{
+            field: handle.params.get(field)
+            for field in ('data_source', 'country', 'airport_code', 'time_range')
+        })
+    except Exception as e:
+        st.warning(f"⚠️ Could not refresh flight data, showing the last snapshot: {str(e)}")
+        return
+    
+    if latest is None or latest.key == handle.key:
+        if latest is not None:
+            latest.release()
+        return
+    handle.release()
+    st.session_state.dataset_handle = latest
+
+def insights_name(analysis_types):
+    """Name of a dataset's derived AI insights for a set of analysis types"""
+    return "insights:" + ",".join(sorted(analysis_types))
+
+def insights_builder(handle, analysis_types, progress=None, analyzer=None, data_fetcher=None):
+    """
+    Builder of a dataset's AI insights; session state is resolved up front
+    (or passed in from it) so the builder can also run on a background thread
+    """
+    analyzer = analyzer or st.session_state.ai_analyzer
+    route_flights = get_route_flights(handle, data_fetcher)
+    forecast = get_demand_forecast(handle)
+    demand_forecast = summarize_forecast(forecast, handle.params.get('country')) if forecast else None
+    history_summary = get_history_summary(handle)
+    
+    return lambda frame: analyzer.analyze_flight_data(
+        frame, analysis_types,
+        route_flights=route_flights,
+        demand_forecast=demand_forecast,
+        history_summary=history_summary,
+        progress=progress
+    )
+
+def refresh_session_insights():
+    """
+    Swap in the insights for the session's current dataset once they are
+    built, keeping the previous ones on screen until then
+    """
+    handle = st.session_state.get('dataset_handle')
+    analysis_types = st.session_state.get('analysis_types')
+    if handle is None or analysis_types is None or st.session_state.analysis_results is None:
+        return
+    if st.session_state.get('analysis_key') == handle.key:
+        return
+    
+    fresh = get_dataset_registry().derived_async(
+        handle, insights_name(analysis_types), insights_builder(handle, analysis_types), title="the AI insights"
+    )
+    if fresh:
+        st.session_state.analysis_results = fresh
+        st.session_state.analysis_key = handle.key
+
+def show_dataset_messages():
+    """Show what background refreshes and builds reported for the session's dataset, once each"""
+    handle = st.session_state.get('dataset_handle')
+    if handle is None:
+        return
+    shown = st.session_state.setdefault('shown_dataset_messages', set())
+    for kind, text in get_dataset_registry().messages(handle):
+        if (handle.key, kind, text) not in shown:
+            shown.add((handle.key, kind, text))
+            getattr(st, kind)(text)
+
+def format_age(seconds):
+    """Human readable age like '4 min ago'"""
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{seconds / 3600:.1f} h ago"
+
+def default_airport_code(country):
+    """Airport preselected in the dropdown for a country"""
+    airports = get_airport_index().airport_options(get_country_code(country))
+    return next(iter(airports.values()), "AUTO")
+
+def get_flight_data():
+    """Return the shared, read-only flight dataset held by this session"""
+    handle = st.session_state.get('dataset_handle')
+    return handle.frame if handle is not None else None
+
+def get_route_flights(handle=None, data_fetcher=None):
+    """
+    Flights with origin/destination for route charts: the dataset itself, or
+    flights reconstructed from OpenSky snapshots when the source has no routes
+    """
+    handle = handle or st.session_state.get('dataset_handle')
+    if handle is None:
+        return None
+    
+    data = handle.frame
+    if 'origin' in data.columns and 'destination' in data.columns:
+        return data
+    
+    country = handle.params.get('country')
+    if not country:
+        return None
+    
+    data_fetcher = data_fetcher or st.session_state.data_fetcher
+    flights = get_dataset_registry().derived(
+        handle, 'completed_flights',
+        lambda _: data_fetcher.get_completed_flights(country)
+    )
+    flights = flights[(flights['origin'] != '') & (flights['destination'] != '')]
+    return flights if not flights.empty else None
+
+def get_demand_view(handle=None):
+    """
+    Demand counters, region and window for the session's dataset, or None if
+    no history has been counted for it yet
+    """
+    handle = handle or st.session_state.get('dataset_handle')
+    if handle is None:
+        return None
+    
+    params = handle.params
+    source = COUNTER_SOURCES.get(params.get('data_source'))
+    window = TIME_RANGE_WINDOWS.get(params.get('time_range'))
+    if source is None or window is None:
+        return None
+    
+    counters = get_demand_counters(source)
+    if counters.total('region', params['country'], window) == 0:
+        return None
+    return counters, params['country'], window
+
+def get_history_summary(handle=None):
+    """
+    Long-range summary of the dataset's region from the stored rollups, or
+    None when its time range is short or nothing has been rolled up yet
+    """
+    handle = handle or st.session_state.get('dataset_handle')
+    if handle is None:
+        return None
+    
+    params = handle.params
+    source = COUNTER_SOURCES.get(params.get('data_source'))
+    days = ROLLUP_RANGES.get(params.get('time_range'))
+    if source is None or days is None:
+        return None
+    
+    def build_summary(_):
+        since = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('D') - pd.Timedelta(days=days - 1)
+        try:
+            return rollup_summary(get_flight_history(), source, params['country'], since)
+        except Exception as e:
+            notify('warning', f"⚠️ Could not read flight history rollups: {str(e)}")
+            return {}
+    
+    return get_dataset_registry().derived(handle, 'history_summary', build_summary) or None
+
+def get_demand_forecast(handle=None):
+    """
+    Seasonal forecast for the session's region and every airport, computed
+    once per dataset from the demand counters' hourly history
+    """
+    handle = handle or st.session_state.get('dataset_handle')
+    demand_view = get_demand_view(handle)
+    if demand_view is None:
+        return None
+    counters, region, _ = demand_view
+    
+    def build_forecast(_):
+        history = pd.concat([
+            counters.hourly_series('region', [region]),
+            counters.hourly_series('airport')
+        ], axis=1)
+        history = history.loc[:, ~history.columns.duplicated()]
+        return SeasonalForecaster().forecast(history, horizon=24)
+    
+    return get_dataset_registry().derived(handle, 'demand_forecast', build_forecast)
 
 def main():
     # Ensure session state is initialized
@@ -51,10 +299,18 @@ def main():
         st.session_state.data_fetcher = DataFetcher()
     if 'ai_analyzer' not in st.session_state:
         st.session_state.ai_analyzer = AIAnalyzer()
-    if 'flight_data' not in st.session_state:
-        st.session_state.flight_data = None
+    if 'dataset_handle' not in st.session_state:
+        st.session_state.dataset_handle = None
     if 'analysis_results' not in st.session_state:
         st.session_state.analysis_results = None
+    if 'comparison' not in st.session_state:
+        st.session_state.comparison = None
+    
+    # JSON API over the demand aggregates for other services, once per process
+    metrics_server = start_metrics_api()
+    
+    # Sweep OpenSky snapshots fetched by any app process into the flight history
+    get_snapshot_archiver().start(st.session_state.data_fetcher.clean_opensky_snapshot)
     
     # Custom CSS for better UI
     st.markdown("""
@@ -129,6 +385,19 @@ def main():
             else:
                 st.markdown('<span class="status-indicator status-offline"></span>AviationStack', unsafe_allow_html=True)
         
+        # Remaining request quota, shared by all sessions
+        scheduler = get_quota_scheduler()
+        for provider, label in [("opensky", "OpenSky credits"), ("aviationstack", "AviationStack requests")]:
+            quota = scheduler.status(provider)
+            period = "today" if quota['period'] == 'day' else "this month"
+            message = f"{label}: {quota['remaining']}/{quota['limit']} left {period}"
+            if quota['projected_exhaustion'] is not None:
+                message += f" · runs out ~{quota['projected_exhaustion']:%b %d %H:%M} UTC"
+            st.caption(message)
+        if metrics_server is not None:
+            host, port = metrics_server.server_address[:2]
+            st.caption(f"Metrics API: http://{host}:{port}/v1/demand")
+        
         st.markdown("---")
         
         # Data source selection with enhanced descriptions
@@ -170,15 +439,8 @@ def main():
         )
         
         # City/Airport selection based on country
-        if selected_country == "Australia":
-            airports = {
-                "Sydney (SYD)": "YSSY",
-                "Melbourne (MEL)": "YMML", 
-                "Brisbane (BNE)": "YBBN",
-                "Perth (PER)": "YPPH",
-                "Adelaide (ADL)": "YPAD"
-            }
-        else:
+        airports = get_airport_index().airport_options(get_country_code(selected_country))
+        if not airports:
             airports = {
                 "Major Hub": "AUTO",
                 "Secondary Hub": "AUTO2"
@@ -191,6 +453,12 @@ def main():
         )
         airport_code = airports[selected_airport]
         
+        compare_with = st.multiselect(
+            "🆚 Compare With",
+            [c for c in countries if c != selected_country],
+            help="Fetch these countries alongside the selected one for a side-by-side comparison"
+        )
+        
         # Time range selection
         st.subheader("📅 Time Range")
         time_range = st.selectbox(
@@ -221,6 +489,9 @@ def main():
         if st.button("🚀 Fetch & Analyze Data", type="primary", use_container_width=True):
             fetch_and_analyze_data(data_source, selected_country, airport_code, time_range, analysis_types, use_ai_analysis)
         
+        if compare_with and st.button("🆚 Compare Countries", use_container_width=True):
+            fetch_country_comparison(data_source, [selected_country] + compare_with, time_range)
+        
         # Quick info section
         st.markdown("---")
         st.subheader("ℹ️ Quick Info")
@@ -238,8 +509,34 @@ def main():
             "• Business recommendations for hostels"
         )
     
+    # Side-by-side country comparison
+    if st.session_state.comparison is not None:
+        st.subheader("🆚 Country Comparison")
+        display_country_comparison()
+        st.markdown("---")
+    
+    # Pick up a finished fetch job, or show the running one's progress
+    attach_fetch_job()
+    if st.session_state.get('fetch_job_id') is not None:
+        display_fetch_job()
+    
+    # Serve the session's data stale while newer snapshots load in the background
+    refresh_session_dataset()
+    refresh_session_insights()
+    show_dataset_messages()
+    
     # Main content area with enhanced layout
-    if hasattr(st.session_state, 'flight_data') and st.session_state.flight_data is not None:
+    if get_flight_data() is not None:
+        handle = st.session_state.dataset_handle
+        registry = get_dataset_registry()
+        freshness = (
+            f"🕒 Data as of {datetime.fromtimestamp(handle.created_at).strftime('%H:%M:%S')} "
+            f"({format_age(handle.age)})"
+        )
+        if registry.refreshing(handle.key):
+            freshness += " · refreshing in the background"
+        st.caption(freshness)
+        
         # Data overview section
         st.subheader("📊 Market Demand Overview")
         display_data_overview()
@@ -252,10 +549,12 @@ def main():
         if hasattr(st.session_state, 'analysis_results') and st.session_state.analysis_results is not None:
             st.markdown("---")
             st.subheader("🤖 AI Insights")
+            if st.session_state.get('analysis_types') is not None and st.session_state.get('analysis_key') != handle.key:
+                st.caption("Showing insights from an earlier snapshot; updated insights are being generated.")
             display_ai_insights()
         else:
             st.info("AI insights will appear here after data analysis.")
-    else:
+    elif st.session_state.comparison is None:
         # Welcome section with improved styling
         st.markdown("""
         <div class="insight-box">
@@ -325,31 +624,32 @@ def main():
         """)
             
     # Bottom section for detailed data
-    if hasattr(st.session_state, 'flight_data') and st.session_state.flight_data is not None:
+    flight_data = get_flight_data()
+    if flight_data is not None:
         st.markdown("---")
         st.subheader("📋 Detailed Flight Data")
         
         # Data table with filtering
-        if not st.session_state.flight_data.empty:
+        if not flight_data.empty:
             # Add filters for the data table
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                if 'origin' in st.session_state.flight_data.columns:
+                if 'origin' in flight_data.columns:
                     origin_filter = st.multiselect(
                         "Filter by Origin",
-                        options=st.session_state.flight_data['origin'].unique(),
-                        default=st.session_state.flight_data['origin'].unique()[:5]
+                        options=flight_data['origin'].unique(),
+                        default=flight_data['origin'].unique()[:5]
                     )
                 else:
                     origin_filter = []
             
             with col2:
-                if 'destination' in st.session_state.flight_data.columns:
+                if 'destination' in flight_data.columns:
                     dest_filter = st.multiselect(
                         "Filter by Destination", 
-                        options=st.session_state.flight_data['destination'].unique(),
-                        default=st.session_state.flight_data['destination'].unique()[:5]
+                        options=flight_data['destination'].unique(),
+                        default=flight_data['destination'].unique()[:5]
                     )
                 else:
                     dest_filter = []
@@ -358,7 +658,7 @@ def main():
                 show_rows = st.number_input("Rows to show", min_value=10, max_value=1000, value=50)
             
             # Apply filters
-            filtered_data = st.session_state.flight_data.copy()
+            filtered_data = flight_data
             if origin_filter and 'origin' in filtered_data.columns:
                 filtered_data = filtered_data[filtered_data['origin'].isin(origin_filter)]
             if dest_filter and 'destination' in filtered_data.columns:
@@ -380,55 +680,278 @@ def main():
                     file_name=f"flight_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                     mime="text/csv"
                 )
+    
+    # SQL over everything stored so far, not just this session's dataset
+    st.markdown("---")
+    with st.expander("🧮 Ad-hoc Query over Flight History"):
+        display_query_panel()
+
+def display_query_panel():
+    """Run analyst SQL against the embedded flight history store"""
+    try:
+        history = get_flight_history()
+        tables = history.tables()
+    except Exception as e:
+        st.error(f"❌ Flight history is unavailable: {str(e)}")
+        return
+    
+    st.caption(" · ".join(f"**{name}**: {', '.join(columns)}" for name, columns in tables.items()))
+    
+    example = QUERY_EXAMPLES['snapshots' if 'snapshots' in tables else 'flights']
+    sql = st.text_area("SQL (DuckDB dialect, read-only)", value=example, height=120)
+    max_rows = st.number_input("Max rows", min_value=10, max_value=100_000, value=1000, step=100)
+    if st.button("▶️ Run Query"):
+        started = time.perf_counter()
+        try:
+            result = history.query(sql, max_rows=int(max_rows))
+        except Exception as e:
+            st.error(f"❌ Query failed: {str(e)}")
+            return
+        st.caption(f"{len(result):,} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        st.dataframe(result, use_container_width=True, hide_index=True)
 
 def fetch_and_analyze_data(data_source, country, airport_code, time_range, analysis_types, use_ai_analysis):
-    """Fetch and analyze aviation data"""
+    """
+    Submit a background job that fetches and analyzes aviation data, replacing
+    (cancelling) the session's previous one; the result is attached to the
+    session when it finishes
+    """
+    runner = get_job_runner()
+    runner.cancel(st.session_state.get('fetch_job_id'))
+    
+    job = runner.submit(
+        "fetch_and_analyze", run_fetch_job,
+        st.session_state.data_fetcher, st.session_state.ai_analyzer,
+        data_source, country, airport_code, time_range, list(analysis_types), use_ai_analysis
+    )
+    st.session_state.fetch_job_id = job.id
+
+def run_fetch_job(job, data_fetcher, analyzer, data_source, country, airport_code, time_range,
+                  analysis_types, use_ai_analysis):
+    """
+    Fetch a dataset and build its AI insights on a job thread, reporting
+    progress per stage; returns the handle and insights for the session
+    
+    The job has no script run to draw on: session objects are passed in,
+    and fetch and analysis messages are kept on the job (see utils.notify).
+    """
+    job.report("🔄 Fetching flight data", 0.05)
+    handle = acquire_dataset(data_fetcher, data_source, country, airport_code, time_range)
+    if handle is None:
+        return None
+    
+    try:
+        analysis_results = None
+        if use_ai_analysis:
+            job.report("🤖 Preparing data for AI analysis", 0.3)
+            
+            def report_analysis(stage, done, total):
+                job.report(f"🤖 {stage}", 0.4 + 0.55 * done / total)
+            
+            analysis_results = get_dataset_registry().derived(
+                handle, insights_name(analysis_types),
+                insights_builder(handle, analysis_types, progress=report_analysis,
+                                 analyzer=analyzer, data_fetcher=data_fetcher)
+            )
+        # A job cancelled during its last stage does not replace the session's data
+        job.report("Finishing", 1.0)
+    except BaseException:
+        handle.release()
+        raise
+    
+    return {
+        'handle': handle,
+        'analysis_results': analysis_results,
+        'analysis_types': analysis_types,
+        'use_ai_analysis': use_ai_analysis
+    }
+
+def attach_fetch_job():
+    """Move a finished fetch job's dataset and insights into the session"""
+    job_id = st.session_state.get('fetch_job_id')
+    if job_id is None:
+        return
+    job = get_job_runner().get(job_id)
+    if job is not None and not job.finished:
+        return
+    st.session_state.fetch_job_id = None
+    
+    if job is not None:
+        show_job_messages(job)
+    if job is None:
+        st.warning("⚠️ The data fetch expired before its results were collected. Please fetch again.")
+    elif job.status == 'cancelled':
+        st.info("ℹ️ Data fetch cancelled.")
+    elif job.status == 'failed':
+        st.error(f"❌ Error fetching data: {job.error}")
+        st.error("Please check your API keys and try again.")
+    elif job.result is None:
+        st.error("❌ No flight data found for the selected criteria. Please try different filters.")
+    else:
+        result = job.result
+        previous_handle = st.session_state.get('dataset_handle')
+        if previous_handle is not None:
+            previous_handle.release()
+        st.session_state.dataset_handle = result['handle']
+        st.success(f"✅ Successfully fetched {len(result['handle'].frame)} flight records in {job.elapsed:.1f}s!")
+        
+        if result['use_ai_analysis']:
+            st.session_state.analysis_results = result['analysis_results']
+            st.session_state.analysis_types = result['analysis_types']
+            st.session_state.analysis_key = result['handle'].key
+            if result['analysis_results']:
+                st.success("🎯 AI analysis completed!")
+        else:
+            # Keep earlier insights on screen without regenerating them
+            st.session_state.analysis_types = None
+
+def show_job_messages(job):
+    """Show the messages a background job kept for its session"""
+    for kind, text in list(job.messages):
+        getattr(st, kind)(text)
+
+@st.fragment(run_every=1)
+def display_fetch_job():
+    """Progress of the session's running fetch job, polled without rerunning the page"""
+    job = get_job_runner().get(st.session_state.get('fetch_job_id'))
+    if job is None or job.finished:
+        # Rerun the whole page to attach the result
+        st.rerun()
+        return
     
-    with st.spinner("🔄 Fetching flight data..."):
+    show_job_messages(job)
+    col1, col2 = st.columns([5, 1])
+    with col1:
+        stage = "Cancelling..." if job.cancelling else f"{job.stage}... ({job.elapsed:.0f}s)"
+        st.progress(job.progress, text=stage)
+    with col2:
+        if st.button("✖️ Cancel", key="cancel_fetch_job", disabled=job.cancelling, use_container_width=True):
+            job.cancel()
+            st.rerun(scope="fragment")
+
+def fetch_country_comparison(data_source, countries, time_range):
+    """Fetch and summarize several countries concurrently for a side-by-side comparison"""
+    
+    with st.spinner(f"🔄 Fetching {len(countries)} countries in parallel..."):
         try:
-            # Fetch flight data
-            if data_source == "OpenSky Network":
-                flight_data = st.session_state.data_fetcher.fetch_opensky_data(
-                    country=country,
-                    time_range=time_range
-                )
-            else:
-                flight_data = st.session_state.data_fetcher.fetch_aviationstack_data(
-                    country=country,
-                    airport_code=airport_code,
-                    time_range=time_range
-                )
+            data_fetcher = st.session_state.data_fetcher
+            registry = get_dataset_registry()
+            script_ctx = get_script_run_ctx()
+            
+            def load(country):
+                return acquire_dataset(data_fetcher, data_source, country, default_airport_code(country), time_range)
+            
+            def summarize_dataset(handle):
+                # Large datasets are aggregated in the process pool; the summary is shared via the registry
+                return registry.derived(handle, 'country_summary', summarize)
+            
+            comparison = compare_countries(
+                countries, load, summarize_dataset,
+                # Worker threads report fetch errors on this session's page
+                thread_initializer=lambda: add_script_run_ctx(ctx=script_ctx),
+                release=lambda handle: handle.release()
+            )
+            
+            previous = st.session_state.get('comparison')
+            if previous is not None:
+                for handle in previous['handles'].values():
+                    handle.release()
+            
+            st.session_state.comparison = {
+                'data_source': data_source,
+                'time_range': time_range,
+                'handles': comparison['datasets'],
+                'summaries': comparison['summaries'],
+                'errors': comparison['errors'],
+                'seconds': comparison['seconds'],
+                'elapsed': comparison['elapsed']
+            }
+            st.rerun()
             
-            if flight_data is not None and not flight_data.empty:
-                st.session_state.flight_data = flight_data
-                st.success(f"✅ Successfully fetched {len(flight_data)} flight records!")
-                
-                # Perform AI analysis if enabled
-                if use_ai_analysis:
-                    with st.spinner("🤖 Analyzing data with AI..."):
-                        analysis_results = st.session_state.ai_analyzer.analyze_flight_data(
-                            flight_data, analysis_types
-                        )
-                        st.session_state.analysis_results = analysis_results
-                        if analysis_results:
-                            st.success("🎯 AI analysis completed!")
-                
-                # Auto-refresh the page to show new data
-                st.rerun()
-            else:
-                st.error("❌ No flight data found for the selected criteria. Please try different filters.")
-                
         except Exception as e:
-            st.error(f"❌ Error fetching data: {str(e)}")
-            st.error("Please check your API keys and try again.")
+            st.error(f"❌ Error comparing countries: {str(e)}")
+
+def display_country_comparison():
+    """Display side-by-side metrics and charts for the compared countries"""
+    
+    comparison = st.session_state.comparison
+    summaries = comparison['summaries']
+    
+    slowest = max(comparison['seconds'].values(), default=0.0)
+    st.caption(
+        f"{comparison['data_source']} · {comparison['time_range']} · fetched {len(comparison['seconds'])} countries "
+        f"in {comparison['elapsed']:.1f}s (slowest single country {slowest:.1f}s)"
+    )
+    for country, error in comparison['errors'].items():
+        st.warning(f"⚠️ {country}: {error}")
+    
+    if not summaries:
+        return
+    
+    # One column of metrics per country
+    for column, (country, summary) in zip(st.columns(len(summaries)), summaries.items()):
+        with column:
+            st.markdown(f"**{country}**")
+            st.metric("Total Flights", summary['flights'])
+            st.metric("Active Aircraft", summary['aircraft'])
+            st.metric("Airlines", summary['airlines'])
+            if summary['avg_speed_mph'] is not None:
+                st.metric("Avg Speed", f"{summary['avg_speed_mph']:.0f} mph")
+            if summary['peak_hour'] is not None:
+                st.metric("Peak Hour", f"{summary['peak_hour']}:00")
+    
+    chart_col1, chart_col2 = st.columns([1, 1], gap="large")
+    
+    with chart_col1:
+        volumes = pd.DataFrame([
+            {'country': country, 'metric': label, 'count': summary[field]}
+            for country, summary in summaries.items()
+            for field, label in [('flights', 'Flights'), ('aircraft', 'Aircraft'), ('airlines', 'Airlines')]
+        ])
+        fig_volumes = px.bar(
+            volumes,
+            x='metric',
+            y='count',
+            color='country',
+            barmode='group',
+            title="Traffic Volume by Country",
+            labels={'metric': '', 'count': 'Count', 'country': 'Country'}
+        )
+        fig_volumes.update_layout(height=400, margin=dict(l=20, r=20, t=40, b=20))
+        st.plotly_chart(fig_volumes, use_container_width=True)
+    
+    with chart_col2:
+        hourly = pd.DataFrame([
+            {'country': country, 'hour': hour, 'flight_count': count}
+            for country, summary in summaries.items()
+            for hour, count in enumerate(summary['hourly'])
+        ])
+        fig_hourly = px.line(
+            hourly,
+            x='hour',
+            y='flight_count',
+            color='country',
+            title="Flight Activity by Hour of Day",
+            labels={'hour': 'Hour of Day', 'flight_count': 'Number of Flights', 'country': 'Country'}
+        )
+        fig_hourly.update_layout(height=400, margin=dict(l=20, r=20, t=40, b=20))
+        st.plotly_chart(fig_hourly, use_container_width=True)
 
 def display_data_overview():
     """Display overview statistics of the flight data"""
     
-    if not hasattr(st.session_state, 'flight_data') or st.session_state.flight_data is None or st.session_state.flight_data.empty:
+    data = get_flight_data()
+    if data is None or data.empty:
         return
     
-    data = st.session_state.flight_data
+    # Incrementally maintained counters make these O(1) when history is available
+    demand_view = get_demand_view()
+    # Long time ranges read the stored rollups instead of the current dataset
+    history = get_history_summary()
+    if history:
+        start = history['date_range']['start'][:10]
+        st.caption(f"📚 Flight totals, daily averages and peak hours cover {history['days']} days "
+                   f"of stored history since {start}.")
     
     # Key metrics with enhanced styling - using wider layout
     col1, col2, col3, col4 = st.columns(4)
@@ -437,7 +960,7 @@ def display_data_overview():
     metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
     
     with col1:
-        total_flights = len(data)
+        total_flights = history['total_flights'] if history else len(data)
         st.metric("Total Flights", total_flights, delta=None)
     
     with col2:
@@ -465,14 +988,21 @@ def display_data_overview():
     
     # Use the second row of metrics for additional insights
     with metric_col1:
-        if 'timestamp' in data.columns:
+        if history:
+            st.metric("Date Range", f"{history['days']} days")
+        elif 'timestamp' in data.columns:
             date_range = (data['timestamp'].max() - data['timestamp'].min()).days
             st.metric("Date Range", f"{date_range} days")
         else:
             st.metric("Status", "Active")
     
     with metric_col2:
-        if 'timestamp' in data.columns:
+        if history:
+            st.metric("Avg Daily Flights", f"{history['avg_daily_flights']:.1f}")
+        elif demand_view is not None:
+            counters, region, window = demand_view
+            st.metric("Avg Daily Flights", f"{counters.average_daily('region', region, window):.1f}")
+        elif 'timestamp' in data.columns:
             date_range = (data['timestamp'].max() - data['timestamp'].min()).days
             avg_per_day = len(data) / max(1, date_range)
             st.metric("Avg Daily Flights", f"{avg_per_day:.1f}")
@@ -480,7 +1010,13 @@ def display_data_overview():
             st.metric("Data Quality", "Good")
     
     with metric_col3:
-        if 'timestamp' in data.columns:
+        if history:
+            st.metric("Peak Hour", f"{history['peak_hour']}:00")
+        elif demand_view is not None:
+            counters, region, window = demand_view
+            peak_hour = counters.peak_hour('region', region, window)
+            st.metric("Peak Hour", f"{peak_hour}:00")
+        elif 'timestamp' in data.columns:
             peak_hour = data['timestamp'].dt.hour.mode().iloc[0] if not data['timestamp'].dt.hour.empty else 0
             st.metric("Peak Hour", f"{peak_hour}:00")
         else:
@@ -496,18 +1032,23 @@ def display_data_overview():
 def display_visualizations():
     """Display interactive visualizations"""
     
-    if not hasattr(st.session_state, 'flight_data') or st.session_state.flight_data is None or st.session_state.flight_data.empty:
+    data = get_flight_data()
+    if data is None or data.empty:
         return
     
-    data = st.session_state.flight_data
+    history = get_history_summary()
     
     # Route popularity chart
-    if 'origin' in data.columns and 'destination' in data.columns:
+    route_flights = get_route_flights()
+    if (history and 'top_routes' in history) or route_flights is not None:
         st.subheader("🗺️ Most Popular Routes")
         
-        # Create route combinations
-        data['route'] = data['origin'] + ' → ' + data['destination']
-        route_counts = data['route'].value_counts().head(10)
+        if history and 'top_routes' in history:
+            route_counts = pd.Series(history['top_routes'])
+        else:
+            # Create route combinations
+            routes = route_flights['origin'] + ' → ' + route_flights['destination']
+            route_counts = routes.value_counts().head(10)
         
         fig_routes = px.bar(
             x=route_counts.values,
@@ -519,6 +1060,8 @@ def display_visualizations():
         fig_routes.update_layout(height=400)
         st.plotly_chart(fig_routes, use_container_width=True)
     
+    display_live_traffic()
+    
     # Add spacing between sections
     st.markdown("<br>", unsafe_allow_html=True)
     
@@ -530,33 +1073,56 @@ def display_visualizations():
         if 'timestamp' in data.columns:
             st.subheader("⏰ Flight Activity Over Time")
             
-            # Convert timestamp to datetime if it's not already
-            if not pd.api.types.is_datetime64_any_dtype(data['timestamp']):
-                data['timestamp'] = pd.to_datetime(data['timestamp'])
-            
-            # Group by hour
-            data['hour'] = data['timestamp'].dt.hour
-            hourly_counts = data.groupby('hour').size().reset_index(name='flight_count')
+            chart_mode = st.radio("Activity chart", ["Hour of Day", "Timeline"], horizontal=True,
+                                  label_visibility="collapsed")
+            if chart_mode == "Timeline":
+                display_activity_timeline()
+            else:
+                demand_view = get_demand_view()
+                if history:
+                    # Hour-of-day profile over the whole range from the hourly rollups
+                    hourly_counts = pd.DataFrame({
+                        'hour': range(24),
+                        'flight_count': [history['hourly_distribution'][hour] for hour in range(24)]
+                    })
+                elif demand_view is not None:
+                    # Read the hour-of-day profile from the demand counters
+                    counters, region, window = demand_view
+                    hourly_counts = pd.DataFrame({
+                        'hour': range(24),
+                        'flight_count': counters.hourly_profile('region', region, window)
+                    })
+                else:
+                    # Convert timestamp to datetime if it's not already
+                    timestamps = data['timestamp']
+                    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+                        timestamps = pd.to_datetime(timestamps)
+                
+                    # Group by hour
+                    hourly_counts = timestamps.dt.hour.rename('hour').value_counts().sort_index().reset_index(name='flight_count')
             
-            fig_time = px.line(
-                hourly_counts,
-                x='hour',
-                y='flight_count',
-                title="Flight Activity by Hour of Day",
-                labels={'hour': 'Hour of Day', 'flight_count': 'Number of Flights'}
-            )
-            fig_time.update_layout(
-                height=400,
-                margin=dict(l=20, r=20, t=40, b=20)
-            )
-            st.plotly_chart(fig_time, use_container_width=True)
+                fig_time = px.line(
+                    hourly_counts,
+                    x='hour',
+                    y='flight_count',
+                    title="Flight Activity by Hour of Day",
+                    labels={'hour': 'Hour of Day', 'flight_count': 'Number of Flights'}
+                )
+                fig_time.update_layout(
+                    height=400,
+                    margin=dict(l=20, r=20, t=40, b=20)
+                )
+                st.plotly_chart(fig_time, use_container_width=True)
     
     with chart_col2:
         # Geographic distribution
         if 'origin_country' in data.columns:
             st.subheader("🌍 Geographic Distribution")
             
-            country_counts = data['origin_country'].value_counts().head(8)  # Reduced to 8 for better display
+            if history and 'top_countries' in history:
+                country_counts = pd.Series(history['top_countries']).head(8)
+            else:
+                country_counts = data['origin_country'].value_counts().head(8)  # Reduced to 8 for better display
             
             fig_geo = px.pie(
                 values=country_counts.values,
@@ -581,11 +1147,50 @@ def display_visualizations():
     # Add spacing between sections
     st.markdown("<br>", unsafe_allow_html=True)
     
+    # Local demand forecast for the selected region
+    forecast = get_demand_forecast()
+    region = st.session_state.dataset_handle.params.get('country')
+    if forecast and region in forecast['forecast'].columns:
+        st.subheader("📉 Demand Forecast")
+        
+        counters, _, _ = get_demand_view()
+        observed = counters.hourly_series('region', [region])[region].tail(72)
+        predicted = forecast['forecast'][region]
+        
+        fig_forecast = go.Figure([
+            go.Scatter(x=forecast['upper'].index, y=forecast['upper'][region], line=dict(width=0),
+                       showlegend=False, hoverinfo='skip'),
+            go.Scatter(x=forecast['lower'].index, y=forecast['lower'][region], line=dict(width=0),
+                       fill='tonexty', fillcolor='rgba(31, 119, 180, 0.2)', name='95% band'),
+            go.Scatter(x=observed.index, y=observed.values, mode='lines', name='Observed'),
+            go.Scatter(x=predicted.index, y=predicted.values, mode='lines', name='Forecast',
+                       line=dict(dash='dash'))
+        ])
+        
+        anomalies = forecast['anomalies']
+        anomalies = anomalies[(anomalies['series'] == region) & (anomalies['time'] >= observed.index.min())]
+        if not anomalies.empty:
+            fig_forecast.add_trace(go.Scatter(x=anomalies['time'], y=anomalies['observed'], mode='markers',
+                                              name='Anomaly', marker=dict(color='red', size=9)))
+        
+        fig_forecast.update_layout(
+            height=350,
+            title="Hourly Aircraft Count: Observed and Next 24 Hours",
+            xaxis_title="Time (UTC)",
+            yaxis_title="Aircraft per Hour"
+        )
+        st.plotly_chart(fig_forecast, use_container_width=True)
+        
+        st.markdown("<br>", unsafe_allow_html=True)
+    
     # Airline distribution
     if 'airline' in data.columns:
         st.subheader("🛫 Airline Market Share")
         
-        airline_counts = data['airline'].value_counts().head(8)
+        if history and 'top_airlines' in history:
+            airline_counts = pd.Series(history['top_airlines']).head(8)
+        else:
+            airline_counts = data['airline'].value_counts().head(8)
         
         fig_airlines = px.bar(
             x=airline_counts.index,
@@ -596,6 +1201,125 @@ def display_visualizations():
         fig_airlines.update_layout(height=300)
         st.plotly_chart(fig_airlines, use_container_width=True)
 
+def display_live_traffic():
+    """Live map and recent-activity metrics, read from the in-memory ring of recent OpenSky snapshots"""
+    params = st.session_state.dataset_handle.params
+    if COUNTER_SOURCES.get(params.get('data_source')) != "opensky":
+        return
+    
+    ring = get_snapshot_buffer(params['country'])
+    positions = ring.latest(columns=['callsign', 'latitude', 'longitude', 'altitude_ft', 'speed_mph'])
+    if positions.empty:
+        return
+    
+    st.subheader("🛰️ Live Traffic")
+    
+    activity = ring.activity(LIVE_ACTIVITY_MINUTES * 60)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Airborne Now", f"{activity['airborne']:,}")
+    with col2:
+        st.metric(f"Seen in {LIVE_ACTIVITY_MINUTES} min", f"{activity['aircraft_seen']:,}")
+    with col3:
+        st.metric("Climbing / Descending", f"{activity['climbing']} / {activity['descending']}")
+    with col4:
+        if activity['avg_altitude_ft'] is not None:
+            st.metric("Avg Altitude", f"{activity['avg_altitude_ft']:,.0f} ft")
+    
+    fig_live = px.scatter_map(
+        positions,
+        lat='latitude',
+        lon='longitude',
+        color='altitude_ft',
+        hover_name='callsign',
+        hover_data={'speed_mph': ':.0f', 'altitude_ft': ':,.0f', 'latitude': False, 'longitude': False},
+        labels={'altitude_ft': 'Altitude (ft)', 'speed_mph': 'Speed (mph)'},
+        zoom=3,
+        height=450
+    )
+    fig_live.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+    st.plotly_chart(fig_live, use_container_width=True)
+    
+    # Take-offs, landings and aircraft appearing or vanishing between the latest snapshots
+    events = get_delta_engine(params['country']).events
+    if not events.empty:
+        latest = events[events['time'] == events['time'].max()]['event'].value_counts()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Took Off", f"{latest['took_off']:,}")
+        with col2:
+            st.metric("Landed", f"{latest['landed']:,}")
+        with col3:
+            st.metric("Appeared", f"{latest['appeared']:,}")
+        with col4:
+            st.metric("Vanished", f"{latest['vanished']:,}")
+        with st.expander("Recent Aircraft Events"):
+            st.dataframe(events.tail(200).iloc[::-1], use_container_width=True, hide_index=True)
+    
+    stats = ring.stats()
+    st.caption(f"Latest of {stats['snapshots']} buffered snapshots "
+               f"({stats['bytes_used'] / 2**20:.1f} of {stats['max_bytes'] / 2**20:.0f} MiB in memory)")
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+
+def get_activity_timeline(handle, since, until, width_px):
+    """
+    Stored flights over time for the dataset's region, LTTB-downsampled to
+    the chart width and cached per dataset, zoom range and width
+    """
+    params = handle.params
+    source = COUNTER_SOURCES.get(params.get('data_source'))
+    
+    def build_timeline(_):
+        series = get_flight_history().timeline(source, params['country'], since, until)
+        return downsample(series, 'time', 'flights', width_px), len(series)
+    
+    name = f"timeline:{since:%Y%m%d%H}:{until:%Y%m%d%H}:{width_px}"
+    return get_dataset_registry().derived(handle, name, build_timeline)
+
+def display_activity_timeline():
+    """Zoomable timeline of stored flight history for the session's region"""
+    handle = st.session_state.dataset_handle
+    source = COUNTER_SOURCES.get(handle.params.get('data_source'))
+    region = handle.params.get('country')
+    try:
+        coverage = get_flight_history().rollup_coverage(source, region) if source else None
+    except Exception as e:
+        st.error(f"❌ Flight history is unavailable: {str(e)}")
+        return
+    if coverage is None:
+        st.info("The timeline is drawn from stored flight history, which fills in as data is fetched.")
+        return
+    
+    first, last = coverage[0], coverage[1] + pd.Timedelta(hours=1)
+    days = ROLLUP_RANGES.get(handle.params.get('time_range'), 1)
+    since, until = max(first, last - pd.Timedelta(days=days)), last
+    if last - first > pd.Timedelta(hours=1):
+        since, until = st.slider(
+            "Zoom",
+            min_value=first.to_pydatetime(),
+            max_value=last.to_pydatetime(),
+            value=(since.to_pydatetime(), until.to_pydatetime()),
+            step=timedelta(hours=1),
+            format="MM-DD HH:mm"
+        )
+    
+    series, total_points = get_activity_timeline(handle, pd.Timestamp(since), pd.Timestamp(until), TIMELINE_WIDTH_PX)
+    fig_timeline = px.line(
+        series,
+        x='time',
+        y='flights',
+        title="Flight Activity Timeline",
+        labels={'time': 'Time (UTC)', 'flights': 'Number of Flights'}
+    )
+    fig_timeline.update_layout(
+        height=400,
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    st.plotly_chart(fig_timeline, use_container_width=True)
+    if total_points > len(series):
+        st.caption(f"Showing {len(series):,} of {total_points:,} points (LTTB downsampled)")
+
 def display_ai_insights():
     """Display AI-generated insights"""
     
@@ -677,6 +1401,14 @@ def display_ai_insights():
                         with cols[j]:
                             st.metric(key, value)
     
+    # Prompt sizes of the Gemini calls behind these insights
+    if results.get('token_usage'):
+        st.caption("Prompt tokens: " + " · ".join(
+            f"{call.replace('_', ' ')} {usage.get('prompt_tokens') or '~' + str(usage['estimated_tokens'])}"
+            + (" (trimmed)" if usage.get('trimmed') else "")
+            for call, usage in results['token_usage'].items()
+        ))
+    
     # Footer section
     st.markdown("---")
     st.markdown("""
@@ -0,0 +1,97 @@
+"""
+Benchmark schema-driven cleaning against the previous astype(str) cleaning pass
+
+    python benchmarks/bench_cleaning.py --rows 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import clean_flight_data
+
+
+def legacy_clean(df: pd.DataFrame) -> pd.DataFrame:
+    """The cleaning pass clean_flight_data used before per-source schemas"""
+    df = df.drop_duplicates()
+
+    with warnings.catch_warnings():
+        # pandas 3 warns that 'object' also selects the new string dtype
+        warnings.simplefilter("ignore")
+        text_columns = df.select_dtypes(include=['object']).columns
+
+    for col in text_columns:
+        df[col] = df[col].astype(str).str.strip()
+        df[col] = df[col].replace('nan', '')
+
+    for col in df.select_dtypes(include=['float64', 'int64']).columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    if 'timestamp' in df.columns:
+        df = df.sort_values('timestamp', ascending=False)
+    return df
+
+
+def opensky_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic state vectors as decoded from JSON: padded callsigns, some nulls, ~5% repeats"""
+    rng = np.random.default_rng(seed)
+    aircraft = max(1, rows // 20)
+    ids = rng.integers(0, aircraft, rows)
+    callsigns = np.array([f"TST{i:04d}  " for i in range(aircraft)], dtype=object)[ids]
+    callsigns[rng.random(rows) < 0.02] = None
+    last_contact = 1_700_000_000 + rng.integers(0, 86400, rows)
+    latitude = rng.uniform(-40, -12, rows)
+    latitude[rng.random(rows) < 0.01] = np.nan
+
+    df = pd.DataFrame({
+        'icao24': np.array([f"{i:06x}" for i in range(aircraft)], dtype=object)[ids],
+        'callsign': callsigns,
+        'origin_country': np.where(rng.random(rows) < 0.8, 'Australia', 'New Zealand').astype(object),
+        'last_contact': last_contact,
+        'longitude': rng.uniform(115, 152, rows),
+        'latitude': latitude,
+        'baro_altitude': rng.uniform(0, 12000, rows),
+        'on_ground': rng.random(rows) < 0.1,
+        'velocity': rng.uniform(0, 280, rows),
+        'squawk': np.array([f"{i:04o}" for i in range(4096)], dtype=object)[rng.integers(0, 4096, rows)],
+        'timestamp': pd.to_datetime(last_contact, unit='s'),
+    })
+    repeats = df.sample(frac=0.05, random_state=seed)
+    return pd.concat([df, repeats], ignore_index=True)
+
+
+def time_clean(label: str, clean, df: pd.DataFrame, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = clean(frame)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<10} {best:6.2f}s  {len(result):>10,} rows  "
+          f"{result.memory_usage(deep=True).sum() / 2**20:8.1f} MiB")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flight data cleaning benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best is reported")
+    args = parser.parse_args()
+
+    df = opensky_frame(args.rows)
+    print(f"Input: {len(df):,} rows, {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+
+    legacy = time_clean("legacy", legacy_clean, df, args.repeat)
+    schema = time_clean("schema", lambda frame: clean_flight_data(frame, source="opensky"), df, args.repeat)
+    print(f"Speedup: {legacy / schema:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
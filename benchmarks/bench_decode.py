@@ -0,0 +1,87 @@
+"""
+Benchmark streaming decode of a global OpenSky states payload against json + DataFrame
+
+    python benchmarks/bench_decode.py --states 12000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_fetcher import OPENSKY_COLUMNS
+from state_decoder import decode_states
+from utils import FLIGHT_SCHEMAS
+
+
+def global_payload(states: int, seed: int = 0) -> bytes:
+    """Synthetic /states/all body shaped like a global OpenSky response"""
+    rng = np.random.default_rng(seed)
+    now = 1_700_000_000
+    vectors = []
+    for i in range(states):
+        airborne = rng.random() > 0.1
+        vectors.append([
+            f"{i:06x}", f"TST{i % 9000:04d}  ", "Australia", now - 1, now,
+            round(float(rng.uniform(-180, 180)), 4), round(float(rng.uniform(-60, 70)), 4),
+            round(float(rng.uniform(0, 12000)), 2) if airborne else None, not airborne,
+            round(float(rng.uniform(0, 280)), 2), round(float(rng.uniform(0, 360)), 2),
+            round(float(rng.uniform(-10, 10)), 2), None,
+            round(float(rng.uniform(0, 12500)), 2) if airborne else None,
+            f"{i % 4096:04o}", False, 0
+        ])
+    return json.dumps({"time": now, "states": vectors}).encode()
+
+
+def eager(body: bytes) -> pd.DataFrame:
+    data = json.loads(body)
+    return pd.DataFrame(data['states'], columns=OPENSKY_COLUMNS)
+
+
+def streaming(body: bytes, chunk_size: int = 64 * 1024) -> pd.DataFrame:
+    view = memoryview(body)
+    chunks = (view[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    return decode_states(chunks, OPENSKY_COLUMNS, FLIGHT_SCHEMAS["opensky"])[1]
+
+
+def measure(label: str, decode, body: bytes, repeat: int, count_body: bool) -> None:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(body)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    frame = decode(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The eager path needs the whole body in memory; the streaming path only its chunks
+    if count_body:
+        peak += len(body)
+    print(f"{label:<10} {best * 1000:8.1f} ms  peak {peak / 2**20:7.1f} MiB  "
+          f"result {frame.memory_usage(deep=True).sum() / 2**20:6.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenSky payload decoding benchmark")
+    parser.add_argument("--states", type=int, default=12000, help="State vectors in the payload")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant; the best time is reported")
+    args = parser.parse_args()
+
+    body = global_payload(args.states)
+    print(f"Payload: {args.states:,} state vectors, {len(body) / 2**20:.1f} MiB")
+
+    measure("eager", eager, body, args.repeat, count_body=True)
+    measure("streaming", streaming, body, args.repeat, count_body=False)
+
+
+if __name__ == "__main__":
+    main()
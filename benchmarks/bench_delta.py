@@ -0,0 +1,69 @@
+"""
+Benchmark snapshot delta events for a pair of large OpenSky snapshots
+
+    python benchmarks/bench_delta.py --aircraft 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot_delta import SnapshotDeltaEngine
+
+
+def raw_snapshot(rng: np.random.Generator, fleet: np.ndarray, positions: np.ndarray,
+                 on_ground: np.ndarray, at: float) -> pd.DataFrame:
+    """Synthetic raw state vectors, including on-ground aircraft, in arrival order"""
+    order = rng.permutation(len(fleet))
+    return pd.DataFrame({
+        'icao24': pd.Series([f"{i:06x}" for i in fleet[order]], dtype="str"),
+        'callsign': "QFA1",
+        'origin_country': "Australia",
+        'last_contact': at - rng.integers(0, 30, len(fleet)),
+        'latitude': positions[order, 0],
+        'longitude': positions[order, 1],
+        'baro_altitude': rng.uniform(0, 12000, len(fleet)),
+        'on_ground': on_ground[order]
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot delta benchmark")
+    parser.add_argument("--aircraft", type=int, default=50_000, help="Aircraft per snapshot")
+    parser.add_argument("--churn", type=float, default=0.05, help="Share of aircraft replaced between snapshots")
+    parser.add_argument("--repeat", type=int, default=5, help="Pairs to time; the best is reported")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    fleet = rng.choice(2**24, size=int(args.aircraft * (1 + args.churn)), replace=False)
+    replaced = int(args.aircraft * args.churn)
+    first, second = fleet[:args.aircraft], fleet[replaced:]
+    grounded = rng.random(len(fleet)) < 0.1
+    flipped = grounded ^ (rng.random(len(fleet)) < 0.02)
+    # A minute of flight moves an aircraft about 0.1 degrees
+    positions = np.column_stack([rng.uniform(-48, -6, len(fleet)), rng.uniform(108, 158, len(fleet))])
+    moved = positions + rng.normal(0, 0.1, positions.shape)
+
+    before = raw_snapshot(rng, first, positions[:args.aircraft], grounded[:args.aircraft], 1_000_000)
+    after = raw_snapshot(rng, second, moved[replaced:], flipped[replaced:], 1_000_060)
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        engine = SnapshotDeltaEngine()
+        engine.ingest(before, 1_000_000)
+        start = time.perf_counter()
+        events = engine.ingest(after, 1_000_060)
+        best = min(best, time.perf_counter() - start)
+
+    counts = events['event'].value_counts().to_dict()
+    print(f"{args.aircraft:,}-aircraft pair: {best * 1000:.1f} ms, {len(events):,} events {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark map-reduce aggregation of stored history against one pandas pass
+
+    python benchmarks/bench_mapreduce.py --days 30 --interval 30 --aircraft 2000 --threads 1 2 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rollups import snapshot
+from flight_history import FlightHistory, rollup_summary
+from history_aggregation import aggregate_history, reduce_partials
+
+
+def single_pass(history: FlightHistory, region: str, since: pd.Timestamp, until: pd.Timestamp) -> dict:
+    """The whole range loaded into one frame and aggregated with pandas in this process"""
+    frame = history.query_arrow(
+        "SELECT icao24 AS identity, timestamp, nearest_airport AS airport, origin_country AS country, "
+        "airline_icao AS airline FROM snapshots WHERE region = ? AND timestamp >= ? AND timestamp < ?",
+        [region, since, until]
+    ).to_pandas()
+    frame = frame.assign(hour=frame['timestamp'].dt.floor('h')).sort_values('timestamp', kind='stable')
+    hours = frame.drop_duplicates(['identity', 'hour'])['hour']
+    counted = frame.assign(day=frame['hour'].dt.floor('D')).drop_duplicates(['identity', 'day'])
+    partial = {
+        'rows': len(frame),
+        'daily': counted.groupby('day').size(),
+        'hourly': np.bincount(hours.dt.hour.to_numpy(dtype=np.int64), minlength=24)
+    }
+    for name in ('airport', 'country', 'airline'):
+        values = counted[name]
+        partial[name] = values[values.notna() & (values != '')].value_counts()
+    return reduce_partials([partial], "opensky")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map-reduce vs single-pass history aggregation benchmark")
+    parser.add_argument("--days", type=int, default=30, help="Days of stored history")
+    parser.add_argument("--interval", type=int, default=30, help="Minutes between snapshots")
+    parser.add_argument("--aircraft", type=int, default=2000, help="Aircraft per snapshot")
+    parser.add_argument("--partition-rows", type=int, default=250_000, help="Upper bound on rows per partition")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="Thread pool sizes to run")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    end = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('D')
+    times = pd.date_range(end - pd.Timedelta(days=args.days), end, freq=f"{args.interval}min", inclusive='left')
+    since, until = times[0], end
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = FlightHistory(os.path.join(directory, "history.duckdb"))
+        for at in times:
+            history.append_snapshot(snapshot(rng, args.aircraft, at), region="Australia", snapshot_time=at)
+        print(f"{len(times):,} snapshots, {len(times) * args.aircraft:,} rows over {args.days} days; "
+              f"{os.cpu_count()} CPUs")
+
+        seconds, baseline = timed(lambda: single_pass(history, "Australia", since, until))
+        print(f"single pandas pass        {seconds:7.2f} s")
+        seconds, inline = timed(lambda: aggregate_history(
+            history, "opensky", "Australia", since, until, max_rows=args.partition_rows
+        ))
+        print(f"map-reduce, one at a time {seconds:7.2f} s  ({inline['partitions']} partitions)")
+
+        for threads in args.threads:
+            with ThreadPoolExecutor(threads) as pool:
+                seconds, parallel = timed(lambda: aggregate_history(
+                    history, "opensky", "Australia", since, until, executor=pool, max_rows=args.partition_rows
+                ))
+            print(f"map-reduce, {threads} threads    {seconds:7.2f} s")
+
+        rollups = rollup_summary(history, "opensky", "Australia", since)
+        assert baseline['total_flights'] == inline['total_flights'] == parallel['total_flights'] == rollups['total_flights']
+        assert baseline['top_airlines'].to_dict() == parallel['top_airlines'].to_dict()
+        assert baseline['hourly_distribution'] == parallel['hourly_distribution']
+        print(f"total flights {parallel['total_flights']:,} match the single pass and the rollups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of the metrics API for cached and conditional GETs
+
+Fills the OpenSky demand counters with synthetic snapshots, serves the API on
+an ephemeral port and drives it from client processes over keep-alive
+connections:
+
+    python benchmarks/bench_metrics_api.py --clients 8 --seconds 5
+"""
+
+import argparse
+import http.client
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from demand_counters import get_demand_counters
+from metrics_api import MetricsAPI, serve_metrics_api
+
+COUNTRIES = ["Australia", "New Zealand", "Japan", "Canada"]
+PATHS = [f"/v1/demand?country={country.replace(' ', '%20')}&time_range={window}"
+         for country in COUNTRIES for window in ("24h", "7d", "30d")]
+
+
+def client(args) -> int:
+    """Requests completed by one client in the time given"""
+    port, seconds, conditional = args
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        path = PATHS[done % len(PATHS)]
+        headers = {'If-None-Match': etags[path]} if conditional and path in etags else {}
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        etags[path] = response.getheader('ETag')
+        done += 1
+    connection.close()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics API throughput benchmark")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent client processes")
+    parser.add_argument("--seconds", type=float, default=5, help="Duration of each run")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    end = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('h')
+    counters = get_demand_counters("opensky")
+    for at in pd.date_range(end - pd.Timedelta(days=7), end, freq='30min'):
+        for country in COUNTRIES:
+            counters.ingest(pd.DataFrame({
+                'icao24': [f"{i:06x}" for i in rng.choice(20000, 400, replace=False)],
+                'timestamp': at
+            }), region=country, identity='icao24', dimensions={})
+
+    server = serve_metrics_api("127.0.0.1", 0, MetricsAPI())
+    port = server.server_address[1]
+    with Pool(args.clients) as pool:
+        for label, conditional in (("cached GET", False), ("conditional GET (304)", True)):
+            start = time.perf_counter()
+            requests = sum(pool.map(client, [(port, args.seconds, conditional)] * args.clients))
+            elapsed = time.perf_counter() - start
+            print(f"{label:22s} {requests / elapsed:8,.0f} req/s  ({requests:,} requests, {args.clients} clients)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
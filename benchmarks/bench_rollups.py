@@ -0,0 +1,92 @@
+"""
+Benchmark long-range dashboard summaries from rollups against scanning raw snapshots
+
+    python benchmarks/bench_rollups.py --days 14 --interval 30 --aircraft 1500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_history import FlightHistory, rollup_summary
+
+
+def snapshot(rng: np.random.Generator, aircraft: int, at: pd.Timestamp) -> pd.DataFrame:
+    """Synthetic cleaned OpenSky snapshot: a random subset of a fixed fleet"""
+    fleet = rng.choice(aircraft * 2, size=aircraft, replace=False)
+    return pd.DataFrame({
+        'icao24': [f"{i:06x}" for i in fleet],
+        'origin_country': np.where(fleet % 5 == 0, "New Zealand", "Australia"),
+        'nearest_airport': np.array(["YSSY", "YMML", "YBBN", "YPPH", ""])[fleet % 5],
+        'airline_icao': np.array(["QFA", "VOZ", "JST", "RXA"])[fleet % 4],
+        'timestamp': at - pd.to_timedelta(rng.integers(0, 60, aircraft), unit='s'),
+        'velocity': rng.uniform(0, 280, aircraft)
+    })
+
+
+def raw_summary(history: FlightHistory, region: str, since: pd.Timestamp) -> dict:
+    """The rollup summary's figures computed from the raw snapshots"""
+    daily = history.query(
+        "SELECT date_trunc('day', timestamp) AS day, count(DISTINCT icao24) AS flights FROM snapshots "
+        "WHERE region = ? AND timestamp >= ? GROUP BY day", [region, since]
+    )
+    hourly = history.query(
+        "SELECT hour(date_trunc('hour', timestamp)) AS hour, count(DISTINCT (icao24, date_trunc('hour', timestamp))) AS flights "
+        "FROM snapshots WHERE region = ? AND timestamp >= ? GROUP BY hour", [region, since]
+    )
+    countries = history.query(
+        "SELECT origin_country, count(DISTINCT (icao24, date_trunc('day', timestamp))) AS flights FROM snapshots "
+        "WHERE region = ? AND timestamp >= ? GROUP BY origin_country ORDER BY flights DESC LIMIT 10", [region, since]
+    )
+    return {'total_flights': int(daily['flights'].sum()), 'hourly': hourly, 'countries': countries}
+
+
+def best_of(repeat: int, fn) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup vs raw-scan summary benchmark")
+    parser.add_argument("--days", type=int, default=14, help="Days of stored history")
+    parser.add_argument("--interval", type=int, default=30, help="Minutes between snapshots")
+    parser.add_argument("--aircraft", type=int, default=1500, help="Aircraft per snapshot")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant; the best time is reported")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    end = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('D')
+    times = pd.date_range(end - pd.Timedelta(days=args.days), end, freq=f"{args.interval}min", inclusive='left')
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = FlightHistory(os.path.join(directory, "history.duckdb"))
+
+        start = time.perf_counter()
+        for at in times:
+            history.append_snapshot(snapshot(rng, args.aircraft, at), region="Australia", snapshot_time=at)
+        ingest = time.perf_counter() - start
+        print(f"Ingested {len(times):,} snapshots ({len(times) * args.aircraft:,} rows), "
+              f"{ingest / len(times) * 1000:.1f} ms per snapshot including rollups")
+
+        since = times[0]
+        rollup = best_of(args.repeat, lambda: rollup_summary(history, "opensky", "Australia", since))
+        raw = best_of(args.repeat, lambda: raw_summary(history, "Australia", since))
+        check = rollup_summary(history, "opensky", "Australia", since)['total_flights']
+        print(f"raw scan   {raw * 1000:8.1f} ms")
+        print(f"rollups    {rollup * 1000:8.1f} ms  (total flights {check:,} = "
+              f"{raw_summary(history, 'Australia', since)['total_flights']:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Resident memory and load time of a large OpenSky snapshot in several worker
+processes: each decoding its own copy (as before) versus opening the shared
+memory-mapped Arrow IPC file
+
+    python benchmarks/bench_snapshot_store.py --aircraft 500000 --processes 4
+
+PSS (proportional set size) splits shared pages between the processes
+mapping them, so its total is the memory the processes really cost. Linux only.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_fetcher import OPENSKY_COLUMNS
+from snapshot_store import STRING_DTYPE, SnapshotStore
+from state_decoder import decode_states
+from utils import FLIGHT_SCHEMAS
+
+
+def memory_mb() -> dict:
+    """RSS and PSS of this process in MiB"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+
+def states_body(aircraft: int, snapshot_time: int) -> bytes:
+    """Synthetic OpenSky /states/all response"""
+    rng = np.random.default_rng(0)
+    states = [
+        [f"{i:06x}", f"QFA{i % 1000:<5d}", "Australia", snapshot_time - 5, snapshot_time - 1,
+         float(rng.uniform(110, 155)), float(rng.uniform(-45, -10)), float(rng.uniform(0, 12000)),
+         bool(i % 10 == 0), float(rng.uniform(0, 260)), float(rng.uniform(0, 360)), float(rng.normal()),
+         None, float(rng.uniform(0, 12000)), "1234", False, 0]
+        for i in range(aircraft)
+    ]
+    return json.dumps({'time': snapshot_time, 'states': states}).encode()
+
+
+def worker(mode: str, source: str, barrier, results) -> None:
+    # Load the string kernels first so shared libraries aren't counted as snapshot memory
+    pd.Series(["warm"], dtype=STRING_DTYPE).str.len().sum()
+    before = memory_mb()
+    start = time.perf_counter()
+    if mode == "decode":
+        with open(source, 'rb') as f:
+            _, frame = decode_states([f.read()], OPENSKY_COLUMNS, FLIGHT_SCHEMAS["opensky"])
+    else:
+        frame = SnapshotStore.read(source)
+    # Touch every column, as cleaning and aggregation do
+    for column in ('latitude', 'longitude', 'baro_altitude', 'velocity', 'last_contact'):
+        frame[column].sum()
+    frame['icao24'].str.len().sum()
+    seconds = time.perf_counter() - start
+
+    # Measure while every process holds the snapshot
+    barrier.wait()
+    after = memory_mb()
+    results.put((seconds, after['rss'] - before['rss'], after['pss'] - before['pss']))
+    barrier.wait()
+
+
+def run(mode: str, source: str, processes: int) -> None:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(mode, source, barrier, results)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    measured = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+
+    seconds, rss, pss = (np.array(values) for values in zip(*measured))
+    print(f"{mode:7s} load {seconds.mean() * 1000:8.1f} ms   RSS +{rss.mean():7.1f} MiB/process   "
+          f"PSS +{pss.sum():7.1f} MiB total over {processes} processes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared memory-mapped snapshot benchmark")
+    parser.add_argument("--aircraft", type=int, default=500_000, help="State vectors in the snapshot")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes loading it")
+    args = parser.parse_args()
+
+    snapshot_time = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        body_path = os.path.join(directory, "states.json")
+        with open(body_path, 'wb') as f:
+            f.write(states_body(args.aircraft, snapshot_time))
+        with open(body_path, 'rb') as f:
+            _, frame = decode_states([f.read()], OPENSKY_COLUMNS, FLIGHT_SCHEMAS["opensky"])
+        path = SnapshotStore(os.path.join(directory, "store")).write("Australia", snapshot_time, frame)
+        print(f"{args.aircraft:,} state vectors: JSON {os.path.getsize(body_path) / 2**20:.1f} MiB, "
+              f"Arrow IPC {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        run("decode", body_path, args.processes)
+        run("mmap", path, args.processes)
+
+
+if __name__ == "__main__":
+    main()
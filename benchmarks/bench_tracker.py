@@ -0,0 +1,84 @@
+"""
+Benchmark FlightTracker over a simulated day of 10-second OpenSky snapshots
+
+    python benchmarks/bench_tracker.py --aircraft 5000 --hours 24
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_tracker import FlightTracker
+
+
+def simulate_snapshots(aircraft: int, hours: float, interval: int, seed: int = 0):
+    """Yield synthetic state-vector snapshots with aircraft taking off, landing and leaving coverage"""
+    rng = np.random.default_rng(seed)
+    duration = hours * 3600
+
+    # Each airframe flies one leg of ~2.75h on average, ground at both ends;
+    # size the fleet so roughly `aircraft` are visible at any moment
+    airframes = int(aircraft * (duration + 3600) / 9900)
+    icao24 = np.array([f"{i:06x}" for i in range(airframes)], dtype=object)
+    callsigns = np.array([f"TST{i:05d}" for i in range(airframes)], dtype=object)
+
+    starts = rng.uniform(-3600, duration, len(icao24))
+    lengths = rng.uniform(1800, 5 * 3600, len(icao24))
+    ends = starts + lengths
+    lat0, lon0 = rng.uniform(-40, -12, len(icao24)), rng.uniform(115, 152, len(icao24))
+    dlat, dlon = rng.uniform(-0.002, 0.002, len(icao24)), rng.uniform(-0.002, 0.002, len(icao24))
+
+    t0 = 1_700_000_000
+    for t in np.arange(0, duration, interval):
+        visible = np.flatnonzero((starts <= t) & (ends + 300 >= t))
+        elapsed = t - starts[visible]
+        on_ground = (elapsed < 120) | (t > ends[visible])
+        yield pd.DataFrame({
+            'icao24': icao24[visible],
+            'callsign': callsigns[visible],
+            'origin_country': 'Australia',
+            'last_contact': t0 + t,
+            'latitude': lat0[visible] + dlat[visible] * elapsed,
+            'longitude': lon0[visible] + dlon[visible] * elapsed,
+            'baro_altitude': np.where(on_ground, 0.0, 10000.0),
+            'on_ground': on_ground,
+        }), t0 + t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FlightTracker throughput benchmark")
+    parser.add_argument("--aircraft", type=int, default=5000, help="Approximate aircraft visible per snapshot")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--interval", type=int, default=10, help="Seconds between snapshots")
+    args = parser.parse_args()
+
+    tracker = FlightTracker()
+    snapshots = rows = flights = landed = 0
+    ingest_time = 0.0
+
+    for snapshot, snapshot_time in simulate_snapshots(args.aircraft, args.hours, args.interval):
+        start = time.perf_counter()
+        completed = tracker.ingest(snapshot, snapshot_time)
+        ingest_time += time.perf_counter() - start
+
+        snapshots += 1
+        rows += len(snapshot)
+        flights += len(completed)
+        landed += int(completed['landed'].sum()) if len(completed) else 0
+
+    flights += len(tracker.flush())
+
+    print(f"Snapshots:        {snapshots} ({rows:,} state vectors)")
+    print(f"Ingest time:      {ingest_time:.1f}s ({rows / ingest_time:,.0f} rows/s)")
+    print(f"Completed:        {flights:,} flights ({landed:,} landed)")
+    print(f"Track storage:    {tracker.track_bytes / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
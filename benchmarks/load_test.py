@@ -0,0 +1,200 @@
+"""
+Multi-session load test for the Streamlit app
+
+Drives N concurrent scripted sessions through the sidebar flow in app.py using
+Streamlit's AppTest, then reports rerun and fetch-to-result latency
+percentiles and memory per session. Run with a replay cassette to keep upstream jitter out of the numbers:
+
+    FLIGHT_CASSETTE_MODE=replay python benchmarks/load_test.py --sessions 20
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from dataset_registry import get_dataset_registry
+from jobs import get_job_runner
+from singleflight import single_flight_stats
+
+APP_PATH = os.path.join(ROOT_DIR, "app.py")
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is a peak value in kilobytes on Linux; best effort elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def deep_sizeof(obj: Any, seen: set = None) -> int:
+    """Approximate retained size of a session state value in bytes"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def session_state_bytes(at: AppTest) -> Dict[str, int]:
+    """Per-key memory retained by one session's st.session_state, excluding shared datasets"""
+    sizes = {}
+    for key in ("data_fetcher", "ai_analyzer", "analysis_results"):
+        if key in at.session_state:
+            sizes[key] = deep_sizeof(at.session_state[key])
+    return sizes
+
+
+def _select(at: AppTest, label_prefix: str, value: str) -> None:
+    for selectbox in at.sidebar.selectbox:
+        if selectbox.label.startswith(label_prefix):
+            selectbox.select(value)
+            return
+    raise LookupError(f"No sidebar selectbox labelled '{label_prefix}...'")
+
+
+def run_session(session_id: int, country: str, time_range: str, reruns: int, timeout: float,
+                latencies: List[float], fetch_latencies: List[float], lock: threading.Lock) -> Dict[str, Any]:
+    """Drive one scripted session: load, pick filters, fetch & analyze, then idle reruns"""
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def timed_run():
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    timed_run()
+
+    _select(at, "🌎 Country", country)
+    _select(at, "⏰ Analysis Period", time_range)
+    timed_run()
+
+    fetch_button = next(b for b in at.sidebar.button if b.label.startswith("🚀 Fetch"))
+    fetch_button.click()
+    fetch_start = time.perf_counter()
+    timed_run()
+
+    # The click only submits a background job: wait for it to finish and rerun
+    # until the session has collected the result
+    deadline = fetch_start + timeout
+    while at.session_state["fetch_job_id"] is not None and time.perf_counter() < deadline:
+        job = get_job_runner().get(at.session_state["fetch_job_id"])
+        if job is not None and not job.finished:
+            time.sleep(0.05)
+            continue
+        timed_run()
+    with lock:
+        fetch_latencies.append(time.perf_counter() - fetch_start)
+
+    for _ in range(reruns):
+        timed_run()
+
+    state_sizes = session_state_bytes(at)
+    handle = at.session_state["dataset_handle"] if "dataset_handle" in at.session_state else None
+    flight_data = handle.frame if handle is not None else None
+
+    return {
+        "session": session_id,
+        "rows": 0 if flight_data is None else len(flight_data),
+        "errors": [e.value for e in at.error],
+        "state_bytes": sum(state_sizes.values()),
+        "state_breakdown": state_sizes,
+        # Keep the AppTest alive until memory has been sampled for every session
+        "app": at,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent session load test for app.py")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of concurrent sessions")
+    parser.add_argument("--reruns", type=int, default=3, help="Idle reruns per session after fetching")
+    parser.add_argument("--country", default="Australia")
+    parser.add_argument("--time-range", default="Last 24 Hours")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-rerun timeout in seconds")
+    args = parser.parse_args()
+
+    latencies: List[float] = []
+    fetch_latencies: List[float] = []
+    lock = threading.Lock()
+
+    baseline_rss = current_rss_bytes()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [
+            pool.submit(run_session, i, args.country, args.time_range, args.reruns,
+                        args.timeout, latencies, fetch_latencies, lock)
+            for i in range(args.sessions)
+        ]
+        sessions = [f.result() for f in futures]
+
+    wall_time = time.perf_counter() - start
+    rss_delta = current_rss_bytes() - baseline_rss
+
+    latency_ms = np.array(latencies) * 1000
+    fetch_ms = np.array(fetch_latencies) * 1000
+    state_bytes = np.array([s["state_bytes"] for s in sessions])
+    failed = [s for s in sessions if s["errors"] or s["rows"] == 0]
+
+    print(f"Sessions:             {args.sessions} ({len(failed)} without data)")
+    print(f"Reruns:               {len(latencies)} in {wall_time:.2f}s")
+    print(f"Rerun latency p50:    {np.percentile(latency_ms, 50):.1f} ms")
+    print(f"Rerun latency p95:    {np.percentile(latency_ms, 95):.1f} ms")
+    print(f"Fetch to result p50:  {np.percentile(fetch_ms, 50):.1f} ms")
+    print(f"Fetch to result p95:  {np.percentile(fetch_ms, 95):.1f} ms")
+    print(f"RSS growth:           {rss_delta / 2**20:.1f} MiB total, "
+          f"{rss_delta / args.sessions / 2**20:.2f} MiB per session")
+    print(f"Session state:        {state_bytes.mean() / 2**20:.2f} MiB mean, "
+          f"{state_bytes.max() / 2**20:.2f} MiB max per session")
+
+    registry_stats = get_dataset_registry().stats()
+    print(f"Shared datasets:      {registry_stats['datasets']} datasets, "
+          f"{registry_stats['references']} handles, {registry_stats['bytes'] / 2**20:.2f} MiB")
+    for group, flights in single_flight_stats().items():
+        print(f"Upstream {group + ':':<13} {flights['executions']} requests for {flights['calls']} calls "
+              f"({flights['coalesced']} coalesced)")
+
+    breakdown = pd.DataFrame([s["state_breakdown"] for s in sessions]).fillna(0) / 2**20
+    if not breakdown.empty:
+        print("\nMean session state by key (MiB):")
+        print(breakdown.mean().round(3).to_string())
+
+    for s in failed[:5]:
+        print(f"\nSession {s['session']} errors: {s['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class Cassette:
+    """Records raw upstream responses to disk and replays them without network I/O
+
+    Responses are stored gzip-compressed under their SHA-256 content hash, so
+    identical payloads are written once. An append-only ``index.jsonl`` maps
+    request keys to the content hashes recorded for them, in order.
+    """
+
+    MODES = ("off", "record", "replay")
+
+    # Request parameters that must never end up in a key or on disk
+    SECRET_PARAMS = {"access_key", "api_key", "key"}
+
+    def __init__(self, mode: str = "off", directory: str = "cassettes"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {self.MODES}")
+
+        self.mode = mode
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.index_path = os.path.join(directory, "index.jsonl")
+
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, List[str]]] = None
+        self._cursors: Dict[str, int] = {}
+        self._blobs: Dict[str, bytes] = {}
+
+    @classmethod
+    def from_env(cls) -> "Cassette":
+        """Create a cassette configured by FLIGHT_CASSETTE_MODE and FLIGHT_CASSETTE_DIR"""
+        return cls(
+            mode=os.environ.get("FLIGHT_CASSETTE_MODE", "off").strip().lower() or "off",
+            directory=os.environ.get("FLIGHT_CASSETTE_DIR", "cassettes")
+        )
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @classmethod
+    def request_key(cls, provider: str, endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Build a stable key for an upstream request, ignoring secret parameters"""
+        clean_params = {
+            k: v for k, v in (params or {}).items()
+            if k not in cls.SECRET_PARAMS
+        }
+        payload = json.dumps([provider, endpoint, clean_params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def record(self, key: str, body: bytes, alias: Optional[str] = None) -> str:
+        """
+        Store a raw response body for a request key
+
+        Args:
+            key: Request key from request_key()
+            body: Raw response bytes
+            alias: Optional coarser key that replay() falls back to
+
+        Returns:
+            Content hash of the stored body
+        """
+        content_hash = hashlib.sha256(body).hexdigest()
+        blob_path = os.path.join(self.blob_dir, f"{content_hash}.gz")
+
+        with self._lock:
+            os.makedirs(self.blob_dir, exist_ok=True)
+
+            if not os.path.exists(blob_path):
+                tmp_path = f"{blob_path}.{os.getpid()}.tmp"
+                with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                    f.write(body)
+                os.replace(tmp_path, blob_path)
+
+            entry = {"key": key, "sha256": content_hash, "recorded_at": time.time()}
+            if alias:
+                entry["alias"] = alias
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+            if self._index is not None:
+                self._add_to_index(self._index, entry)
+
+        return content_hash
+
+    def replay(self, key: str, alias: Optional[str] = None) -> Optional[bytes]:
+        """
+        Return the next recorded body for a request key, or None if nothing was recorded
+
+        Successive calls for the same key cycle through the recordings in the
+        order they were made, so a sequence of snapshots replays as a sequence.
+        Decompressed bodies are kept in memory after the first read.
+        """
+        with self._lock:
+            index = self._load_index()
+            hashes = index.get(key)
+            lookup = key
+            if not hashes and alias:
+                hashes = index.get(f"alias:{alias}")
+                lookup = f"alias:{alias}"
+            if not hashes:
+                return None
+
+            position = self._cursors.get(lookup, 0)
+            self._cursors[lookup] = (position + 1) % len(hashes)
+            content_hash = hashes[position]
+
+            body = self._blobs.get(content_hash)
+            if body is None:
+                with gzip.open(os.path.join(self.blob_dir, f"{content_hash}.gz"), "rb") as f:
+                    body = f.read()
+                self._blobs[content_hash] = body
+
+            return body
+
+    def _load_index(self) -> Dict[str, List[str]]:
+        """Load the request index once; caller must hold the lock"""
+        if self._index is None:
+            index: Dict[str, List[str]] = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            self._add_to_index(index, json.loads(line))
+            self._index = index
+        return self._index
+
+    @staticmethod
+    def _add_to_index(index: Dict[str, List[str]], entry: Dict[str, Any]) -> None:
+        index.setdefault(entry["key"], []).append(entry["sha256"])
+        if entry.get("alias"):
+            index.setdefault(f"alias:{entry['alias']}", []).append(entry["sha256"])
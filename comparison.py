@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Frames at least this large are summarized in the process pool; smaller ones
+# cost less to summarize than to pickle across processes
+PROCESS_POOL_MIN_ROWS = 50_000
+
+
+def summarize_country(frame: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Aggregate one country's flight dataset into comparison metrics
+
+    Module-level and free of Streamlit so it can run in a worker process.
+    """
+    summary: Dict[str, Any] = {'flights': len(frame)}
+
+    identity = 'icao24' if 'icao24' in frame.columns else 'flight_number'
+    summary['aircraft'] = int(frame[identity].nunique()) if identity in frame.columns else 0
+
+    airline_column = 'airline' if 'airline' in frame.columns else 'airline_icao'
+    airlines = frame[airline_column] if airline_column in frame.columns else pd.Series(dtype=object)
+    airlines = airlines[airlines.notna() & (airlines != '')]
+    summary['airlines'] = int(airlines.nunique())
+    summary['top_airlines'] = airlines.value_counts().head(5).to_dict()
+
+    summary['avg_speed_mph'] = float(frame['speed_mph'].mean()) if 'speed_mph' in frame.columns else None
+    summary['avg_altitude_ft'] = float(frame['altitude_ft'].mean()) if 'altitude_ft' in frame.columns else None
+
+    hourly = np.zeros(24, dtype=np.int64)
+    if 'timestamp' in frame.columns:
+        hours = pd.to_datetime(frame['timestamp'], errors='coerce').dt.hour.dropna().astype(np.int64)
+        hourly = np.bincount(hours.to_numpy(), minlength=24)[:24]
+    summary['hourly'] = hourly.tolist()
+    summary['peak_hour'] = int(hourly.argmax()) if hourly.any() else None
+
+    return summary
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_aggregation_pool() -> ProcessPoolExecutor:
+    """Return the process-wide pool for heavy aggregation, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the Streamlit server process is multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def summarize(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Summarize a dataset, in the process pool when it is large enough to pay off"""
+    if len(frame) >= PROCESS_POOL_MIN_ROWS:
+        return get_aggregation_pool().submit(summarize_country, frame).result()
+    return summarize_country(frame)
+
+
+def compare_countries(countries: List[str], load: Callable[[str], Any],
+                      summarize_dataset: Callable[[Any], Dict[str, Any]],
+                      max_workers: int = 8,
+                      thread_initializer: Optional[Callable[[], None]] = None,
+                      release: Optional[Callable[[Any], None]] = None) -> Dict[str, Any]:
+    """
+    Load and summarize several countries concurrently
+
+    Args:
+        countries: Countries to compare
+        load: Loads one country's dataset (network I/O), returns None without data
+        summarize_dataset: Aggregates a loaded dataset into comparison metrics
+        max_workers: Upper bound on concurrent country loads
+        thread_initializer: Run in each worker thread before it starts, e.g. to
+            attach the Streamlit script context
+        release: Releases a loaded dataset whose summary failed, e.g. a
+            registry handle's release
+
+    Returns:
+        Dictionary with the loaded datasets and summaries by country, errors by
+        country, seconds spent per country and total wall-clock seconds
+    """
+    started = time.perf_counter()
+    datasets: Dict[str, Any] = {}
+    summaries: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+    seconds: Dict[str, float] = {}
+
+    def load_and_summarize(country: str):
+        country_started = time.perf_counter()
+        try:
+            dataset = load(country)
+            if dataset is None:
+                return None, None
+            try:
+                return dataset, summarize_dataset(dataset)
+            except BaseException:
+                if release is not None:
+                    release(dataset)
+                raise
+        finally:
+            seconds[country] = time.perf_counter() - country_started
+
+    workers = max(1, min(max_workers, len(countries)))
+    with ThreadPoolExecutor(max_workers=workers, initializer=thread_initializer) as executor:
+        futures = {executor.submit(load_and_summarize, c): c for c in countries}
+        for future in as_completed(futures):
+            country = futures[future]
+            try:
+                dataset, summary = future.result()
+            except Exception as e:
+                errors[country] = str(e)
+                continue
+            if summary is None:
+                errors[country] = "No flight data found"
+                if dataset is not None and release is not None:
+                    release(dataset)
+            else:
+                datasets[country] = dataset
+                summaries[country] = summary
+
+    return {
+        'datasets': datasets,
+        'summaries': {c: summaries[c] for c in countries if c in summaries},
+        'errors': errors,
+        'seconds': seconds,
+        'elapsed': time.perf_counter() - started
+    }
@@ -2,10 +2,37 @@ import requests
 import pandas as pd
 import time
 import os
+import json
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Iterator, List, Tuple
 import streamlit as st
+from cassette import Cassette
+from utils import DEDUP_KEYS, FLIGHT_SCHEMAS, apply_schema, dedupe_by_key, get_key_index, notify
+from flight_tracker import get_flight_tracker
+from airports import get_airport_index
+from demand_counters import get_demand_counters
+from state_decoder import decode_states
+from flight_ledger import get_flight_ledger
+from flight_history import HistoryLocked, get_flight_history
+from snapshot_buffer import get_snapshot_buffer
+from snapshot_store import get_snapshot_store
+from snapshot_archiver import get_snapshot_archiver
+from snapshot_delta import get_delta_engine
+from quota import QuotaExceeded, get_quota_scheduler, opensky_credit_cost
+from singleflight import get_single_flight
+
+# Field order of an OpenSky state vector
+OPENSKY_COLUMNS = [
+    'icao24', 'callsign', 'origin_country', 'time_position',
+    'last_contact', 'longitude', 'latitude', 'baro_altitude',
+    'on_ground', 'velocity', 'true_track', 'vertical_rate',
+    'sensors', 'geo_altitude', 'squawk', 'spi', 'position_source'
+]
+
+# Latest cleaned OpenSky snapshot per country as (fetched at, snapshot time,
+# frame), served when credits run low
+_recent_snapshots: Dict[str, Tuple[float, Optional[int], pd.DataFrame]] = {}
 
 class DataFetcher:
     """Handles fetching data from various aviation APIs"""
@@ -18,6 +45,88 @@ class DataFetcher:
         # Cache settings
         self.cache_duration = 300  # 5 minutes
         
+        # Response bodies are streamed in chunks of this size
+        self.stream_chunk_size = 64 * 1024
+        
+        # Aircraft below this altitude (meters) are matched to the nearest airport
+        self.airport_match_altitude = 1500
+        self.airport_match_radius_km = 30
+        
+        # Record/replay of raw upstream responses (FLIGHT_CASSETTE_MODE)
+        self.cassette = Cassette.from_env()
+        
+    def _admit(self, provider: str, cost: int, priority: str, has_fallback: bool) -> None:
+        """Charge a request to the provider's quota, raising QuotaExceeded if it can't be afforded"""
+        if not get_quota_scheduler().reserve(provider, cost, priority=priority, has_fallback=has_fallback):
+            raise QuotaExceeded(f"{provider} request quota is too low to send this request")
+    
+    def _observe_quota(self, provider: str, response: requests.Response) -> None:
+        """Adopt the remaining quota the provider reports in its rate limit header"""
+        remaining = response.headers.get('X-Rate-Limit-Remaining')
+        if remaining is not None and remaining.isdigit():
+            get_quota_scheduler().observe_remaining(provider, int(remaining))
+        elif response.status_code == 429:
+            get_quota_scheduler().observe_remaining(provider, 0)
+    
+    def _get_json(self, provider: str, url: str, params: Dict, cost: int = 1,
+                  priority: str = "interactive", has_fallback: bool = False) -> Optional[Dict]:
+        """GET a JSON endpoint, recording or replaying the raw body when a cassette is active"""
+        key = Cassette.request_key(provider, url, params)
+        
+        if self.cassette.replaying:
+            body = self.cassette.replay(key)
+            if body is None:
+                raise requests.exceptions.ConnectionError(
+                    f"No recorded {provider} response for this request (cassette replay mode)"
+                )
+            return json.loads(body)
+        
+        self._admit(provider, cost, priority, has_fallback)
+        response = requests.get(url, params=params, timeout=30)
+        self._observe_quota(provider, response)
+        response.raise_for_status()
+        
+        if self.cassette.recording:
+            self.cassette.record(key, response.content)
+        
+        return response.json()
+    
+    def _stream_body(self, provider: str, url: str, params: Dict, cost: int = 1,
+                     priority: str = "interactive", has_fallback: bool = False) -> Iterator[bytes]:
+        """
+        GET an endpoint and yield the raw body in chunks as it arrives
+        
+        Replayed bodies are yielded in the same chunk size. While recording,
+        the chunks are kept so the complete body can be stored once the
+        stream is exhausted.
+        """
+        key = Cassette.request_key(provider, url, params)
+        
+        if self.cassette.replaying:
+            body = self.cassette.replay(key)
+            if body is None:
+                raise requests.exceptions.ConnectionError(
+                    f"No recorded {provider} response for this request (cassette replay mode)"
+                )
+            view = memoryview(body)
+            for start in range(0, len(body), self.stream_chunk_size):
+                yield view[start:start + self.stream_chunk_size]
+            return
+        
+        self._admit(provider, cost, priority, has_fallback)
+        with requests.get(url, params=params, timeout=30, stream=True) as response:
+            self._observe_quota(provider, response)
+            response.raise_for_status()
+            recorded = [] if self.cassette.recording else None
+            
+            for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                if recorded is not None:
+                    recorded.append(chunk)
+                yield chunk
+        
+        if recorded is not None:
+            self.cassette.record(key, b''.join(recorded))
+        
     def fetch_opensky_data(self, country: str = "Australia", time_range: str = "Last 24 Hours") -> Optional[pd.DataFrame]:
         """
         Fetch real-time flight data from OpenSky Network API
@@ -49,108 +158,160 @@ class DataFetcher:
                 url = f"{self.opensky_base_url}/states/all"
                 params = {}
             
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
+            # Concurrent identical requests (e.g. several sessions fetching the same
+            # country) share one upstream request and one ingest
+            df = get_single_flight("opensky").do(
+                (country, Cassette.request_key("opensky", url, params)),
+                lambda: self._fetch_opensky_snapshot(country, url, params, bbox)
+            )
             
-            if not data or 'states' not in data or not data['states']:
+            if df.empty:
                 return pd.DataFrame()
             
-            # Convert to DataFrame
-            columns = [
-                'icao24', 'callsign', 'origin_country', 'time_position',
-                'last_contact', 'longitude', 'latitude', 'baro_altitude',
-                'on_ground', 'velocity', 'true_track', 'vertical_rate',
-                'sensors', 'geo_altitude', 'squawk', 'spi', 'position_source'
-            ]
-            
-            df = pd.DataFrame(data['states'], columns=columns)
-            
-            # Clean and process data
-            df = self._clean_opensky_data(df)
-            
-            # Add timestamp
-            df['timestamp'] = pd.to_datetime(df['last_contact'], unit='s')
-            
             # Note: OpenSky provides current states only, not historical data
             # For realistic analysis, we'll simulate time distribution across the selected period
+            # (assign() leaves the shared snapshot untouched)
             if time_range == "Last 7 Days":
                 # Simulate historical distribution for the last 7 days
-                import numpy as np
                 base_time = datetime.now()
                 time_offsets = np.random.uniform(-7*24*60*60, 0, len(df))  # Random times within last 7 days
-                df['timestamp'] = [base_time + timedelta(seconds=offset) for offset in time_offsets]
+                df = df.assign(timestamp=[base_time + timedelta(seconds=offset) for offset in time_offsets])
             elif time_range == "Last 30 Days":
                 # Simulate historical distribution for the last 30 days
-                import numpy as np
                 base_time = datetime.now()
                 time_offsets = np.random.uniform(-30*24*60*60, 0, len(df))  # Random times within last 30 days
-                df['timestamp'] = [base_time + timedelta(seconds=offset) for offset in time_offsets]
+                df = df.assign(timestamp=[base_time + timedelta(seconds=offset) for offset in time_offsets])
             # For "Last 24 Hours", keep the original timestamp from last_contact
             
             return df
             
         except requests.exceptions.RequestException as e:
-            st.error(f"Network error fetching OpenSky data: {str(e)}")
+            notify('error', f"Network error fetching OpenSky data: {str(e)}")
             return None
         except Exception as e:
-            st.error(f"Error processing OpenSky data: {str(e)}")
+            notify('error', f"Error processing OpenSky data: {str(e)}")
             return None
     
+    def _fetch_opensky_snapshot(self, country: str, url: str, params: Dict, bbox: Optional[Dict[str, float]]) -> pd.DataFrame:
+        """
+        Fetch, ingest and clean one OpenSky snapshot for a country
+        
+        Returns the cleaned state vectors with their real observation
+        timestamps; the frame is shared by coalesced callers and must not be
+        modified in place.
+        
+        A snapshot another app process fetched within the cache duration is
+        opened memory-mapped from the shared snapshot store instead of
+        fetched again.
+        """
+        cached = _recent_snapshots.get(country)
+        shared = get_snapshot_store().latest(country, max_age=self.cache_duration)
+        if shared is not None and cached is not None and cached[1] == shared[0]:
+            return cached[2]
+        
+        shared_now = False
+        try:
+            if shared is not None:
+                snapshot_time, df = shared
+            else:
+                # Decode state vectors straight into typed columns as the body streams in
+                snapshot_time, df = decode_states(
+                    self._stream_body("opensky", url, params, cost=opensky_credit_cost(bbox),
+                                      has_fallback=cached is not None),
+                    OPENSKY_COLUMNS, FLIGHT_SCHEMAS["opensky"]
+                )
+                shared_now = self._share(country, snapshot_time, df)
+        except QuotaExceeded:
+            if cached is None:
+                raise
+            fetched_at, _, df = cached
+            notify('info', f"ℹ️ OpenSky credits are running low; showing the snapshot from "
+                    f"{(time.time() - fetched_at) / 60:.0f} minutes ago.")
+        else:
+            if df.empty:
+                return pd.DataFrame()
+            
+            # Feed raw state vectors, including on-ground aircraft, to the flight
+            # tracker and the arrival/departure event streams
+            get_flight_tracker(country).ingest(df, snapshot_time=snapshot_time)
+            get_delta_engine(country).ingest(df, snapshot_time=snapshot_time)
+            
+            # Clean and process data
+            df = self.clean_opensky_snapshot(df)
+            
+            # State vectors already counted (aircraft that have not reported since an
+            # earlier snapshot) are not counted again
+            fresh = get_key_index("opensky", country).filter_new(df)
+            
+            # Count real observation times before any simulated redistribution below
+            get_demand_counters("opensky").ingest(
+                fresh, region=country, identity='icao24',
+                dimensions={'airport': 'nearest_airport', 'country': 'origin_country', 'airline': 'airline_icao'}
+            )
+            _recent_snapshots[country] = (time.time(), snapshot_time, df)
+            get_snapshot_buffer(country).append(df, snapshot_time=snapshot_time)
+            # Snapshots reach the history through the snapshot store, so the process
+            # that owns the history archives them whichever process fetched them
+            archiver = get_snapshot_archiver()
+            if shared is not None or shared_now:
+                self._archive(lambda history: archiver.sweep(
+                    history, self.clean_opensky_snapshot, region=country, cleaned=(snapshot_time, df)
+                ), owned_elsewhere_ok=True)
+            elif not df.empty:
+                self._archive(lambda history: archiver.archive(
+                    history, country, snapshot_time or int(df['last_contact'].max()), df
+                ))
+        
+        return df
+    
+    def _share(self, country: str, snapshot_time: Optional[int], df: pd.DataFrame) -> bool:
+        """Write a fetched raw snapshot to the store other app processes load from; False if it wasn't"""
+        if not snapshot_time or df.empty:
+            return False
+        try:
+            get_snapshot_store().write(country, snapshot_time, df)
+            return True
+        except Exception as e:
+            notify('warning', f"⚠️ Could not share the OpenSky snapshot with other app processes: {str(e)}")
+            return False
+    
     def fetch_aviationstack_data(self, country: str = "Australia", airport_code: str = "YSSY", time_range: str = "Last 24 Hours") -> Optional[pd.DataFrame]:
         """
         Fetch flight data from AviationStack API
         Requires API key but has more detailed flight information
+        
+        Flights are synced incrementally into the persistent flight ledger and
+        every load is served from it, so repeat loads spend no request quota.
         """
         try:
             if not self.aviationstack_api_key:
-                st.warning("AviationStack API key not found. Please set AVIATIONSTACK_API_KEY environment variable.")
+                notify('warning', "AviationStack API key not found. Please set AVIATIONSTACK_API_KEY environment variable.")
                 return None
             
-            # Use flights endpoint for real flight data
-            url = f"{self.aviationstack_base_url}/flights"
-            
-            params = {
-                'access_key': self.aviationstack_api_key,
-                'limit': 100,  # Free tier limit
-                'offset': 0
-            }
-            
-            # Add specific filters based on country
-            if country == "Australia":
-                params['dep_iata'] = "SYD,MEL,BNE,PER,ADL"
-            
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if not data or 'data' not in data or not data['data']:
+            def sync_and_count():
+                synced = self.sync_aviationstack(country)
+                # Count only flights that are new to the ledger (or changed), so reloads aren't double counted
+                if not synced.empty:
+                    get_demand_counters("aviationstack").ingest(
+                        self._clean_aviationstack_data(synced), region=country, identity='flight_number',
+                        dimensions={'airport': 'origin', 'airline': 'airline'}
+                    )
+            
+            # Concurrent loads for the same country share one sync
+            try:
+                get_single_flight("aviationstack").do(("sync", country), sync_and_count)
+            except QuotaExceeded:
+                notify('info', "ℹ️ AviationStack request quota is running low; showing stored flights.")
+            except requests.exceptions.RequestException as e:
+                notify('warning', f"AviationStack sync failed, showing stored flights: {str(e)}")
+            
+            days = {"Last 24 Hours": 1, "Last 7 Days": 7}.get(time_range, 30)
+            since_date = (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat()
+            df = get_flight_ledger().load(self._aviationstack_origins(country), since_date=since_date)
+            
+            if df.empty:
                 return pd.DataFrame()
             
-            # Convert to DataFrame
-            flights = []
-            for flight in data['data']:
-                flight_info = {
-                    'flight_number': flight.get('flight', {}).get('number', ''),
-                    'airline': flight.get('airline', {}).get('name', ''),
-                    'airline_iata': flight.get('airline', {}).get('iata', ''),
-                    'origin': flight.get('departure', {}).get('iata', ''),
-                    'origin_airport': flight.get('departure', {}).get('airport', ''),
-                    'destination': flight.get('arrival', {}).get('iata', ''),
-                    'destination_airport': flight.get('arrival', {}).get('airport', ''),
-                    'departure_time': flight.get('departure', {}).get('scheduled', ''),
-                    'arrival_time': flight.get('arrival', {}).get('scheduled', ''),
-                    'flight_status': flight.get('flight_status', ''),
-                    'aircraft_type': flight.get('aircraft', {}).get('registration', ''),
-                    'departure_delay': flight.get('departure', {}).get('delay', 0),
-                    'arrival_delay': flight.get('arrival', {}).get('delay', 0)
-                }
-                flights.append(flight_info)
-            
-            df = pd.DataFrame(flights)
-            
             # Clean and process data
             df = self._clean_aviationstack_data(df)
             
@@ -171,48 +332,213 @@ class DataFetcher:
             return df
             
         except requests.exceptions.RequestException as e:
-            st.error(f"Network error fetching AviationStack data: {str(e)}")
+            notify('error', f"Network error fetching AviationStack data: {str(e)}")
             return None
         except Exception as e:
-            st.error(f"Error processing AviationStack data: {str(e)}")
+            notify('error', f"Error processing AviationStack data: {str(e)}")
             return None
     
+    def sync_aviationstack(self, country: str = "Australia") -> pd.DataFrame:
+        """
+        Bring the flight ledger up to date for a country with as few requests as possible
+        
+        Today's schedule is paged from the stored high-water mark, one page per
+        sync, and status changes are requested only for statuses that stored
+        flights are due to reach. Once the schedule is paged through, each sync
+        still requests the page at the mark, so flights added to today's
+        schedule later (and the new total) are picked up. Nothing is requested
+        if the scope was synced within the cache duration.
+        
+        Returns:
+            Flights that were new to the ledger or changed
+        """
+        ledger = get_flight_ledger()
+        origins = self._aviationstack_origins(country)
+        scope = ",".join(origins) if origins else "all"
+        
+        now = datetime.now(timezone.utc)
+        today = now.date().isoformat()
+        mark = ledger.high_water(scope)
+        if mark is not None and time.time() - mark['synced_at'] < self.cache_duration:
+            return pd.DataFrame()
+        
+        base_params = {
+            'access_key': self.aviationstack_api_key,
+            'limit': 100,  # Free tier limit
+            'flight_date': today
+        }
+        if origins:
+            base_params['dep_iata'] = scope
+        
+        changed = []
+        
+        # New flights: continue today's schedule where the last sync stopped; at
+        # the end of it the request re-reads the total and returns any additions
+        same_day = mark is not None and mark['flight_date'] == today
+        offset = mark['next_offset'] if same_day else 0
+        page, total = self._fetch_aviationstack_page(
+            {**base_params, 'offset': offset}, has_fallback=len(ledger) > 0
+        )
+        changed.append(ledger.upsert(page, region=country))
+        offset += len(page)
+        if total is None:
+            # No response: keep the last known total
+            total = mark['total'] if same_day else None
+        ledger.set_high_water(scope, today, offset, total)
+        
+        # Status changes: only statuses that stored flights are due to reach by now,
+        # and only while the quota can spare background requests
+        try:
+            for status in ledger.pending_statuses(today, now.strftime('%Y-%m-%dT%H:%M:%S+00:00'), origins):
+                page, _ = self._fetch_aviationstack_page(
+                    {**base_params, 'offset': 0, 'flight_status': status}, priority="background"
+                )
+                changed.append(ledger.upsert(page, region=country))
+        except QuotaExceeded:
+            pass
+        
+        changed = [frame for frame in changed if not frame.empty]
+        changed = pd.concat(changed, ignore_index=True) if changed else pd.DataFrame()
+        # The ledger is shared, so the process that owns the history mirrors the
+        # changes whichever process synced them
+        self._archive(lambda history: history.sync_ledger(ledger), owned_elsewhere_ok=True)
+        return changed
+    
+    def _archive(self, store, owned_elsewhere_ok: bool = False) -> None:
+        """
+        Write to the flight history store; a failed write never fails the fetch
+        
+        With owned_elsewhere_ok, a history owned by another app process is not
+        reported: that process archives the write's data itself.
+        """
+        try:
+            store(get_flight_history())
+        except HistoryLocked:
+            if not owned_elsewhere_ok:
+                notify('warning', "⚠️ Flight history is owned by another app process; these flights were not stored.")
+        except Exception as e:
+            notify('warning', f"⚠️ Could not store flight history: {str(e)}")
+    
+    def _fetch_aviationstack_page(self, params: Dict, priority: str = "interactive",
+                                  has_fallback: bool = True) -> Tuple[pd.DataFrame, Optional[int]]:
+        """
+        One page of AviationStack flights and the total number of matching
+        flights (None without a response)
+        """
+        data = self._get_json("aviationstack", f"{self.aviationstack_base_url}/flights", params,
+                              priority=priority, has_fallback=has_fallback)
+        
+        if not data:
+            return pd.DataFrame(), None
+        if not data.get('data'):
+            # Past the end of the schedule: the pagination still has the current total
+            return pd.DataFrame(), (data.get('pagination') or {}).get('total')
+        
+        # Convert to DataFrame
+        flights = []
+        for flight in data['data']:
+            # Nested objects are null for some flights (e.g. no aircraft assigned)
+            flight_info = {
+                'flight_number': (flight.get('flight') or {}).get('number', ''),
+                'flight_date': flight.get('flight_date', params.get('flight_date')),
+                'airline': (flight.get('airline') or {}).get('name', ''),
+                'airline_iata': (flight.get('airline') or {}).get('iata', ''),
+                'origin': (flight.get('departure') or {}).get('iata', ''),
+                'origin_airport': (flight.get('departure') or {}).get('airport', ''),
+                'destination': (flight.get('arrival') or {}).get('iata', ''),
+                'destination_airport': (flight.get('arrival') or {}).get('airport', ''),
+                'departure_time': (flight.get('departure') or {}).get('scheduled', ''),
+                'arrival_time': (flight.get('arrival') or {}).get('scheduled', ''),
+                'flight_status': flight.get('flight_status', ''),
+                'aircraft_type': (flight.get('aircraft') or {}).get('registration', ''),
+                'departure_delay': (flight.get('departure') or {}).get('delay', 0),
+                'arrival_delay': (flight.get('arrival') or {}).get('delay', 0)
+            }
+            flights.append(flight_info)
+        
+        df = pd.DataFrame(flights)
+        df = df[df['flight_number'].notna() & (df['flight_number'] != '')]
+        total = data.get('pagination', {}).get('total', len(data['data']))
+        return df, total
+    
+    def _aviationstack_origins(self, country: str) -> Optional[List[str]]:
+        """Departure airports (IATA) the AviationStack requests are filtered to, None for no filter"""
+        # Add specific filters based on country
+        if country == "Australia":
+            return ["SYD", "MEL", "BNE", "PER", "ADL"]
+        return None
+    
+    def get_completed_flights(self, country: str = "Australia") -> pd.DataFrame:
+        """Flights reconstructed from successive OpenSky snapshots, with origin/destination airports"""
+        flights = get_flight_tracker(country).completed_flights
+        if flights.empty:
+            return flights.assign(origin=pd.Series(dtype=object), destination=pd.Series(dtype=object))
+        
+        # Only track ends close to the ground identify an airport
+        origin = self._match_airports(flights['start_latitude'], flights['start_longitude'], flights['start_altitude'])
+        destination = self._match_airports(flights['end_latitude'], flights['end_longitude'], flights['end_altitude'])
+        
+        return flights.assign(origin=origin, destination=destination)
+    
+    def _match_airports(self, latitude: pd.Series, longitude: pd.Series, altitude: pd.Series) -> np.ndarray:
+        """IATA code (ICAO if none) of the nearest airport for low-altitude positions, '' otherwise"""
+        nearest = get_airport_index().nearest(latitude, longitude, max_distance_km=self.airport_match_radius_km)
+        codes = nearest['iata'].where(nearest['iata'] != '', nearest['icao']).to_numpy()
+        low_altitude = altitude.fillna(0).to_numpy() < self.airport_match_altitude
+        return np.where(low_altitude, codes, '')
+    
+    def clean_opensky_snapshot(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Cleaned state vectors of a raw snapshot, with their observation timestamps"""
+        df = self._clean_opensky_data(df)
+        df['timestamp'] = pd.to_datetime(df['last_contact'], unit='s')
+        return df
+    
     def _clean_opensky_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean and standardize OpenSky data"""
         try:
-            # Remove null coordinates
+            # Type columns (and trim padded callsigns) in one pass
+            df = apply_schema(df, FLIGHT_SCHEMAS["opensky"])
+            
+            # Remove null coordinates and repeated state vectors
             df = df.dropna(subset=['longitude', 'latitude'])
+            df = dedupe_by_key(df, DEDUP_KEYS["opensky"])
             
             # Filter out ground vehicles and non-aircraft
             df = df[df['on_ground'] == False]
             
-            # Clean callsigns
-            df['callsign'] = df['callsign'].str.strip()
+            # Drop blank callsigns
             df = df[df['callsign'] != '']
             
             # Add derived fields
             df['altitude_ft'] = df['baro_altitude'] * 3.28084  # Convert meters to feet
             df['speed_mph'] = df['velocity'] * 2.237  # Convert m/s to mph
             
+            # ICAO airline designator from airline-style callsigns (e.g. QFA123)
+            df['airline_icao'] = df['callsign'].str.extract(r'^([A-Z]{3})\d', expand=False).fillna('')
+            
+            # Departing/arriving aircraft: match to the nearest airport
+            df['nearest_airport'] = self._match_airports(df['latitude'], df['longitude'], df['baro_altitude'])
+            
             # Sort by last contact time
             df = df.sort_values('last_contact', ascending=False)
             
             return df
             
         except Exception as e:
-            st.error(f"Error cleaning OpenSky data: {str(e)}")
+            notify('error', f"Error cleaning OpenSky data: {str(e)}")
             return df
     
     def _clean_aviationstack_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean and standardize AviationStack data"""
         try:
+            # Type columns (parse schedule times, trim names) in one pass
+            df = apply_schema(df, FLIGHT_SCHEMAS["aviationstack"])
+            
             # Remove empty flight numbers
-            df = df[df['flight_number'] != '']
+            df = df[df['flight_number'].notna() & (df['flight_number'] != '')]
             
-            # Convert datetime strings
-            for col in ['departure_time', 'arrival_time']:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
+            # Drop flights repeated across overlapping pages
+            df = dedupe_by_key(df, DEDUP_KEYS["aviationstack"])
             
             # Add timestamp column
             df['timestamp'] = df['departure_time']
@@ -223,7 +549,7 @@ class DataFetcher:
             return df
             
         except Exception as e:
-            st.error(f"Error cleaning AviationStack data: {str(e)}")
+            notify('error', f"Error cleaning AviationStack data: {str(e)}")
             return df
     
     def _get_country_bbox(self, country: str) -> Optional[Dict[str, float]]:
@@ -0,0 +1,332 @@
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from jobs import Job, run_job
+
+
+class DatasetHandle:
+    """A session's reference to a shared, read-only dataset in the registry"""
+
+    def __init__(self, registry: "DatasetRegistry", key: Hashable, frame: pd.DataFrame, created_at: float):
+        self.key = key
+        self.params = registry.key_params(key)
+        self.frame = frame
+        self.created_at = created_at
+        # Release the reference when the owning session state is garbage collected
+        self._finalizer = weakref.finalize(self, registry._release, key)
+
+    def release(self) -> None:
+        """Drop this handle's reference; safe to call more than once"""
+        self._finalizer()
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+    
+    @property
+    def age(self) -> float:
+        """Seconds since the dataset was loaded"""
+        return time.time() - self.created_at
+
+
+class DatasetRegistry:
+    """
+    Process-wide registry of immutable, reference-counted flight datasets
+
+    Datasets are keyed by fetch parameters plus a snapshot bucket, so every
+    session asking for the same country and time range within one snapshot
+    interval shares a single DataFrame. Frames handed out by the registry must
+    be treated as read-only: derive new Series/frames instead of assigning
+    columns in place.
+
+    acquire_swr() serves the newest dataset for the same parameters
+    immediately while it is younger than the hard TTL, refreshing it on a
+    background thread once it is older than the soft TTL. Background
+    refreshes and derived_async() builds have no script run to draw on, so
+    their messages and failures are kept on the entry (see messages()) for
+    the sessions holding it to show.
+    """
+
+    KEY_FIELDS = ('data_source', 'country', 'airport_code', 'time_range', 'snapshot_bucket')
+
+    def __init__(self, snapshot_interval: int = 300, soft_ttl: Optional[float] = None, hard_ttl: float = 1800):
+        self.snapshot_interval = snapshot_interval
+        self.soft_ttl = snapshot_interval if soft_ttl is None else soft_ttl
+        self.hard_ttl = hard_ttl
+
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+        self._refreshing: Set[Tuple] = set()
+        self._building: Set[Tuple[Hashable, str]] = set()
+
+    def snapshot_key(self, data_source: str, country: str, airport_code: str,
+                     time_range: str, now: Optional[float] = None) -> Tuple:
+        """Build a registry key from fetch parameters and the current snapshot bucket"""
+        now = time.time() if now is None else now
+        snapshot_bucket = int(now // self.snapshot_interval)
+        return (data_source, country, airport_code, time_range, snapshot_bucket)
+
+    def key_params(self, key: Hashable) -> Dict[str, Any]:
+        """Fetch parameters of a key built by snapshot_key(), empty for other keys"""
+        if isinstance(key, tuple) and len(key) == len(self.KEY_FIELDS):
+            return dict(zip(self.KEY_FIELDS, key))
+        return {}
+
+    def acquire(self, key: Hashable, loader: Callable[[], Optional[pd.DataFrame]]) -> Optional[DatasetHandle]:
+        """
+        Get a handle to the dataset for key, loading it once if it is not registered
+
+        Args:
+            key: Registry key from snapshot_key()
+            loader: Called at most once per key to produce the dataset
+
+        Returns:
+            A handle to the shared dataset, or None if the loader produced no data
+        """
+        handle = self._acquire_existing(key)
+        if handle is not None:
+            return handle
+
+        # Serialize loads per key so concurrent sessions don't fetch the same data twice
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        try:
+            with load_lock:
+                handle = self._acquire_existing(key)
+                if handle is not None:
+                    return handle
+
+                frame = loader()
+                if frame is None or frame.empty:
+                    return None
+
+                with self._lock:
+                    created_at = time.time()
+                    self._entries[key] = {
+                        'frame': frame,
+                        'refs': 1,
+                        'created_at': created_at,
+                        'idle_since': None,
+                        'derived': {},
+                        # Background messages per origin, e.g. 'refresh'
+                        'messages': {}
+                    }
+                    return DatasetHandle(self, key, frame, created_at)
+        finally:
+            # Also after empty or failed loads, so every key's lock is dropped;
+            # sessions still waiting on it re-check the registry first
+            with self._lock:
+                if self._load_locks.get(key) is load_lock:
+                    del self._load_locks[key]
+
+    def acquire_swr(self, key: Tuple, loader: Callable[[], Optional[pd.DataFrame]]) -> Optional[DatasetHandle]:
+        """
+        Stale-while-revalidate acquire: serve the newest dataset with the same
+        parameters as key right away unless it is older than the hard TTL
+
+        Past the soft TTL the dataset for key is loaded on a background thread
+        and served by later calls; past the hard TTL (or with no dataset at
+        all) the load blocks like acquire().
+        """
+        with self._lock:
+            self._evict_idle()
+            newest = self._newest_key(key)
+            age = time.time() - self._entries[newest]['created_at'] if newest is not None else None
+
+        if newest is not None and age < self.hard_ttl:
+            handle = self._acquire_existing(newest)
+            if handle is not None:
+                if age >= self.soft_ttl and newest != key:
+                    self._refresh_in_background(key, loader, newest)
+                return handle
+
+        return self.acquire(key, loader)
+
+    def refreshing(self, key: Tuple) -> bool:
+        """Whether a background refresh is loading a dataset with the same parameters as key"""
+        with self._lock:
+            return key[:-1] in self._refreshing
+
+    def messages(self, handle: DatasetHandle) -> List[Tuple[str, str]]:
+        """(kind, text) of the background messages kept on a handle's dataset"""
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is None:
+                return []
+            return [message for messages in entry['messages'].values() for message in messages]
+
+    def derived(self, handle: DatasetHandle, name: str, builder: Callable[[pd.DataFrame], Any]) -> Any:
+        """Compute a value derived from a dataset once and share it with every holder"""
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is not None and name in entry['derived']:
+                return entry['derived'][name]
+
+        value = builder(handle.frame)
+
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is not None:
+                entry['derived'].setdefault(name, value)
+                return entry['derived'][name]
+        return value
+
+    def derived_async(self, handle: DatasetHandle, name: str, builder: Callable[[pd.DataFrame], Any],
+                      title: Optional[str] = None) -> Optional[Any]:
+        """
+        Like derived(), but never blocks: returns None and builds the value on
+        a background thread when it has not been computed yet
+
+        The build's messages, and its failure as "Could not update <title>",
+        are kept on the dataset until the next build of the value.
+        """
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is not None and name in entry['derived']:
+                return entry['derived'][name]
+            if (handle.key, name) in self._building:
+                return None
+            self._building.add((handle.key, name))
+
+        frame = handle.frame
+
+        def build():
+            job = Job(f"derive-{name}")
+            run_job(job, lambda job: builder(frame))
+            messages = list(job.messages)
+            if job.error is not None:
+                messages.append(('warning', f"⚠️ Could not update {title or name}: {job.error}"))
+            with self._lock:
+                entry = self._entries.get(handle.key)
+                if entry is not None:
+                    if job.error is None:
+                        entry['derived'].setdefault(name, job.result)
+                    self._keep_messages(entry, name, messages)
+                self._building.discard((handle.key, name))
+
+        threading.Thread(target=build, name=f"derive-{name}", daemon=True).start()
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """Counts and memory footprint of the registered datasets"""
+        with self._lock:
+            self._evict_idle()
+            entries = list(self._entries.values())
+
+        return {
+            'datasets': len(entries),
+            'references': sum(e['refs'] for e in entries),
+            'bytes': int(sum(e['frame'].memory_usage(deep=True).sum() for e in entries))
+        }
+
+    def _acquire_existing(self, key: Hashable) -> Optional[DatasetHandle]:
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry['refs'] += 1
+            entry['idle_since'] = None
+            return DatasetHandle(self, key, entry['frame'], entry['created_at'])
+
+    def _newest_key(self, key: Tuple) -> Optional[Tuple]:
+        """Key of the most recently loaded dataset with the same parameters as key; caller holds the lock"""
+        same_params = [
+            k for k in self._entries
+            if isinstance(k, tuple) and len(k) == len(self.KEY_FIELDS) and k[:-1] == key[:-1]
+        ]
+        return max(same_params, key=lambda k: self._entries[k]['created_at'], default=None)
+
+    def _refresh_in_background(self, key: Tuple, loader: Callable[[], Optional[pd.DataFrame]], served: Tuple) -> None:
+        """
+        Load the dataset for key on a daemon thread, once per parameters at a
+        time; its messages go on the loaded dataset, or on the served one if
+        nothing was loaded
+        """
+        with self._lock:
+            if key[:-1] in self._refreshing:
+                return
+            self._refreshing.add(key[:-1])
+
+        def load(job: Job) -> bool:
+            handle = self.acquire(key, loader)
+            if handle is None:
+                return False
+            # Keep it registered for the next caller, without holding a reference
+            handle.release()
+            return True
+
+        def refresh():
+            job = Job("dataset-refresh")
+            run_job(job, load)
+            messages = list(job.messages)
+            if job.error is not None:
+                messages.append(('warning', f"⚠️ Could not refresh flight data, showing the last snapshot: {job.error}"))
+            with self._lock:
+                if job.result and served in self._entries:
+                    # Superseded, so its earlier refresh failures no longer apply
+                    self._keep_messages(self._entries[served], 'refresh', [])
+                entry = self._entries.get(key if job.result else served)
+                if entry is not None:
+                    self._keep_messages(entry, 'refresh', messages)
+                self._refreshing.discard(key[:-1])
+
+        threading.Thread(target=refresh, name="dataset-refresh", daemon=True).start()
+
+    @staticmethod
+    def _keep_messages(entry: Dict[str, Any], origin: str, messages: List[Tuple[str, str]]) -> None:
+        """Replace the messages an origin left on an entry; caller holds the lock"""
+        if messages:
+            entry['messages'][origin] = messages
+        else:
+            entry['messages'].pop(origin, None)
+
+    def _release(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['refs'] = max(0, entry['refs'] - 1)
+            if entry['refs'] == 0:
+                entry['idle_since'] = time.time()
+
+    def _evict_idle(self) -> None:
+        """
+        Drop unreferenced datasets after they have been idle for a snapshot
+        interval, except the newest per parameters while it can still be
+        served stale; caller holds the lock
+        """
+        now = time.time()
+        newest: Dict[Tuple, Hashable] = {}
+        for key, entry in self._entries.items():
+            if isinstance(key, tuple) and len(key) == len(self.KEY_FIELDS):
+                current = newest.get(key[:-1])
+                if current is None or entry['created_at'] > self._entries[current]['created_at']:
+                    newest[key[:-1]] = key
+        servable = {
+            key for key in newest.values()
+            if now - self._entries[key]['created_at'] < self.hard_ttl
+        }
+
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry['refs'] == 0 and entry['idle_since'] is not None
+            and now - entry['idle_since'] >= self.snapshot_interval
+            and key not in servable
+        ]
+        for key in expired:
+            del self._entries[key]
+
+
+_registry = DatasetRegistry()
+
+
+def get_dataset_registry() -> DatasetRegistry:
+    """Return the process-wide dataset registry"""
+    return _registry
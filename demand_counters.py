@@ -0,0 +1,340 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Dashboard time ranges and the counter windows that serve them
+TIME_RANGE_WINDOWS = {
+    "Last 24 Hours": "24h",
+    "Last 7 Days": "7d",
+    "Last 30 Days": "30d"
+}
+
+
+class _DimensionCounters:
+    """Hour- and day-bucket ring arrays and running window totals for one dimension"""
+
+    def __init__(self, capacity: int, windows: int, initial_keys: int = 64):
+        self.keys: Dict[str, int] = {}
+        self.buckets = np.zeros((initial_keys, capacity), dtype=np.int32)
+        self.hour_of_day = np.zeros((initial_keys, windows, 24), dtype=np.int64)
+        self.days = np.zeros((initial_keys, capacity // 24), dtype=np.int32)
+        self.totals = np.zeros((initial_keys, windows), dtype=np.int64)
+
+    def rows_for(self, keys: Iterable[str]) -> np.ndarray:
+        """Row index for each key, registering new keys"""
+        rows = []
+        for key in keys:
+            row = self.keys.get(key)
+            if row is None:
+                row = len(self.keys)
+                self.keys[key] = row
+            rows.append(row)
+
+        if len(self.keys) > len(self.buckets):
+            grow_to = max(len(self.keys), 2 * len(self.buckets))
+            self.buckets = self._grow(self.buckets, grow_to)
+            self.hour_of_day = self._grow(self.hour_of_day, grow_to)
+            self.days = self._grow(self.days, grow_to)
+            self.totals = self._grow(self.totals, grow_to)
+
+        return np.asarray(rows, dtype=np.int64)
+
+    @staticmethod
+    def _grow(array: np.ndarray, rows: int) -> np.ndarray:
+        grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+
+class DemandCounters:
+    """
+    Sliding-window flight counters maintained incrementally as snapshots arrive
+
+    Counts distinct aircraft (or flights) for each key of each dimension
+    (region, airport, country, airline) in fixed-size ring arrays: once per
+    hour bucket for the hourly activity profile, and once per UTC day for
+    flight totals, so a long flight is not counted once for every hour it is
+    airborne. An aircraft fetched for two overlapping regions counts for both
+    regions but once for its airport, country and airline. Running totals and
+    hour-of-day histograms are kept for every
+    window, so totals, daily averages and peak hours are O(1) reads regardless
+    of how much history has been ingested.
+    """
+
+    WINDOWS = {'24h': 24, '7d': 7 * 24, '30d': 30 * 24}
+    DIMENSIONS = ('region', 'airport', 'country', 'airline')
+
+    def __init__(self, capacity_hours: int = 30 * 24):
+        if capacity_hours < max(self.WINDOWS.values()) or capacity_hours % 24:
+            raise ValueError("capacity_hours must be whole days covering the longest window")
+
+        self.capacity = capacity_hours
+        self.capacity_days = capacity_hours // 24
+        self._window_names = list(self.WINDOWS)
+        self._window_hours = np.array(list(self.WINDOWS.values()), dtype=np.int64)
+        # Totals cover the UTC days overlapping each window
+        self._window_days = -(-self._window_hours // 24)
+
+        self._lock = threading.Lock()
+        self._dimensions = {
+            name: _DimensionCounters(capacity_hours, len(self.WINDOWS))
+            for name in self.DIMENSIONS
+        }
+        self._head_hour: Optional[int] = None
+        self._first_hour: Optional[int] = None
+        # Bumped whenever counts change, so readers can cache derived figures
+        self.version = 0
+        # Hashes of the aircraft already counted per (region, bucket), sorted,
+        # for every bucket still in the ring, so repeated and late snapshots
+        # count each aircraft once per hour and once per day; region None
+        # scopes the dimensions shared by all regions
+        self._seen_hours: Dict[Tuple[Optional[str], int], np.ndarray] = {}
+        self._seen_days: Dict[Tuple[Optional[str], int], np.ndarray] = {}
+
+    def ingest(self, frame: pd.DataFrame, region: str, identity: str,
+               dimensions: Dict[str, str]) -> int:
+        """
+        Count the aircraft in one snapshot
+
+        Args:
+            frame: Snapshot rows with a timestamp column
+            region: Region (selected country) the snapshot was fetched for
+            identity: Column identifying an aircraft or flight, e.g. icao24
+            dimensions: Maps dimension names (airport, country, airline) to columns
+
+        Returns:
+            Number of newly counted aircraft-hours
+        """
+        if frame.empty or 'timestamp' not in frame.columns or identity not in frame.columns:
+            return 0
+
+        timestamps = pd.to_datetime(frame['timestamp'], errors='coerce', utc=True)
+        valid = timestamps.notna().to_numpy()
+        if not valid.any():
+            return 0
+
+        epoch_seconds = timestamps[valid].dt.tz_localize(None).astype('datetime64[s]').astype('int64').to_numpy()
+        # Scheduled (future) departures count as demand now, not in a future hour
+        hours = np.minimum(epoch_seconds, int(time.time())) // 3600
+        aircraft = pd.util.hash_array(frame[identity].astype(str).to_numpy(dtype=object)[valid])
+        values = {
+            dimension: frame[column].to_numpy(dtype=object)[valid]
+            for dimension, column in dimensions.items() if column in frame.columns
+        }
+
+        with self._lock:
+            self.version += 1
+            newest = int(hours.max())
+            if self._head_hour is None:
+                self._head_hour = newest
+                self._first_hour = int(hours.min())
+            elif newest > self._head_hour:
+                self._advance(newest)
+
+            # Rows older than the rings are dropped
+            kept = np.flatnonzero((hours > self._head_hour - self.capacity)
+                                  & (hours // 24 > self._head_hour // 24 - self.capacity_days))
+            if not len(kept):
+                return 0
+            self._first_hour = min(self._first_hour, int(hours[kept].min()))
+
+            hours, aircraft = hours[kept], aircraft[kept]
+            # Regions count an aircraft once each; the other dimensions are shared
+            # by all regions, so overlapping regions count it once between them
+            counted = 0
+            for scope, names in ((region, ['region']), (None, list(values))):
+                fresh_hours = self._first_sightings(self._seen_hours, scope, hours, aircraft)
+                fresh_days = self._first_sightings(self._seen_days, scope, hours // 24, aircraft)
+                if scope is not None:
+                    counted = int(fresh_hours.sum())
+                fresh = fresh_hours | fresh_days
+                fresh_hours, fresh_days = fresh_hours[fresh], fresh_days[fresh]
+                for dimension in names:
+                    if dimension == 'region':
+                        rows = self._rows(dimension, np.array([region], dtype=object))[np.zeros(len(fresh_hours), dtype=np.int64)]
+                        present = np.ones(len(fresh_hours), dtype=bool)
+                    else:
+                        keys = values[dimension][kept][fresh]
+                        present = pd.notna(keys) & (keys != '')
+                        rows = self._rows(dimension, keys[present].astype(str))
+                    sighted = hours[fresh][present]
+                    self._add_hours(dimension, rows[fresh_hours[present]], sighted[fresh_hours[present]])
+                    self._add_days(dimension, rows[fresh_days[present]], sighted[fresh_days[present]] // 24)
+
+            return counted
+
+    @staticmethod
+    def _first_sightings(seen: Dict[Tuple[Optional[str], int], np.ndarray], scope: Optional[str],
+                         buckets: np.ndarray, aircraft: np.ndarray) -> np.ndarray:
+        """
+        Mask of the rows counting an aircraft for the first time in its bucket,
+        recording them as seen; one vectorized pass per bucket in the batch
+        """
+        order = np.lexsort((aircraft, buckets))
+        buckets, aircraft = buckets[order], aircraft[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (buckets[1:] != buckets[:-1]) | (aircraft[1:] != aircraft[:-1])
+        bounds = np.flatnonzero(np.diff(buckets)) + 1
+
+        fresh = np.zeros(len(order), dtype=bool)
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+            rows = start + np.flatnonzero(first[start:end])
+            # Sorted and unique within the bucket
+            candidates = aircraft[rows]
+            key = (scope, int(buckets[start]))
+            known = seen.get(key)
+            if known is not None:
+                position = np.minimum(np.searchsorted(known, candidates), len(known) - 1)
+                unseen = known[position] != candidates
+                rows, candidates = rows[unseen], candidates[unseen]
+                candidates = np.sort(np.concatenate([known, candidates]))
+            seen[key] = candidates
+            fresh[order[rows]] = True
+        return fresh
+
+    def keys(self, dimension: str) -> List[str]:
+        """Keys counted so far for a dimension"""
+        with self._lock:
+            return list(self._dimensions[dimension].keys)
+
+    def total(self, dimension: str, key: str, window: str) -> int:
+        """Flights for key in the window: aircraft counted once per UTC day"""
+        with self._lock:
+            counters, row, w = self._locate(dimension, key, window)
+            return 0 if row is None else int(counters.totals[row, w])
+
+    def average_daily(self, dimension: str, key: str, window: str) -> float:
+        """Average flights per UTC day over the observed days of the window"""
+        with self._lock:
+            counters, row, w = self._locate(dimension, key, window)
+            if row is None:
+                return 0.0
+            covered_days = min(self._window_days[w], self._head_hour // 24 - self._first_hour // 24 + 1)
+            return float(counters.totals[row, w]) / max(1, covered_days)
+
+    def peak_hour(self, dimension: str, key: str, window: str) -> Optional[int]:
+        """Busiest hour of day (UTC) for key in the window, None without data"""
+        with self._lock:
+            counters, row, w = self._locate(dimension, key, window)
+            if row is None or not counters.hour_of_day[row, w].any():
+                return None
+            return int(np.argmax(counters.hour_of_day[row, w]))
+
+    def hourly_profile(self, dimension: str, key: str, window: str) -> np.ndarray:
+        """Counts by hour of day (24 values) for key in the window"""
+        with self._lock:
+            counters, row, w = self._locate(dimension, key, window)
+            if row is None:
+                return np.zeros(24, dtype=np.int64)
+            return counters.hour_of_day[row, w].copy()
+
+    def hourly_series(self, dimension: str, keys: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Hour-bucket history as a DataFrame indexed by hour, one column per key
+
+        Buckets are unrolled from the ring in chronological order, covering up
+        to capacity_hours ending at the newest ingested hour.
+        """
+        with self._lock:
+            counters = self._dimensions[dimension]
+            if self._head_hour is None or not counters.keys:
+                return pd.DataFrame()
+
+            keys = list(counters.keys) if keys is None else [k for k in keys if k in counters.keys]
+            rows = np.array([counters.keys[k] for k in keys], dtype=np.int64)
+            start = max(self._first_hour, self._head_hour - self.capacity + 1)
+            hours = np.arange(start, self._head_hour + 1)
+            values = counters.buckets[rows][:, hours % self.capacity].T.copy()
+
+        index = pd.to_datetime(hours * 3600, unit='s')
+        return pd.DataFrame(values, index=index, columns=keys)
+
+    def _locate(self, dimension: str, key: str, window: str):
+        counters = self._dimensions[dimension]
+        return counters, counters.keys.get(key), self._window_names.index(window)
+
+    def _rows(self, dimension: str, keys: np.ndarray) -> np.ndarray:
+        """Counter row of each key, registering new keys"""
+        codes, unique_keys = pd.factorize(keys)
+        return self._dimensions[dimension].rows_for(unique_keys)[codes]
+
+    def _add_hours(self, dimension: str, rows: np.ndarray, hours: np.ndarray) -> None:
+        """Add one count per (key row, hour) pair to hour buckets and hour-of-day histograms"""
+        if not len(rows):
+            return
+        counters = self._dimensions[dimension]
+
+        np.add.at(counters.buckets, (rows, hours % self.capacity), 1)
+
+        # A bucket is inside window w while hour > head - window_hours[w]
+        in_window = hours[:, None] > (self._head_hour - self._window_hours)[None, :]
+        for w in range(len(self._window_hours)):
+            mask = in_window[:, w]
+            np.add.at(counters.hour_of_day[:, w], (rows[mask], hours[mask] % 24), 1)
+
+    def _add_days(self, dimension: str, rows: np.ndarray, days: np.ndarray) -> None:
+        """Add one count per (key row, day) pair to day buckets and window totals"""
+        if not len(rows):
+            return
+        counters = self._dimensions[dimension]
+
+        np.add.at(counters.days, (rows, days % self.capacity_days), 1)
+
+        in_window = days[:, None] > (self._head_hour // 24 - self._window_days)[None, :]
+        for w in range(len(self._window_days)):
+            mask = in_window[:, w]
+            np.add.at(counters.totals[:, w], rows[mask], 1)
+
+    def _advance(self, new_head: int) -> None:
+        """Move the head hour forward, retiring buckets that leave each window"""
+        steps = new_head - self._head_hour
+        if steps >= self.capacity:
+            # Everything has aged out
+            for counters in self._dimensions.values():
+                counters.buckets[:] = 0
+                counters.hour_of_day[:] = 0
+                counters.days[:] = 0
+                counters.totals[:] = 0
+            self._head_hour = new_head
+            self._first_hour = new_head
+            self._seen_hours.clear()
+            self._seen_days.clear()
+            return
+
+        for hour in range(self._head_hour + 1, new_head + 1):
+            for counters in self._dimensions.values():
+                for w, window_hours in enumerate(self._window_hours):
+                    leaving = hour - window_hours
+                    column = counters.buckets[:, leaving % self.capacity]
+                    counters.hour_of_day[:, w, leaving % 24] -= column
+                # The slot for the new hour held the bucket that just left the longest window
+                counters.buckets[:, hour % self.capacity] = 0
+
+        for day in range(self._head_hour // 24 + 1, new_head // 24 + 1):
+            for counters in self._dimensions.values():
+                for w, window_days in enumerate(self._window_days):
+                    counters.totals[:, w] -= counters.days[:, (day - window_days) % self.capacity_days]
+                counters.days[:, day % self.capacity_days] = 0
+
+        self._head_hour = new_head
+        self._first_hour = max(self._first_hour, new_head - self.capacity + 1)
+        for key in [k for k in self._seen_hours if k[1] <= new_head - self.capacity]:
+            del self._seen_hours[key]
+        for key in [k for k in self._seen_days if k[1] <= new_head // 24 - self.capacity_days]:
+            del self._seen_days[key]
+
+
+_counters: Dict[str, DemandCounters] = {}
+_counters_lock = threading.Lock()
+
+
+def get_demand_counters(source: str) -> DemandCounters:
+    """Return the process-wide demand counters for a data source"""
+    with _counters_lock:
+        if source not in _counters:
+            _counters[source] = DemandCounters()
+        return _counters[source]
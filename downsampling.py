@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+# Chart points per horizontal pixel; LTTB keeps the visual shape at about one per pixel
+POINTS_PER_PIXEL = 1
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of the threshold points that best
+    keep the shape of a line
+
+    x must be sorted ascending. The first and last points are always kept;
+    every bucket in between contributes the point forming the largest
+    triangle with the previously kept point and the next bucket's average.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+
+        # Twice the triangle area for every candidate in the bucket
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def downsample(frame: pd.DataFrame, x: str, y: str, width_px: int,
+               points_per_pixel: float = POINTS_PER_PIXEL) -> pd.DataFrame:
+    """
+    Rows of a time series frame reduced with LTTB to a pixel-proportional
+    number of points
+
+    Args:
+        frame: Series rows sorted by x
+        x: Time (or numeric) column
+        y: Value column
+        width_px: Width the chart is drawn at
+        points_per_pixel: Points kept per pixel of width
+    """
+    threshold = max(3, int(width_px * points_per_pixel))
+    if len(frame) <= threshold:
+        return frame
+
+    x_values = frame[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype('int64')
+    keep = lttb_indices(x_values.to_numpy(), frame[y].to_numpy(dtype=np.float64), threshold)
+    return frame.iloc[keep]
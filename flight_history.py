@@ -0,0 +1,461 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from flight_ledger import LEDGER_COLUMNS, FlightLedger
+
+
+# Statement types the ad-hoc query API runs; everything else is refused
+READ_ONLY_STATEMENTS = (duckdb.StatementType.SELECT, duckdb.StatementType.EXPLAIN)
+
+# Rollup grains: bucket width for date_trunc
+ROLLUP_GRAINS = ('hour', 'day')
+
+# Rollup dimensions per source, as SQL expressions over the ingested rows;
+# every rollup also has a 'region' dimension for the selected country
+ROLLUP_DIMENSIONS = {
+    "opensky": {
+        'airport': "nearest_airport",
+        'country': "origin_country",
+        'airline': "airline_icao"
+    },
+    "aviationstack": {
+        'airport': "origin",
+        'airline': "airline",
+        'route': "origin || ' → ' || destination"
+    }
+}
+
+# Dashboard time ranges served from rollups, in days
+ROLLUP_RANGES = {
+    "Last 7 Days": 7,
+    "Last 30 Days": 30
+}
+
+
+class HistoryLocked(Exception):
+    """The history file is open in another app process"""
+
+
+class FlightHistory:
+    """
+    Embedded DuckDB store of every OpenSky snapshot and AviationStack flight
+
+    Ingestion appends cleaned state vectors to `snapshots` (tagged with the
+    region they were fetched for and the snapshot time) and mirrors ledger
+    changes into `flights`. Queries run in-process on DuckDB's vectorized
+    engine and spill to disk past the memory limit, so aggregations over
+    months of history never materialize the raw rows in pandas.
+
+    In the same transaction as the raw rows, `rollup_hour` and `rollup_day`
+    count distinct aircraft (OpenSky) or new flights (AviationStack) per
+    bucket by region, airport, country, airline and route, so long-range
+    views read a few rows per bucket instead of scanning raw history.
+
+    DuckDB lets a single process open the file, even read-only, so one app
+    process owns the history and opening it elsewhere raises HistoryLocked.
+    OpenSky snapshots reach the owner through the shared snapshot store (see
+    snapshot_archiver) and AviationStack flights through the shared ledger
+    (see sync_ledger), whichever process fetched them.
+    """
+
+    def __init__(self, path: str = "flight_history.duckdb", memory_limit: str = "1GB"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ledger_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        try:
+            self._conn = duckdb.connect(path, config={
+                'memory_limit': memory_limit,
+                'temp_directory': f"{path}.tmp"
+            })
+        except duckdb.IOException as e:
+            if "lock" in str(e):
+                raise HistoryLocked(f"Flight history {path} is held by another app process") from e
+            raise
+        # No file system access from SQL: analysts query the stored tables only
+        self._conn.execute("SET enable_external_access = false")
+        self._conn.execute("SET TimeZone = 'UTC'")
+        self._create_tables()
+
+    @classmethod
+    def from_env(cls) -> "FlightHistory":
+        """Create a store at FLIGHT_HISTORY_PATH with DUCKDB_MEMORY_LIMIT"""
+        return cls(
+            os.environ.get("FLIGHT_HISTORY_PATH", "flight_history.duckdb"),
+            memory_limit=os.environ.get("DUCKDB_MEMORY_LIMIT", "1GB")
+        )
+
+    def _create_tables(self) -> None:
+        columns = ", ".join(
+            f"{col} DOUBLE" if col.endswith('_delay') else f"{col} VARCHAR"
+            for col in LEDGER_COLUMNS
+        )
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS flights ({columns}, region VARCHAR, updated_at TIMESTAMP, "
+                "PRIMARY KEY (flight_number, flight_date))"
+            )
+            self._conn.execute("ALTER TABLE flights ADD COLUMN IF NOT EXISTS region VARCHAR")
+
+            existing = self._tables()
+            for grain in ROLLUP_GRAINS:
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS rollup_{grain} (source VARCHAR, region VARCHAR, "
+                    "dimension VARCHAR, value VARCHAR, bucket TIMESTAMP, flights BIGINT, "
+                    "PRIMARY KEY (source, region, dimension, value, bucket))"
+                )
+            # Aircraft per OpenSky snapshot, the finest-grained timeline
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_counts (region VARCHAR, snapshot_time TIMESTAMP, aircraft BIGINT)"
+            )
+            # How far shared sources have been mirrored, e.g. the ledger version
+            self._conn.execute("CREATE TABLE IF NOT EXISTS archive_state (name VARCHAR PRIMARY KEY, position BIGINT)")
+
+        # History stored before rollups existed is rolled up once
+        derived_tables = [f"rollup_{grain}" for grain in ROLLUP_GRAINS] + ['snapshot_counts']
+        if not all(table in existing for table in derived_tables):
+            self.rebuild_rollups()
+
+    def has_snapshot(self, region: str, snapshot_time: pd.Timestamp) -> bool:
+        """Whether the region's snapshot taken at snapshot_time is stored"""
+        with self._lock:
+            return self._has_snapshot(region, snapshot_time)
+
+    def append_snapshot(self, snapshot: pd.DataFrame, region: str, snapshot_time: pd.Timestamp) -> None:
+        """Store one cleaned OpenSky snapshot fetched for a region, unless it is stored already"""
+        if snapshot.empty:
+            return
+        batch = snapshot.assign(region=region, snapshot_time=snapshot_time)
+        with self._lock:
+            if self._has_snapshot(region, snapshot_time):
+                return
+            self._conn.register('batch', batch)
+            try:
+                # The first snapshot defines the table; later ones insert by column name
+                self._conn.execute("CREATE TABLE IF NOT EXISTS snapshots AS SELECT * FROM batch LIMIT 0")
+                self._conn.execute("BEGIN TRANSACTION")
+                first, last = self._conn.execute("SELECT min(timestamp), max(timestamp) FROM batch").fetchone()
+                for grain in ROLLUP_GRAINS:
+                    if first is None:
+                        break
+                    # Aircraft not yet stored for this region within the bucket. The
+                    # batch's bucket range is inlined as constant bounds so only the
+                    # row groups of those buckets are probed, however long the history
+                    self._add_rollups(grain, "opensky", region, f"""
+                        SELECT date_trunc('{grain}', timestamp) AS bucket,
+                               {", ".join(f"any_value({name}) AS {name}" for name in ROLLUP_DIMENSIONS["opensky"])}
+                        FROM (SELECT icao24, timestamp, {self._dimension_columns("opensky")} FROM batch) b
+                        WHERE timestamp IS NOT NULL AND NOT EXISTS (
+                            SELECT 1 FROM snapshots s
+                            WHERE s.region = $region AND s.icao24 = b.icao24
+                              AND s.timestamp >= date_trunc('{grain}', TIMESTAMP '{first}')
+                              AND s.timestamp < date_trunc('{grain}', TIMESTAMP '{last}') + INTERVAL 1 {grain}
+                              AND s.timestamp >= date_trunc('{grain}', b.timestamp)
+                              AND s.timestamp < date_trunc('{grain}', b.timestamp) + INTERVAL 1 {grain}
+                        )
+                        GROUP BY icao24, bucket
+                    """)
+                self._conn.execute(
+                    "INSERT INTO snapshot_counts SELECT ?, ?, count(DISTINCT icao24) FROM batch",
+                    [region, snapshot_time]
+                )
+                self._insert_by_name('snapshots', batch)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._conn.unregister('batch')
+
+    def upsert_flights(self, flights: pd.DataFrame, region: str) -> None:
+        """Mirror new or changed ledger flights synced for a region"""
+        if flights.empty:
+            return
+        batch = flights.reindex(columns=LEDGER_COLUMNS).assign(region=region, updated_at=pd.Timestamp.now())
+        with self._lock:
+            self._conn.register('batch', batch)
+            try:
+                self._conn.execute("BEGIN TRANSACTION")
+                for grain in ROLLUP_GRAINS:
+                    # Flights the store has not seen, by scheduled departure
+                    self._add_rollups(grain, "aviationstack", region, f"""
+                        SELECT date_trunc('{grain}', TRY_CAST(departure_time AS TIMESTAMPTZ)::TIMESTAMP) AS bucket,
+                               {self._dimension_columns("aviationstack")}
+                        FROM batch b
+                        WHERE TRY_CAST(departure_time AS TIMESTAMPTZ) IS NOT NULL AND NOT EXISTS (
+                            SELECT 1 FROM flights f
+                            WHERE f.flight_number = b.flight_number AND f.flight_date = b.flight_date
+                        )
+                    """)
+                self._conn.execute("INSERT OR REPLACE INTO flights BY NAME SELECT * FROM batch")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._conn.unregister('batch')
+
+    def sync_ledger(self, ledger: FlightLedger) -> int:
+        """
+        Mirror the ledger flights changed since the last sync, by whichever app
+        process synced them, into `flights`; returns how many were stored
+
+        The ledger version reached is kept in `archive_state`. It is advanced
+        after the flights are stored, and storing a flight twice is harmless.
+        """
+        with self._ledger_lock:
+            with self._lock:
+                row = self._conn.execute("SELECT position FROM archive_state WHERE name = 'ledger'").fetchone()
+            changed = ledger.changed_since(row[0] if row else 0)
+            if changed.empty:
+                return 0
+            for region, flights in changed.groupby('region', sort=False):
+                self.upsert_flights(flights.drop(columns=['region', 'version']), region=region)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO archive_state VALUES ('ledger', ?)", [int(changed['version'].max())]
+                )
+            return len(changed)
+
+    def rebuild_rollups(self) -> None:
+        """Recompute every rollup from the stored raw rows"""
+        with self._lock:
+            tables = self._tables()
+            opensky_regions = [
+                row[0] for row in self._conn.execute("SELECT DISTINCT region FROM snapshots").fetchall()
+            ] if 'snapshots' in tables else []
+            aviationstack_regions = [
+                row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT region FROM flights WHERE region IS NOT NULL"
+                ).fetchall()
+            ]
+
+            self._conn.execute("BEGIN TRANSACTION")
+            try:
+                self._conn.execute("DELETE FROM snapshot_counts")
+                if 'snapshots' in tables:
+                    self._conn.execute(
+                        "INSERT INTO snapshot_counts SELECT region, snapshot_time, count(DISTINCT icao24) "
+                        "FROM snapshots GROUP BY region, snapshot_time"
+                    )
+                for grain in ROLLUP_GRAINS:
+                    self._conn.execute(f"DELETE FROM rollup_{grain}")
+                    # Each aircraft once per bucket, with the values it was first seen with
+                    for region in opensky_regions:
+                        self._add_rollups(grain, "opensky", region, f"""
+                            SELECT date_trunc('{grain}', timestamp) AS bucket,
+                                   {", ".join(f"arg_min({name}, timestamp) AS {name}" for name in ROLLUP_DIMENSIONS["opensky"])}
+                            FROM (SELECT icao24, timestamp, {self._dimension_columns("opensky")} FROM snapshots
+                                  WHERE region = $region AND timestamp IS NOT NULL)
+                            GROUP BY icao24, bucket
+                        """)
+                    for region in aviationstack_regions:
+                        self._add_rollups(grain, "aviationstack", region, f"""
+                            SELECT date_trunc('{grain}', TRY_CAST(departure_time AS TIMESTAMPTZ)::TIMESTAMP) AS bucket,
+                                   {self._dimension_columns("aviationstack")}
+                            FROM flights
+                            WHERE region = $region AND TRY_CAST(departure_time AS TIMESTAMPTZ) IS NOT NULL
+                        """)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _has_snapshot(self, region: str, snapshot_time: pd.Timestamp) -> bool:
+        """Whether a snapshot is counted in snapshot_counts; caller holds the lock"""
+        return self._conn.execute(
+            "SELECT count(*) FROM snapshot_counts WHERE region = ? AND snapshot_time = ?", [region, snapshot_time]
+        ).fetchone()[0] > 0
+
+    def _tables(self) -> List[str]:
+        """Names of the stored tables; caller holds the lock"""
+        return [row[0] for row in self._conn.execute("SHOW TABLES").fetchall()]
+
+    @staticmethod
+    def _dimension_columns(source: str) -> str:
+        return ", ".join(f"{expression} AS {name}" for name, expression in ROLLUP_DIMENSIONS[source].items())
+
+    def _add_rollups(self, grain: str, source: str, region: str, fresh_sql: str) -> None:
+        """
+        Add one count per row of fresh_sql to its bucket for the region and
+        each dimension value; caller holds the lock
+
+        fresh_sql selects a bucket column plus one column per dimension of the
+        source, and may refer to the region as $region.
+        """
+        dimensions = list(ROLLUP_DIMENSIONS[source])
+        values = "\n".join(
+            f"UNION ALL SELECT '{name}', CAST({name} AS VARCHAR), bucket FROM fresh WHERE {name} IS NOT NULL AND {name} <> ''"
+            for name in dimensions
+        )
+        self._conn.execute(f"""
+            INSERT INTO rollup_{grain} (source, region, dimension, value, bucket, flights)
+            WITH fresh AS ({fresh_sql})
+            SELECT $source, $region, dimension, value, bucket, count(*)
+            FROM (
+                SELECT 'region' AS dimension, $region AS value, bucket FROM fresh
+                {values}
+            )
+            GROUP BY dimension, value, bucket
+            ON CONFLICT DO UPDATE SET flights = flights + excluded.flights
+        """, {'source': source, 'region': region})
+
+    def rollup(self, source: str, region: str, dimension: str, grain: str = 'hour',
+               since: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Rollup rows (value, bucket, flights) of one dimension for a region, oldest first"""
+        if grain not in ROLLUP_GRAINS:
+            raise ValueError(f"Unknown rollup grain: {grain}")
+        sql = (f"SELECT value, bucket, flights FROM rollup_{grain} "
+               "WHERE source = ? AND region = ? AND dimension = ?")
+        params: List[Any] = [source, region, dimension]
+        if since is not None:
+            sql += " AND bucket >= date_trunc(?, ?::TIMESTAMP)"
+            params += [grain, since]
+        return self.query(sql + " ORDER BY bucket, value", params)
+
+    def rollup_totals(self, source: str, region: str, dimension: str,
+                      since: pd.Timestamp, limit: Optional[int] = None) -> pd.Series:
+        """Daily flight counts summed per dimension value since a time, largest first"""
+        totals = self.query(
+            "SELECT value, sum(flights)::BIGINT AS flights FROM rollup_day "
+            "WHERE source = ? AND region = ? AND dimension = ? AND bucket >= date_trunc('day', ?::TIMESTAMP) "
+            "GROUP BY value ORDER BY flights DESC, value" + (f" LIMIT {int(limit)}" if limit else ""),
+            [source, region, dimension, since]
+        )
+        return totals.set_index('value')['flights']
+
+    def timeline(self, source: str, region: str, since: pd.Timestamp, until: pd.Timestamp) -> pd.DataFrame:
+        """
+        Flights over time for a region, oldest first: aircraft per snapshot
+        for OpenSky, flights per departure hour for AviationStack
+        """
+        if source == "opensky":
+            sql = ("SELECT snapshot_time AS time, aircraft AS flights FROM snapshot_counts "
+                   "WHERE region = ? AND snapshot_time >= ? AND snapshot_time <= ? ORDER BY time")
+            params = [region, since, until]
+        else:
+            sql = ("SELECT bucket AS time, flights FROM rollup_hour WHERE source = ? AND region = ? "
+                   "AND dimension = 'region' AND bucket >= ? AND bucket <= ? ORDER BY time")
+            params = [source, region, since, until]
+        return self.query(sql, params)
+
+    def rollup_coverage(self, source: str, region: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """First and last hour with rolled-up flights for a region, None without any"""
+        first, last = self.query(
+            "SELECT min(bucket), max(bucket) FROM rollup_hour WHERE source = ? AND region = ? AND dimension = 'region'",
+            [source, region]
+        ).iloc[0]
+        if pd.isna(first):
+            return None
+        return pd.Timestamp(first), pd.Timestamp(last)
+
+    def _insert_by_name(self, table: str, batch: pd.DataFrame) -> None:
+        """Insert the registered batch, ignoring columns the table lacks; caller holds the lock"""
+        stored = self._columns(table)
+        shared = [col for col in batch.columns if col in stored]
+        names = ", ".join(f'"{col}"' for col in shared)
+        self._conn.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM batch")
+
+    def _columns(self, table: str) -> List[str]:
+        return [row[0] for row in self._conn.execute(f'DESCRIBE "{table}"').fetchall()]
+
+    def query(self, sql: str, params: Optional[Sequence[Any]] = None, max_rows: Optional[int] = None) -> pd.DataFrame:
+        """
+        Run a read-only SQL query against the stored history
+
+        Args:
+            sql: A single SELECT (or EXPLAIN) statement
+            params: Values for ? placeholders
+            max_rows: Return at most this many rows
+
+        Raises:
+            ValueError: If sql is not a single read-only statement
+            duckdb.Error: If the query fails
+        """
+        if max_rows is None:
+            return self._read(sql, params, lambda result: result.df())
+        return self._read(sql, params, lambda result: result.fetch_df_chunk(max(1, -(-max_rows // 2048))).head(max_rows))
+
+    def query_arrow(self, sql: str, params: Optional[Sequence[Any]] = None) -> pa.Table:
+        """
+        Run a read-only SQL query and return an Arrow table, skipping the
+        conversion of string columns to Python objects (see query)
+        """
+        return self._read(sql, params, lambda result: result.fetch_record_batch().read_all())
+
+    def _read(self, sql: str, params: Optional[Sequence[Any]], fetch) -> Any:
+        statements = duckdb.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type not in READ_ONLY_STATEMENTS:
+            raise ValueError("Only a single SELECT query can be run against the flight history")
+
+        # A cursor is a separate connection to the same database, so queries
+        # don't serialize behind ingestion
+        with self._lock:
+            cursor = self._conn.cursor()
+        try:
+            return fetch(cursor.execute(sql, params or []))
+        finally:
+            cursor.close()
+
+    def tables(self) -> Dict[str, List[str]]:
+        """Queryable tables and their columns"""
+        with self._lock:
+            return {name: self._columns(name) for name in self._tables()}
+
+
+def rollup_summary(history: FlightHistory, source: str, region: str, since: pd.Timestamp) -> Dict[str, Any]:
+    """
+    Dashboard and prompt summary of a region's flights since a time, read
+    from the rollups only
+
+    Keys match AIAnalyzer's data summary (total_flights, date_range,
+    hourly_distribution, top_countries, top_airlines, top_routes) plus days,
+    avg_daily_flights, peak_hour and top_airports.
+    """
+    hourly = history.rollup(source, region, 'region', 'hour', since)
+    daily = history.rollup(source, region, 'region', 'day', since)
+    if hourly.empty:
+        return {}
+
+    hour_of_day = hourly.groupby(hourly['bucket'].dt.hour)['flights'].sum().reindex(range(24), fill_value=0)
+    summary: Dict[str, Any] = {
+        'total_flights': int(daily['flights'].sum()),
+        'days': len(daily),
+        'avg_daily_flights': float(daily['flights'].mean()),
+        'date_range': {
+            'start': hourly['bucket'].min().isoformat(),
+            'end': (hourly['bucket'].max() + pd.Timedelta(hours=1)).isoformat()
+        },
+        'hourly_distribution': {int(hour): int(count) for hour, count in hour_of_day.items()},
+        'peak_hour': int(hour_of_day.idxmax())
+    }
+
+    for dimension, key in (('country', 'top_countries'), ('airline', 'top_airlines'),
+                           ('route', 'top_routes'), ('airport', 'top_airports')):
+        totals = history.rollup_totals(source, region, dimension, since, limit=10)
+        if not totals.empty:
+            summary[key] = {value: int(count) for value, count in totals.items()}
+    if 'top_routes' in summary:
+        summary['route_flights'] = summary['total_flights']
+
+    return summary
+
+
+_history: Optional[FlightHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_flight_history() -> FlightHistory:
+    """Return the process-wide flight history store, opening it on first use"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = FlightHistory.from_env()
+        return _history
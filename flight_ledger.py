@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+
+# Flight record fields stored per (flight_number, flight_date)
+LEDGER_COLUMNS = [
+    'flight_number', 'flight_date', 'airline', 'airline_iata',
+    'origin', 'origin_airport', 'destination', 'destination_airport',
+    'departure_time', 'arrival_time', 'flight_status', 'aircraft_type',
+    'departure_delay', 'arrival_delay'
+]
+
+
+class FlightLedger:
+    """
+    Persistent SQLite ledger of scheduled flights keyed by flight number and date
+
+    Upserts only touch rows that are new or whose status or times changed, and
+    a per-scope sync state records how far each day's schedule has been paged,
+    so repeat syncs request only what the ledger does not have yet.
+
+    The ledger file is shared by every app process. Each upsert stamps its
+    rows with the region they were synced for and a version one above any
+    stored, assigned under SQLite's write lock so versions follow commit
+    order; the process that owns the flight history mirrors rows past its
+    version watermark (see FlightHistory.sync_ledger).
+    """
+
+    def __init__(self, path: str = "flight_ledger.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    @classmethod
+    def from_env(cls) -> "FlightLedger":
+        """Create a ledger at FLIGHT_LEDGER_PATH"""
+        return cls(os.environ.get("FLIGHT_LEDGER_PATH", "flight_ledger.sqlite3"))
+
+    def _create_tables(self) -> None:
+        columns = ", ".join(
+            f"{col} REAL" if col.endswith('_delay') else f"{col} TEXT"
+            for col in LEDGER_COLUMNS
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS flights ({columns}, updated_at REAL, "
+                "PRIMARY KEY (flight_number, flight_date))"
+            )
+            stored = {row[1] for row in self._conn.execute("PRAGMA table_info(flights)")}
+            for column, kind in (('region', 'TEXT'), ('version', 'INTEGER')):
+                if column not in stored:
+                    self._conn.execute(f"ALTER TABLE flights ADD COLUMN {column} {kind}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS flights_by_date ON flights (flight_date, origin)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS flights_by_version ON flights (version)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state (scope TEXT PRIMARY KEY, flight_date TEXT, "
+                "next_offset INTEGER, total INTEGER, synced_at REAL)"
+            )
+
+    def upsert(self, flights: pd.DataFrame, region: Optional[str] = None) -> pd.DataFrame:
+        """
+        Insert new flights and update ones whose status or times changed
+
+        Args:
+            flights: Flight records with LEDGER_COLUMNS
+            region: Region (selected country) the flights were synced for
+
+        Returns:
+            The rows that were inserted or changed
+        """
+        if flights.empty:
+            return flights
+
+        records = flights.reindex(columns=LEDGER_COLUMNS).astype(object)
+        records = records.where(records.notna(), None)
+        rows = list(records.itertuples(index=False, name=None))
+
+        placeholders = ", ".join("?" for _ in LEDGER_COLUMNS)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in LEDGER_COLUMNS[2:])
+        changed_check = " OR ".join(
+            f"flights.{col} IS NOT excluded.{col}"
+            for col in ('flight_status', 'departure_time', 'arrival_time', 'departure_delay', 'arrival_delay')
+        )
+
+        changed = []
+        now = time.time()
+        with self._lock, self._conn:
+            # Take the write lock before reading the version, so no other process commits in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            version = self._conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM flights").fetchone()[0]
+            for row in rows:
+                cursor = self._conn.execute(
+                    f"INSERT INTO flights ({', '.join(LEDGER_COLUMNS)}, updated_at, region, version) "
+                    f"VALUES ({placeholders}, ?, ?, ?) "
+                    f"ON CONFLICT (flight_number, flight_date) DO UPDATE SET {updates}, "
+                    "updated_at = excluded.updated_at, region = excluded.region, version = excluded.version "
+                    f"WHERE {changed_check}",
+                    row + (now, region, version)
+                )
+                changed.append(cursor.rowcount > 0)
+
+        return flights[changed]
+
+    def load(self, origins: Optional[List[str]] = None, since_date: Optional[str] = None) -> pd.DataFrame:
+        """Flights departing from origins (all if None) on or after since_date (YYYY-MM-DD)"""
+        query = f"SELECT {', '.join(LEDGER_COLUMNS)} FROM flights WHERE 1 = 1"
+        params: list = []
+        if since_date is not None:
+            query += " AND flight_date >= ?"
+            params.append(since_date)
+        if origins:
+            query += f" AND origin IN ({', '.join('?' for _ in origins)})"
+            params.extend(origins)
+
+        with self._lock:
+            return pd.read_sql_query(query, self._conn, params=params)
+
+    def changed_since(self, version: int) -> pd.DataFrame:
+        """
+        Flights last changed after a version, with LEDGER_COLUMNS, region and
+        version (rows synced without a region are left out)
+        """
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(LEDGER_COLUMNS)}, region, version FROM flights "
+                "WHERE version > ? AND region IS NOT NULL ORDER BY version",
+                self._conn, params=[version]
+            )
+
+    def pending_statuses(self, flight_date: str, now_iso: str, origins: Optional[List[str]] = None) -> List[str]:
+        """
+        Statuses worth requesting to catch status changes on flight_date
+
+        'active' if a scheduled flight should have departed by now_iso, and
+        'landed' if an active flight should have arrived.
+        """
+        origin_filter = ""
+        params: list = [now_iso, now_iso, flight_date]
+        if origins:
+            origin_filter = f" AND origin IN ({', '.join('?' for _ in origins)})"
+            params.extend(origins)
+
+        with self._lock:
+            due_departure, due_arrival = self._conn.execute(
+                "SELECT "
+                "COALESCE(SUM(flight_status = 'scheduled' AND departure_time <= ?), 0), "
+                "COALESCE(SUM(flight_status = 'active' AND arrival_time <= ?), 0) "
+                f"FROM flights WHERE flight_date = ?{origin_filter}",
+                params
+            ).fetchone()
+
+        statuses = []
+        if due_departure:
+            statuses.append('active')
+        if due_arrival:
+            statuses.append('landed')
+        return statuses
+
+    def high_water(self, scope: str) -> Optional[Dict]:
+        """Sync position for a scope: flight_date, next_offset, total and synced_at"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT flight_date, next_offset, total, synced_at FROM sync_state WHERE scope = ?",
+                (scope,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('flight_date', 'next_offset', 'total', 'synced_at'), row))
+
+    def set_high_water(self, scope: str, flight_date: str, next_offset: int, total: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (scope, flight_date, next_offset, total, synced_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (scope) DO UPDATE SET flight_date = excluded.flight_date, "
+                "next_offset = excluded.next_offset, total = excluded.total, synced_at = excluded.synced_at",
+                (scope, flight_date, next_offset, total, time.time())
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM flights").fetchone()[0]
+
+
+_ledger: Optional[FlightLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_flight_ledger() -> FlightLedger:
+    """Return the process-wide flight ledger, opening it on first use"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = FlightLedger.from_env()
+        return _ledger
@@ -0,0 +1,291 @@
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class FlightTracker:
+    """
+    Joins successive OpenSky snapshots on icao24 into per-aircraft tracks
+
+    Tracks live in one preallocated float32 array of shape
+    (slots, max_points, 4) holding time, latitude, longitude and altitude, so
+    memory per active aircraft is fixed. Time is stored as seconds since the
+    track's first_seen: float32 cannot resolve Unix times to the second. When a track fills up it is decimated
+    in place (every other point kept) and its sampling stride doubles.
+
+    A flight is completed when an aircraft that has been airborne reports
+    on_ground (landed), or when it has not been seen for disappear_after
+    seconds (vanished).
+    """
+
+    POINT_FIELDS = ('time', 'latitude', 'longitude', 'altitude')
+
+    def __init__(self, max_points: int = 64, disappear_after: float = 600.0,
+                 initial_slots: int = 1024, max_completed: int = 50000):
+        if max_points < 4 or max_points % 2:
+            raise ValueError("max_points must be an even number of at least 4")
+
+        self.max_points = max_points
+        self.disappear_after = disappear_after
+        self.max_completed = max_completed
+        self.completed_flights = self._empty_flights()
+
+        self._lock = threading.Lock()
+        self._slot_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._allocate(initial_slots)
+
+    def ingest(self, snapshot: pd.DataFrame, snapshot_time: Optional[float] = None) -> pd.DataFrame:
+        """
+        Add one snapshot of raw state vectors and return flights completed by it
+
+        Args:
+            snapshot: State vectors with icao24, callsign, origin_country,
+                latitude, longitude, baro_altitude, on_ground and last_contact
+            snapshot_time: Unix time of the snapshot; defaults to the newest last_contact
+
+        Returns:
+            DataFrame with one row per completed flight
+        """
+        if snapshot.empty:
+            return self._empty_flights()
+
+        snapshot = snapshot.drop_duplicates(subset='icao24', keep='last')
+        icao24 = snapshot['icao24'].to_numpy(dtype=object)
+        times = snapshot['last_contact'].to_numpy(dtype=np.float64)
+        if snapshot_time is None:
+            snapshot_time = float(np.nanmax(times))
+
+        points = np.column_stack([
+            times,
+            snapshot['latitude'].to_numpy(dtype=np.float64),
+            snapshot['longitude'].to_numpy(dtype=np.float64),
+            snapshot['baro_altitude'].to_numpy(dtype=np.float64),
+        ]).astype(np.float32)
+        on_ground = snapshot['on_ground'].fillna(False).to_numpy(dtype=bool)
+
+        with self._lock:
+            slots = self._lookup_or_assign(icao24, snapshot)
+            completed = []
+
+            # Aircraft that were airborne and now report on the ground have landed
+            landed = on_ground & self._airborne[slots]
+            if landed.any():
+                landed_slots = slots[landed]
+                self._last_point[landed_slots] = points[landed]
+                self._last_point[landed_slots, 0] = times[landed] - self._first_seen[landed_slots]
+                completed.append(self._collect(landed_slots, landed=True))
+                # Keep tracking the aircraft on the ground as the start of its next flight
+                self._reset_slots(landed_slots)
+                self._first_seen[landed_slots] = times[landed]
+
+            points[:, 0] = times - self._first_seen[slots]
+            self._append_points(slots, points)
+            self._last_point[slots] = points
+            self._last_seen[slots] = times
+            self._airborne[slots] |= ~on_ground
+
+            # Aircraft missing for too long have left coverage or stopped transmitting
+            vanished = np.flatnonzero(self._active & (self._last_seen < snapshot_time - self.disappear_after))
+            if len(vanished):
+                completed.append(self._collect(vanished, landed=False))
+                self._release_slots(vanished)
+
+            if not completed:
+                return self._empty_flights()
+
+            flights = pd.concat(completed, ignore_index=True)
+            self._remember(flights)
+        return flights
+
+    def flush(self) -> pd.DataFrame:
+        """Complete every active flight, e.g. at the end of a replayed day"""
+        with self._lock:
+            active = np.flatnonzero(self._active)
+            if not len(active):
+                return self._empty_flights()
+            flights = self._collect(active, landed=False)
+            self._release_slots(active)
+            self._remember(flights)
+        return flights
+
+    @property
+    def active_aircraft(self) -> int:
+        return len(self._slot_of)
+
+    @property
+    def track_bytes(self) -> int:
+        """Bytes held by the preallocated track storage"""
+        return self._tracks.nbytes
+
+    def _remember(self, flights: pd.DataFrame) -> None:
+        """Keep the most recent completed flights, bounded by max_completed; caller holds the lock"""
+        if flights.empty:
+            return
+        if self.completed_flights.empty:
+            combined = flights
+        else:
+            combined = pd.concat([self.completed_flights, flights], ignore_index=True)
+        # Rebind rather than mutate so readers always see a consistent frame
+        self.completed_flights = combined.tail(self.max_completed).reset_index(drop=True)
+
+    def _allocate(self, slots: int) -> None:
+        self._tracks = np.full((slots, self.max_points, len(self.POINT_FIELDS)), np.nan, dtype=np.float32)
+        self._last_point = np.full((slots, len(self.POINT_FIELDS)), np.nan, dtype=np.float32)
+        self._count = np.zeros(slots, dtype=np.int32)
+        self._stride = np.ones(slots, dtype=np.int32)
+        self._observations = np.zeros(slots, dtype=np.int64)
+        self._first_seen = np.zeros(slots, dtype=np.float64)
+        self._last_seen = np.zeros(slots, dtype=np.float64)
+        self._airborne = np.zeros(slots, dtype=bool)
+        self._active = np.zeros(slots, dtype=bool)
+        self._icao24 = np.empty(slots, dtype=object)
+        self._callsign = np.empty(slots, dtype=object)
+        self._country = np.empty(slots, dtype=object)
+        self._free = list(range(slots - 1, -1, -1))
+
+    def _grow(self, needed: int) -> None:
+        """Double slot capacity until `needed` more slots are free"""
+        old_slots = len(self._count)
+        new_slots = old_slots
+        while new_slots - old_slots + len(self._free) < needed:
+            new_slots *= 2
+
+        def grow(array, fill):
+            grown = np.full((new_slots,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:old_slots] = array
+            return grown
+
+        self._tracks = grow(self._tracks, np.nan)
+        self._last_point = grow(self._last_point, np.nan)
+        self._count = grow(self._count, 0)
+        self._stride = grow(self._stride, 1)
+        self._observations = grow(self._observations, 0)
+        self._first_seen = grow(self._first_seen, 0)
+        self._last_seen = grow(self._last_seen, 0)
+        self._airborne = grow(self._airborne, False)
+        self._active = grow(self._active, False)
+        self._icao24 = grow(self._icao24, None)
+        self._callsign = grow(self._callsign, None)
+        self._country = grow(self._country, None)
+        self._free = list(range(new_slots - 1, old_slots - 1, -1)) + self._free
+
+    def _lookup_or_assign(self, icao24: np.ndarray, snapshot: pd.DataFrame) -> np.ndarray:
+        slot_of = self._slot_of
+        slots = np.fromiter((slot_of.get(k, -1) for k in icao24), dtype=np.int64, count=len(icao24))
+
+        new_rows = np.flatnonzero(slots < 0)
+        if len(new_rows):
+            if len(new_rows) > len(self._free):
+                self._grow(len(new_rows))
+            new_slots = np.array([self._free.pop() for _ in range(len(new_rows))], dtype=np.int64)
+            slots[new_rows] = new_slots
+            for row, slot in zip(new_rows, new_slots):
+                slot_of[icao24[row]] = slot
+
+            self._icao24[new_slots] = icao24[new_rows]
+            self._first_seen[new_slots] = snapshot['last_contact'].to_numpy(dtype=np.float64)[new_rows]
+            self._active[new_slots] = True
+
+        # Callsigns can change mid-flight; keep the latest non-empty one
+        callsigns = snapshot['callsign'].fillna('').astype(str).str.strip().to_numpy(dtype=object)
+        has_callsign = callsigns != ''
+        self._callsign[slots[has_callsign]] = callsigns[has_callsign]
+        self._country[slots] = snapshot['origin_country'].to_numpy(dtype=object)
+
+        return slots
+
+    def _append_points(self, slots: np.ndarray, points: np.ndarray) -> None:
+        """Append sampled points to tracks, decimating tracks that are full"""
+        self._observations[slots] += 1
+        sampled = (self._observations[slots] - 1) % self._stride[slots] == 0
+        slots, points = slots[sampled], points[sampled]
+        if not len(slots):
+            return
+
+        self._tracks[slots, self._count[slots]] = points
+        self._count[slots] += 1
+
+        full = slots[self._count[slots] == self.max_points]
+        if len(full):
+            half = self.max_points // 2
+            self._tracks[full, :half] = self._tracks[full, ::2]
+            self._tracks[full, half:] = np.nan
+            self._count[full] = half
+            self._stride[full] *= 2
+
+    def _collect(self, slots: np.ndarray, landed: bool) -> pd.DataFrame:
+        """Build completed-flight rows for slots that went airborne"""
+        slots = slots[self._airborne[slots] & (self._count[slots] > 0)]
+        if not len(slots):
+            return self._empty_flights()
+
+        counts = self._count[slots]
+        first_seen = self._first_seen[slots]
+        first = self._tracks[slots, 0]
+        # Tracks are sampled with a stride, so the final position is kept separately
+        last = self._last_point[slots]
+
+        return pd.DataFrame({
+            'icao24': self._icao24[slots],
+            'callsign': self._callsign[slots],
+            'origin_country': self._country[slots],
+            'first_seen': pd.to_datetime(first_seen, unit='s'),
+            'last_seen': pd.to_datetime(self._last_seen[slots], unit='s'),
+            'start_latitude': first[:, 1],
+            'start_longitude': first[:, 2],
+            'start_altitude': first[:, 3],
+            'end_latitude': last[:, 1],
+            'end_longitude': last[:, 2],
+            'end_altitude': last[:, 3],
+            'landed': landed,
+            'track_points': counts,
+            'track': [self._track(s, c, t) for s, c, t in zip(slots, counts, first_seen)],
+        })
+
+    def _track(self, slot: int, count: int, first_seen: float) -> np.ndarray:
+        """A slot's track points with absolute Unix times (float64)"""
+        track = self._tracks[slot, :count].astype(np.float64)
+        track[:, 0] += first_seen
+        return track
+
+    def _reset_slots(self, slots: np.ndarray) -> None:
+        self._tracks[slots] = np.nan
+        self._last_point[slots] = np.nan
+        self._count[slots] = 0
+        self._stride[slots] = 1
+        self._observations[slots] = 0
+        self._airborne[slots] = False
+
+    def _release_slots(self, slots: np.ndarray) -> None:
+        self._reset_slots(slots)
+        self._active[slots] = False
+        for slot in slots:
+            del self._slot_of[self._icao24[slot]]
+            self._icao24[slot] = None
+            self._callsign[slot] = None
+            self._country[slot] = None
+            self._free.append(int(slot))
+
+    @staticmethod
+    def _empty_flights() -> pd.DataFrame:
+        return pd.DataFrame(columns=[
+            'icao24', 'callsign', 'origin_country', 'first_seen', 'last_seen',
+            'start_latitude', 'start_longitude', 'start_altitude',
+            'end_latitude', 'end_longitude', 'end_altitude',
+            'landed', 'track_points', 'track'
+        ])
+
+
+_trackers: Dict[str, FlightTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_flight_tracker(region: str) -> FlightTracker:
+    """Return the process-wide tracker for a region (country bounding box)"""
+    with _trackers_lock:
+        if region not in _trackers:
+            _trackers[region] = FlightTracker()
+        return _trackers[region]
@@ -0,0 +1,169 @@
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+
+class SeasonalForecaster:
+    """
+    Hour-of-week seasonal baseline forecaster with residual anomaly flags
+
+    The baseline for each series is the mean count for its hour of day and
+    day of week (168 slots), falling back to the hour-of-day mean where a slot
+    has too few observations. All series are fitted together with NumPy, so
+    forecasting every airport is one batched pass.
+    """
+
+    def __init__(self, band_z: float = 1.96, anomaly_z: float = 3.0, min_observations: int = 2):
+        self.band_z = band_z
+        self.anomaly_z = anomaly_z
+        self.min_observations = min_observations
+
+    def forecast(self, history: pd.DataFrame, horizon: int = 24) -> Dict[str, Any]:
+        """
+        Forecast every series in an hourly history
+
+        Args:
+            history: Hourly counts, DatetimeIndex of hours and one column per series
+            horizon: Number of hours to forecast past the end of the history
+
+        Returns:
+            Dictionary with forecast, lower and upper DataFrames (horizon x
+            series), an anomalies DataFrame of flagged observed hours, and the
+            number of history hours used
+        """
+        if history.empty:
+            return {'forecast': pd.DataFrame(), 'lower': pd.DataFrame(), 'upper': pd.DataFrame(),
+                    'anomalies': pd.DataFrame(columns=['time', 'series', 'observed', 'expected', 'z_score']),
+                    'history_hours': 0}
+
+        values = history.to_numpy(dtype=np.float64)
+        index = pd.DatetimeIndex(history.index)
+        slots = (index.dayofweek * 24 + index.hour).to_numpy()
+
+        hours = index.hour.to_numpy()
+        mean, std = self._seasonal_profile(values, slots, hours)
+        expected, spread = self._residual_baseline(values, slots, hours, mean)
+
+        # Residual anomalies on the observed history
+        z_scores = (values - expected) / spread
+        flagged_rows, flagged_cols = np.nonzero(np.abs(z_scores) >= self.anomaly_z)
+        anomalies = pd.DataFrame({
+            'time': index[flagged_rows],
+            'series': history.columns[flagged_cols],
+            'observed': values[flagged_rows, flagged_cols],
+            'expected': expected[flagged_rows, flagged_cols],
+            'z_score': z_scores[flagged_rows, flagged_cols]
+        })
+
+        future = pd.date_range(index[-1] + pd.Timedelta(hours=1), periods=horizon, freq='h')
+        future_slots = (future.dayofweek * 24 + future.hour).to_numpy()
+        point = mean[future_slots]
+        spread = self.band_z * std[future_slots]
+
+        def frame(array):
+            return pd.DataFrame(array, index=future, columns=history.columns)
+
+        return {
+            'forecast': frame(point),
+            'lower': frame(np.maximum(point - spread, 0.0)),
+            'upper': frame(point + spread),
+            'anomalies': anomalies,
+            'history_hours': len(history)
+        }
+
+    def _seasonal_profile(self, values: np.ndarray, slots: np.ndarray, hours: np.ndarray):
+        """Per-slot mean and standard deviation (168 x series) for every series"""
+        week_mean, week_std, week_n = self._grouped_moments(values, slots, 168)
+        day_mean, day_std, day_n = self._grouped_moments(values, hours, 24)
+
+        # Sparse hour-of-week slots borrow the hour-of-day profile, then the overall mean
+        slot_hours = np.arange(168) % 24
+        use_day = week_n < self.min_observations
+        mean = np.where(use_day[:, None], day_mean[slot_hours], week_mean)
+        std = np.where(use_day[:, None], day_std[slot_hours], week_std)
+
+        empty = (week_n == 0) & (day_n[slot_hours] == 0)
+        mean[empty] = values.mean(axis=0)
+        std[empty] = values.std(axis=0)
+
+        # Counts are roughly Poisson: never claim less spread than sqrt(mean), nor below 1
+        std = np.maximum.reduce([std, np.sqrt(np.maximum(mean, 0.0)), np.ones_like(std)])
+        return mean, std
+
+    def _residual_baseline(self, values: np.ndarray, slots: np.ndarray, hours: np.ndarray, mean: np.ndarray):
+        """
+        Expected value and spread for each observed hour
+
+        The expectation is the slot mean without the hour itself, so a spike
+        can't mask itself; the spread is pooled over the hour of day because
+        hour-of-week slots hold only a handful of observations.
+        """
+        sums, _, counts = self._grouped_sums(values, slots, 168)
+        others = counts[slots][:, None] - 1
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            loo_mean = (sums[slots] - values) / others
+        expected = np.where(others >= self.min_observations, loo_mean, mean[slots])
+
+        _, day_std, _ = self._grouped_moments(values, hours, 24)
+        spread = np.maximum.reduce([day_std[hours], np.sqrt(np.maximum(expected, 0.0)), np.ones_like(expected)])
+        return expected, spread
+
+    @staticmethod
+    def _grouped_sums(values: np.ndarray, groups: np.ndarray, n_groups: int):
+        """Per-group sums, sums of squares and counts via one sort and reduceat"""
+        order = np.argsort(groups, kind='stable')
+        sorted_groups = groups[order]
+        present, starts = np.unique(sorted_groups, return_index=True)
+
+        sums = np.zeros((n_groups, values.shape[1]))
+        squares = np.zeros((n_groups, values.shape[1]))
+        sorted_values = values[order]
+        sums[present] = np.add.reduceat(sorted_values, starts, axis=0)
+        squares[present] = np.add.reduceat(sorted_values ** 2, starts, axis=0)
+        counts = np.bincount(groups, minlength=n_groups).astype(np.float64)
+        return sums, squares, counts
+
+    @classmethod
+    def _grouped_moments(cls, values: np.ndarray, groups: np.ndarray, n_groups: int):
+        sums, squares, counts = cls._grouped_sums(values, groups, n_groups)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / counts[:, None]
+            variance = squares / counts[:, None] - mean ** 2
+            # Sample variance where there is more than one observation
+            variance *= np.where(counts > 1, counts / np.maximum(counts - 1, 1), 1.0)[:, None]
+        mean = np.nan_to_num(mean)
+        std = np.sqrt(np.nan_to_num(np.maximum(variance, 0.0)))
+        return mean, std, counts
+
+
+def summarize_forecast(result: Dict[str, Any], series: str) -> Dict[str, Any]:
+    """Compact numeric summary of one series' forecast, e.g. for an LLM prompt"""
+    forecast = result['forecast']
+    if forecast.empty or series not in forecast.columns:
+        return {}
+
+    point = forecast[series]
+    anomalies = result['anomalies']
+    # Hourly errors are treated as independent, so the daily band's half-widths
+    # are the root sum of squares of the hourly ones, not their sum
+    expected = float(point.head(24).sum())
+    below = np.sqrt(((point - result['lower'][series]).head(24) ** 2).sum())
+    above = np.sqrt(((result['upper'][series] - point).head(24) ** 2).sum())
+    series_anomalies = anomalies[anomalies['series'] == series]
+
+    return {
+        'history_hours': result['history_hours'],
+        'next_24h_expected': round(expected, 1),
+        'next_24h_lower': round(max(expected - float(below), 0.0), 1),
+        'next_24h_upper': round(expected + float(above), 1),
+        'forecast_peak_hour': int(point.idxmax().hour),
+        'forecast_peak_count': round(float(point.max()), 1),
+        'anomalous_hours': len(series_anomalies),
+        'recent_anomalies': [
+            f"{row.time:%Y-%m-%d %H}:00 observed {row.observed:.0f} vs expected {row.expected:.1f}"
+            for row in series_anomalies.tail(3).itertuples()
+        ]
+    }
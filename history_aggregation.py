@@ -0,0 +1,189 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from flight_history import ROLLUP_DIMENSIONS, FlightHistory
+
+# Upper bound on rows per partition, so one aggregation query groups at
+# most this many rows at a time
+AGGREGATION_PARTITION_ROWS = int(os.environ.get("AGGREGATION_PARTITION_ROWS", 250_000))
+
+# Per source: the time column, the identity hashed to split a day, the table
+# and the rows-per-day estimate used to size partitions
+_SOURCES = {
+    "opensky": {
+        'timestamp': "timestamp",
+        'identity': "icao24",
+        'table': "snapshots",
+        'estimate': ("SELECT date_trunc('day', snapshot_time) AS day, sum(aircraft)::BIGINT AS rows "
+                     "FROM snapshot_counts WHERE region = ? AND snapshot_time >= ? AND snapshot_time < ? "
+                     "GROUP BY day")
+    },
+    "aviationstack": {
+        'timestamp': "TRY_CAST(departure_time AS TIMESTAMPTZ)::TIMESTAMP",
+        'identity': "flight_number",
+        'table': "flights",
+        'estimate': ("SELECT date_trunc('day', TRY_CAST(departure_time AS TIMESTAMPTZ)::TIMESTAMP) AS day, "
+                     "count(*) AS rows FROM flights WHERE region = ? "
+                     "AND TRY_CAST(departure_time AS TIMESTAMPTZ)::TIMESTAMP >= ? "
+                     "AND TRY_CAST(departure_time AS TIMESTAMPTZ)::TIMESTAMP < ? GROUP BY day")
+    }
+}
+
+
+def plan_partitions(history: FlightHistory, source: str, region: str, since: pd.Timestamp,
+                    until: pd.Timestamp, max_rows: int = AGGREGATION_PARTITION_ROWS) -> List[Dict[str, Any]]:
+    """
+    Split a time range into partitions of at most about max_rows rows
+
+    Each day is one partition, or several when it holds more rows, split by
+    a hash of the aircraft (flight) identity. Every aircraft of a day lands
+    in exactly one partition, so per-day distinct counts add up across them.
+    """
+    estimates = history.query(_SOURCES[source]['estimate'], [region, since, until])
+    rows_per_day = dict(zip(estimates['day'], estimates['rows']))
+
+    partitions = []
+    for day in pd.date_range(since.floor('D'), until, freq='D', inclusive='left'):
+        splits = max(1, -(-int(rows_per_day.get(day, 0)) // max_rows))
+        for split in range(splits):
+            partitions.append({
+                'start': max(day, since),
+                'end': min(day + pd.Timedelta(days=1), until),
+                'split': split,
+                'splits': splits
+            })
+    return partitions
+
+
+def aggregate_partition(history: FlightHistory, source: str, region: str,
+                        partition: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map step: flights per day, per hour of day and per dimension value of
+    one partition, aggregated by DuckDB next to the stored rows
+
+    Counts follow the rollups: an OpenSky aircraft once per day with the
+    values it was first seen with (and once per hour for the hourly
+    profile), an AviationStack flight once. Only the counts leave DuckDB.
+    """
+    spec = _SOURCES[source]
+    names = list(ROLLUP_DIMENSIONS[source])
+    dimensions = ", ".join(f"{expression} AS {name}" for name, expression in ROLLUP_DIMENSIONS[source].items())
+    if source == "opensky":
+        first_seen = ", ".join(f"arg_min({name}, timestamp) AS {name}" for name in names)
+        counted = f"""
+            hours AS (SELECT identity, date_trunc('hour', timestamp) AS hour, min(timestamp) AS first, {first_seen}
+                      FROM part GROUP BY identity, hour),
+            counted AS (SELECT date_trunc('day', hour) AS day,
+                               {", ".join(f"arg_min({name}, first) AS {name}" for name in names)}
+                        FROM hours GROUP BY identity, day)"""
+    else:
+        counted = f"""
+            hours AS (SELECT date_trunc('hour', timestamp) AS hour FROM part),
+            counted AS (SELECT date_trunc('day', timestamp) AS day, {", ".join(names)} FROM part)"""
+    per_dimension = "".join(
+        f" UNION ALL SELECT '{name}', {name}, count(*) FROM counted "
+        f"WHERE {name} IS NOT NULL AND {name} <> '' GROUP BY {name}"
+        for name in names
+    )
+    # The split is inlined: a parameterized modulus is not pushed into the scan
+    counts = history.query(f"""
+        WITH part AS (
+            SELECT {spec['identity']} AS identity, {spec['timestamp']} AS timestamp, {dimensions}
+            FROM {spec['table']} WHERE region = ? AND {spec['timestamp']} >= ? AND {spec['timestamp']} < ?
+            AND hash({spec['identity']}) % {int(partition['splits'])} = {int(partition['split'])}
+        ), {counted}
+        SELECT 'rows' AS kind, NULL AS value, count(*) AS flights FROM part
+        UNION ALL SELECT 'daily', strftime(day, '%Y-%m-%d'), count(*) FROM counted GROUP BY day
+        UNION ALL SELECT 'hourly', hour(hour)::VARCHAR, count(*) FROM hours GROUP BY hour(hour){per_dimension}
+    """, [region, partition['start'], partition['end']])
+
+    groups = {kind: group.set_index('value')['flights'].astype(np.int64) for kind, group in counts.groupby('kind')}
+    empty = pd.Series(dtype=np.int64)
+    daily = groups.get('daily', empty)
+    hourly = groups.get('hourly', empty)
+    partial: Dict[str, Any] = {
+        'rows': int(groups['rows'].sum()),
+        'daily': pd.Series(daily.to_numpy(), index=pd.to_datetime(daily.index).rename('day'), dtype=np.int64),
+        'hourly': np.bincount(hourly.index.astype(int), weights=hourly.to_numpy(), minlength=24).astype(np.int64)
+    }
+    for name in names:
+        partial[name] = groups.get(name, empty)
+    return partial
+
+
+def reduce_partials(partials: List[Dict[str, Any]], source: str) -> Dict[str, Any]:
+    """Reduce step: sum partial aggregates into the range's totals"""
+    def combine(key: str) -> pd.Series:
+        series = [partial[key] for partial in partials if len(partial[key])]
+        if not series:
+            return pd.Series(dtype=np.int64)
+        return pd.concat(series).groupby(level=0).sum().astype(np.int64)
+
+    daily = combine('daily').sort_index()
+    hourly = np.sum([partial['hourly'] for partial in partials], axis=0) if partials else np.zeros(24, dtype=np.int64)
+    result: Dict[str, Any] = {
+        'partitions': len(partials),
+        'rows': int(sum(partial['rows'] for partial in partials)),
+        'total_flights': int(daily.sum()),
+        'daily': daily,
+        'hourly_distribution': {hour: int(count) for hour, count in enumerate(hourly)}
+    }
+    for name in ROLLUP_DIMENSIONS[source]:
+        totals = combine(name)
+        result[f'top_{name}s'] = totals.sort_values(ascending=False, kind='stable')
+    return result
+
+
+def aggregate_history(history: FlightHistory, source: str, region: str, since: pd.Timestamp,
+                      until: Optional[pd.Timestamp] = None, executor: Optional[Executor] = None,
+                      max_rows: int = AGGREGATION_PARTITION_ROWS) -> Dict[str, Any]:
+    """
+    Map-reduce route, airline, airport and hourly aggregations over stored
+    history for a region
+
+    A library utility for scripts and notebooks that need counts the
+    rollups don't keep; the dashboard and the metrics API read the rollups
+    and don't call it. Each partition is aggregated by one DuckDB query on
+    its own cursor, which returns only counts, so memory stays bounded
+    however long the range. DuckDB already runs each query on all cores, so
+    an executor only overlaps partitions and adds little on top; the store's
+    file lock admits a single process, so there are no worker processes. At
+    most two partitions per CPU are in flight.
+
+    Args:
+        history: Flight history store
+        source: 'opensky' (snapshots) or 'aviationstack' (flights)
+        region: Region (selected country) the data was fetched for
+        since: Start of the range
+        until: End of the range (now if None)
+        executor: Thread pool to map partitions on (one at a time if None)
+        max_rows: Upper bound on rows per partition
+
+    Returns:
+        Dictionary with total_flights, daily (Series), hourly_distribution,
+        top_<dimension>s (Series, largest first), partitions and rows
+    """
+    if source not in _SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+    if _SOURCES[source]['table'] not in history.tables():
+        return reduce_partials([], source)
+    until = pd.Timestamp.now(tz='UTC').tz_localize(None) if until is None else until
+
+    plan = plan_partitions(history, source, region, since, until, max_rows)
+    if executor is None:
+        return reduce_partials([aggregate_partition(history, source, region, partition) for partition in plan], source)
+
+    partials = []
+    in_flight: Deque[Future] = deque()
+    max_in_flight = 2 * (os.cpu_count() or 1)
+    for partition in plan:
+        if len(in_flight) >= max_in_flight:
+            partials.append(in_flight.popleft().result())
+        in_flight.append(executor.submit(aggregate_partition, history, source, region, partition))
+    partials.extend(future.result() for future in in_flight)
+    return reduce_partials(partials, source)
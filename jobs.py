@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Background jobs run at once per process; more are queued
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+
+# Seconds a finished job is kept for its session to pick up the result
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 600))
+
+
+class JobCancelled(BaseException):
+    """
+    Raised at a job's next stage boundary once it has been cancelled
+
+    A BaseException so it unwinds through the broad `except Exception`
+    fallbacks in the fetch and analysis code instead of being handled there.
+    """
+
+
+class Job:
+    """A background job's identity, progress and outcome"""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'
+        self.stage = "Queued"
+        self.progress = 0.0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # (kind, text) of messages for the session, e.g. ('warning', "...")
+        self.messages: List[Tuple[str, str]] = []
+        self._cancel = threading.Event()
+
+    def report(self, stage: str, progress: float) -> None:
+        """Enter a stage (progress 0-1), stopping here if the job was cancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.stage = stage
+        self.progress = min(max(progress, 0.0), 1.0)
+
+    def notify(self, kind: str, text: str) -> None:
+        """Keep a message for the session that collects the job"""
+        self.messages.append((kind, text))
+
+    def cancel(self) -> None:
+        """Ask the job to stop at its next stage boundary"""
+        self._cancel.set()
+
+    @property
+    def cancelling(self) -> bool:
+        return self._cancel.is_set() and not self.finished
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the job was submitted, until it finished"""
+        return (self.finished_at or time.time()) - self.created_at
+
+
+class JobRunner:
+    """
+    Runs long fetch and analysis work on a thread pool, so the Streamlit
+    script thread only submits it and polls its progress
+
+    Jobs receive their Job as the first argument and call report() between
+    stages; cancellation is cooperative and takes effect at the next
+    report(). A job outlives the script run that submitted it, so it can't
+    draw on the page; its messages are kept on the Job (see utils.notify)
+    for the session to show with the result. Finished jobs are kept for
+    retention seconds, then dropped.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, retention: float = JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+        """Queue fn(job, *args, **kwargs) and return its job"""
+        job = Job(name)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        self._executor.submit(run_job, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        """The job with this ID, or None if it is unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: Optional[str]) -> None:
+        """Cancel a job if it is still running; unknown IDs are ignored"""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Jobs per status"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ('queued', 'running', 'done', 'failed', 'cancelled')}
+
+    def _expire(self) -> None:
+        """Drop jobs finished more than retention seconds ago; caller holds the lock"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at >= self.retention
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_local = threading.local()
+
+
+def run_job(job: Job, fn: Callable[..., Any], args: tuple = (), kwargs: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Run fn(job, *args, **kwargs) on this thread as job, keeping its result,
+    error and messages on the job; used by the runner and by other
+    background threads whose messages outlive the script run
+    """
+    _local.job = job
+    try:
+        job.report("Starting", 0.0)
+        job.status = 'running'
+        job.result = fn(job, *args, **(kwargs or {}))
+        job.stage, job.progress = "Done", 1.0
+        status = 'done'
+    except JobCancelled:
+        status = 'cancelled'
+    except Exception as e:
+        job.error = str(e)
+        status = 'failed'
+    finally:
+        _local.job = None
+    # Pollers see a finished status only once everything else is set
+    job.finished_at = time.time()
+    job.status = status
+
+
+def current_job() -> Optional[Job]:
+    """The job running on this thread, or None outside background jobs"""
+    return getattr(_local, 'job', None)
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Return the process-wide background job runner, created on first use"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+
+from demand_counters import TIME_RANGE_WINDOWS, get_demand_counters
+from flight_history import get_flight_history
+from singleflight import get_single_flight
+
+METRICS_API_HOST = os.environ.get("METRICS_API_HOST", "127.0.0.1")
+# Port the API is served on next to the app; 0 disables it
+METRICS_API_PORT = int(os.environ.get("METRICS_API_PORT", 8502))
+# Seconds a response is reused, and may be cached by clients, between snapshots
+METRICS_API_CACHE_TTL = float(os.environ.get("METRICS_API_CACHE_TTL", 30))
+
+SOURCES = ("opensky", "aviationstack")
+WINDOW_DAYS = {'24h': 1, '7d': 7, '30d': 30}
+TOP_DIMENSIONS = {
+    "opensky": ('airline', 'airport', 'country'),
+    "aviationstack": ('airline', 'airport', 'route')
+}
+
+
+class MetricsRequestError(Exception):
+    """A request the API cannot answer, with the HTTP status to reply with"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class MetricsAPI:
+    """
+    Read-only JSON views of the precomputed demand aggregates
+
+    Totals, daily averages, peak hours and hour-of-day profiles come from the
+    in-memory demand counters; top airlines, airports and routes from the
+    daily rollups. Raw snapshots are never read. Rendered responses are
+    cached with their ETag until the source's counters change or cache_ttl
+    passes, so repeat requests cost a dictionary lookup. ETags depend only on
+    the content, so unchanged figures keep answering conditional GETs with 304.
+    """
+
+    def __init__(self, cache_ttl: float = METRICS_API_CACHE_TTL, max_entries: int = 4096):
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        # Request key -> (expires_at, counters version, body, etag)
+        self._cache: Dict[Tuple, Tuple[float, int, bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, query: Dict[str, str]) -> Tuple[int, bytes, str]:
+        """Status, JSON body and ETag answering a GET"""
+        try:
+            if path == "/v1/health":
+                return self._render(200, {'status': 'ok'})
+            if path not in ("/v1/regions", "/v1/demand"):
+                raise MetricsRequestError(404, f"Unknown endpoint: {path}")
+
+            source = query.get('source', "opensky")
+            if source not in SOURCES:
+                raise MetricsRequestError(400, f"source must be one of {', '.join(SOURCES)}")
+            version = get_demand_counters(source).version
+
+            key = (path, tuple(sorted(query.items())))
+            with self._lock:
+                cached = self._cache.get(key)
+            if cached and cached[0] > time.time() and cached[1] == version:
+                return 200, cached[2], cached[3]
+
+            # Concurrent misses for one key share a single render
+            build = self._regions if path == "/v1/regions" else self._demand
+            status, body, etag = get_single_flight("metrics_api").do(
+                (key, version), lambda: self._render(200, build(source, query))
+            )
+            with self._lock:
+                if len(self._cache) >= self.max_entries:
+                    self._cache.clear()
+                self._cache[key] = (time.time() + self.cache_ttl, version, body, etag)
+            return status, body, etag
+        except MetricsRequestError as e:
+            return self._render(e.status, {'error': str(e)})
+
+    def _regions(self, source: str, query: Dict[str, str]) -> Dict[str, Any]:
+        counters = get_demand_counters(source)
+        return {
+            'source': source,
+            'countries': sorted(counters.keys('region')),
+            'airports': sorted(counters.keys('airport'))
+        }
+
+    def _demand(self, source: str, query: Dict[str, str]) -> Dict[str, Any]:
+        country = query.get('country')
+        if not country:
+            raise MetricsRequestError(400, "country is required")
+        time_range = query.get('time_range', "24h")
+        window = TIME_RANGE_WINDOWS.get(time_range, time_range)
+        if window not in WINDOW_DAYS:
+            raise MetricsRequestError(400, f"time_range must be one of {', '.join(WINDOW_DAYS)}")
+
+        counters = get_demand_counters(source)
+        if country not in counters.keys('region'):
+            raise MetricsRequestError(404, f"No {source} demand recorded for {country}")
+
+        def figures(dimension: str, key: str) -> Dict[str, Any]:
+            peak_hour = counters.peak_hour(dimension, key, window)
+            return {
+                'flights': counters.total(dimension, key, window),
+                'avg_daily_flights': round(counters.average_daily(dimension, key, window), 1),
+                'peak_hour': peak_hour,
+                'hourly_profile': [int(count) for count in counters.hourly_profile(dimension, key, window)]
+            }
+
+        payload = {
+            'source': source,
+            'country': country,
+            'time_range': window,
+            'demand': figures('region', country)
+        }
+        airport = query.get('airport')
+        if airport:
+            payload['airport'] = airport
+            payload['airport_demand'] = figures('airport', airport)
+
+        try:
+            history = get_flight_history()
+            since = pd.Timestamp.now(tz='UTC').tz_localize(None) - pd.Timedelta(days=WINDOW_DAYS[window])
+            for dimension in TOP_DIMENSIONS[source]:
+                totals = history.rollup_totals(source, country, dimension, since, limit=10)
+                payload[f'top_{dimension}s'] = {value: int(count) for value, count in totals.items()}
+        except Exception:
+            # Counter figures stand on their own while the history store is unavailable
+            pass
+
+        return payload
+
+    @staticmethod
+    def _render(status: int, payload: Dict[str, Any]) -> Tuple[int, bytes, str]:
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return status, body, '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """GET/HEAD handler with conditional requests over keep-alive connections"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; do not hold the body back
+    disable_nagle_algorithm = True
+    api: MetricsAPI
+
+    def do_GET(self):
+        self._reply(send_body=True)
+
+    def do_HEAD(self):
+        self._reply(send_body=False)
+
+    def _reply(self, send_body: bool):
+        url = urlsplit(self.path)
+        status, body, etag = self.api.get(url.path.rstrip('/') or '/', dict(parse_qsl(url.query)))
+
+        not_modified = status == 200 and etag in self.headers.get('If-None-Match', '').replace(' ', '').split(',')
+        self.send_response(304 if not_modified else status)
+        if status == 200:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f"max-age={int(self.api.cache_ttl)}")
+        if not_modified:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics_api(host: str, port: int, api: Optional[MetricsAPI] = None) -> ThreadingHTTPServer:
+    """Start the metrics API on a daemon thread and return its server"""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'api': api or MetricsAPI()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-api", daemon=True).start()
+    return server
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_api() -> Optional[ThreadingHTTPServer]:
+    """
+    Return the process-wide metrics API server, starting it on first use
+
+    None when the API is disabled or its port was taken (e.g. by another app
+    process already serving it).
+    """
+    global _server, _server_started
+    with _server_lock:
+        if not _server_started and METRICS_API_PORT:
+            _server_started = True
+            try:
+                _server = serve_metrics_api(METRICS_API_HOST, METRICS_API_PORT)
+            except OSError:
+                return None
+        return _server
@@ -0,0 +1,164 @@
+import math
+import os
+import re
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+
+
+# Upper bound on estimated tokens per Gemini prompt; data detail is trimmed to fit
+PROMPT_TOKEN_BUDGET = int(os.environ.get("GEMINI_PROMPT_TOKEN_BUDGET", 400))
+
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d|\S")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the tokens a prompt costs without a round trip to the API
+
+    Words count one token per four letters, digits and punctuation one token
+    each, like SentencePiece vocabularies that split numbers into digits.
+    """
+    tokens = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group()
+        tokens += math.ceil(len(piece) / 4) if piece[0].isalpha() else 1
+    return tokens
+
+
+def format_value(value: Any) -> str:
+    """Short deterministic rendering of a scalar: floats to 3 significant digits, whole above 100"""
+    if isinstance(value, float):
+        return f"{value:.0f}" if abs(value) >= 100 else f"{value:.3g}"
+    return str(value)
+
+
+def encode_counts(counts: Mapping[Any, int], limit: Optional[int] = None, total: Optional[int] = None) -> str:
+    """
+    Encode counts as 'label count share%' entries, largest first
+
+    Shares are of total (the sum of counts if None); entries beyond limit are
+    folded into one 'next N' entry.
+    """
+    items = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+    total = total or sum(count for _, count in items)
+    if not items or total <= 0:
+        return "none"
+
+    shown = items if limit is None else items[:limit]
+    entries = [f"{label} {count} {round(100 * count / total)}%" for label, count in shown]
+    rest = items[len(shown):]
+    if rest:
+        rest_count = sum(count for _, count in rest)
+        entries.append(f"next {len(rest)} {rest_count} {round(100 * rest_count / total)}%")
+    return "; ".join(entries)
+
+
+def encode_labels(counts: Mapping[Any, int], limit: int) -> str:
+    """The limit largest labels of counts, comma separated"""
+    items = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+    return ", ".join(str(label) for label, _ in items[:limit]) or "none"
+
+
+def encode_hourly(distribution: Mapping[int, int], shares: bool = False) -> str:
+    """Encode an hour-of-day histogram as 24 counts (or rounded % shares) from 00h to 23h"""
+    counts = [int(distribution.get(hour, 0)) for hour in range(24)]
+    total = sum(counts)
+    if shares and total > 0:
+        return "% by hour 00h-23h: " + ",".join(str(round(100 * count / total)) for count in counts)
+    return "00h-23h: " + ",".join(str(count) for count in counts)
+
+
+def hourly_levels(distribution: Mapping[int, int], top: int = 6) -> List[str]:
+    """Renderings of an hourly histogram from most to least detailed, ending with dropping it"""
+    if not distribution:
+        return [""]
+    return [
+        encode_hourly(distribution),
+        encode_hourly(distribution, shares=True),
+        encode_counts({f"{int(hour):02d}h": count for hour, count in distribution.items()}, limit=top),
+        ""
+    ]
+
+
+def encode_mapping(values: Mapping[str, Any], skip: Sequence[str] = ()) -> str:
+    """Encode a flat mapping as 'key=value' pairs, lists joined with ' | '"""
+    entries = []
+    for key, value in values.items():
+        if key in skip or value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            if not value:
+                continue
+            value = " | ".join(format_value(v) for v in value)
+        entries.append(f"{key}={format_value(value)}")
+    return ", ".join(entries) or "none"
+
+
+def encode_date_range(date_range: Mapping[str, Optional[str]]) -> str:
+    """Encode an ISO start/end pair to minute precision"""
+    start, end = date_range.get('start'), date_range.get('end')
+    if not start or not end:
+        return "unknown"
+    return f"{start[:16].replace('T', ' ')} to {end[:16].replace('T', ' ')}"
+
+
+def count_levels(counts: Mapping[Any, int], total: Optional[int] = None,
+                 limits: Sequence[int] = (10, 5, 3)) -> List[str]:
+    """Renderings of counts from most to least detailed, ending with dropping them"""
+    return [encode_counts(counts, limit, total) for limit in limits] + [""]
+
+
+class PromptSection:
+    """
+    One data line of a prompt with progressively shorter renderings
+
+    Renderings run from most to least detailed; an empty rendering drops the
+    line. Each trimming step shortens the section with the lowest priority
+    plus steps already taken, so detail is shed evenly before whole lines go.
+    """
+
+    def __init__(self, label: str, renderings: Sequence[str], priority: int = 0):
+        self.label = label
+        self.renderings = list(renderings)
+        self.priority = priority
+
+
+def build_prompt(intro: str, sections: Sequence[PromptSection], request: str,
+                 budget: Optional[int] = None) -> Tuple[str, int, bool]:
+    """
+    Assemble a prompt, trimming low-priority detail until it fits the token budget
+
+    Args:
+        intro: Task statement before the data
+        sections: Data lines of the prompt
+        request: What the model should provide, after the data
+        budget: Maximum estimated tokens (PROMPT_TOKEN_BUDGET if None)
+
+    Returns:
+        The prompt, its estimated tokens and whether any detail was trimmed
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    levels = [0] * len(sections)
+
+    def render() -> str:
+        lines = [
+            f"- {section.label}: {section.renderings[level]}"
+            for section, level in zip(sections, levels)
+            if section.renderings[level]
+        ]
+        return "\n".join([intro, "", "Data:", *lines, "", request])
+
+    prompt = render()
+    tokens = count_tokens(prompt)
+    while tokens > budget:
+        trimmable = [i for i, section in enumerate(sections) if levels[i] < len(section.renderings) - 1]
+        if not trimmable:
+            break
+        # Lowest priority plus trimming so far; among equals, the currently longest line
+        index = min(trimmable, key=lambda i: (
+            sections[i].priority + levels[i], -count_tokens(sections[i].renderings[levels[i]])
+        ))
+        levels[index] += 1
+        prompt = render()
+        tokens = count_tokens(prompt)
+
+    return prompt, tokens, any(levels)
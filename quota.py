@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import requests
+
+
+class QuotaExceeded(requests.exceptions.RequestException):
+    """Raised instead of sending a request the provider's quota can't afford"""
+
+
+# Request budgets per provider: OpenSky gives anonymous users 400 API credits
+# per day; the AviationStack free plan allows 100 requests per month
+DEFAULT_BUDGETS = {
+    "opensky": {'limit': int(os.environ.get("OPENSKY_DAILY_CREDITS", 400)), 'period': 'day'},
+    "aviationstack": {'limit': int(os.environ.get("AVIATIONSTACK_MONTHLY_REQUESTS", 100)), 'period': 'month'}
+}
+
+
+def opensky_credit_cost(bbox: Optional[Dict[str, float]]) -> int:
+    """OpenSky credits charged for a /states/all request over a bounding box (None = global)"""
+    if not bbox:
+        return 4
+    area = abs(bbox['north'] - bbox['south']) * abs(bbox['east'] - bbox['west'])
+    if area <= 25:
+        return 1
+    if area <= 100:
+        return 2
+    if area <= 400:
+        return 3
+    return 4
+
+
+class QuotaScheduler:
+    """
+    Process-wide request budgets for rate-limited upstream providers
+
+    Every request is admitted against its provider's remaining quota for the
+    current period (UTC day or calendar month). When the spending pace
+    projects exhaustion before the period ends, requests that have a cached
+    fallback are refused so callers serve cached data instead, and
+    background requests are refused once only the reserve is left.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, Dict[str, Any]]] = None,
+                 state_path: Optional[str] = None, reserve_fraction: float = 0.1):
+        self.budgets = budgets or DEFAULT_BUDGETS
+        self.state_path = state_path
+        self.reserve_fraction = reserve_fraction
+
+        self._lock = threading.Lock()
+        self._usage: Dict[str, Dict[str, Any]] = {}
+        self._load_state()
+
+    @classmethod
+    def from_env(cls) -> "QuotaScheduler":
+        """Create a scheduler persisting its usage at QUOTA_STATE_PATH"""
+        return cls(state_path=os.environ.get("QUOTA_STATE_PATH", "quota_state.json"))
+
+    def reserve(self, provider: str, cost: int = 1, priority: str = "interactive",
+                has_fallback: bool = False) -> bool:
+        """
+        Admit a request and charge its cost, or refuse it
+
+        Args:
+            provider: Provider key of the budget
+            cost: Quota units the request consumes
+            priority: 'interactive' for user-triggered requests, 'background'
+                for refreshes that can wait
+            has_fallback: Whether the caller can serve cached data instead
+
+        Returns:
+            True if the request may be sent
+        """
+        if provider not in self.budgets:
+            return True
+
+        with self._lock:
+            usage = self._current_usage(provider)
+            remaining = self._remaining(provider, usage)
+            if remaining < cost:
+                return False
+
+            tight = self._projected_exhaustion(provider, usage, remaining) is not None
+            if has_fallback and tight:
+                return False
+            reserve = self.reserve_fraction * self.budgets[provider]['limit']
+            if priority == "background" and (tight or remaining - cost < reserve):
+                return False
+
+            usage['used'] += cost
+            if usage.get('remaining') is not None:
+                usage['remaining'] -= cost
+            self._save_state()
+            return True
+
+    def observe_remaining(self, provider: str, remaining: int) -> None:
+        """Adopt the remaining quota reported by the provider, e.g. in a rate limit header"""
+        if provider not in self.budgets:
+            return
+        with self._lock:
+            self._current_usage(provider)['remaining'] = max(0, int(remaining))
+            self._save_state()
+
+    def status(self, provider: str) -> Dict[str, Any]:
+        """Limit, usage, remaining quota, period end and projected exhaustion time for a provider"""
+        with self._lock:
+            usage = self._current_usage(provider)
+            remaining = self._remaining(provider, usage)
+            return {
+                'limit': self.budgets[provider]['limit'],
+                'period': self.budgets[provider]['period'],
+                'used': usage['used'],
+                'remaining': remaining,
+                'period_end': self._period_end(provider, usage),
+                'projected_exhaustion': self._projected_exhaustion(provider, usage, remaining)
+            }
+
+    def _current_usage(self, provider: str) -> Dict[str, Any]:
+        """Usage record for the current period, starting a new one when the period rolled over; caller holds the lock"""
+        period_start = self._period_start(provider, datetime.now(timezone.utc))
+        usage = self._usage.get(provider)
+        if usage is None or usage['period_start'] != period_start:
+            usage = {'period_start': period_start, 'used': 0, 'remaining': None}
+            self._usage[provider] = usage
+        return usage
+
+    def _remaining(self, provider: str, usage: Dict[str, Any]) -> int:
+        counted = self.budgets[provider]['limit'] - usage['used']
+        reported = usage.get('remaining')
+        return max(0, counted if reported is None else min(counted, reported))
+
+    def _period_start(self, provider: str, now: datetime) -> datetime:
+        if self.budgets[provider]['period'] == 'month':
+            return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _period_end(self, provider: str, usage: Dict[str, Any]) -> datetime:
+        start = usage['period_start']
+        if self.budgets[provider]['period'] == 'month':
+            return (start + timedelta(days=32)).replace(day=1)
+        return start + timedelta(days=1)
+
+    def _projected_exhaustion(self, provider: str, usage: Dict[str, Any], remaining: int) -> Optional[datetime]:
+        """When the quota runs out at the current spending pace, None if it lasts the period"""
+        now = datetime.now(timezone.utc)
+        period_end = self._period_end(provider, usage)
+        if remaining <= 0:
+            return now
+
+        spent = self.budgets[provider]['limit'] - remaining
+        elapsed = (now - usage['period_start']).total_seconds()
+        if spent <= 0 or elapsed <= 0:
+            return None
+
+        exhaustion = now + timedelta(seconds=remaining * elapsed / spent)
+        return exhaustion if exhaustion < period_end else None
+
+    def _load_state(self) -> None:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for provider, usage in state.items():
+            self._usage[provider] = {
+                'period_start': datetime.fromisoformat(usage['period_start']),
+                'used': usage['used'],
+                'remaining': usage.get('remaining')
+            }
+
+    def _save_state(self) -> None:
+        """Persist usage so restarts don't reset the budget; caller holds the lock"""
+        if not self.state_path:
+            return
+        state = {
+            provider: {**usage, 'period_start': usage['period_start'].isoformat()}
+            for provider, usage in self._usage.items()
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+_scheduler: Optional[QuotaScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_quota_scheduler() -> QuotaScheduler:
+    """Return the process-wide quota scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler.from_env()
+        return _scheduler
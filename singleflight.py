@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception). Once the call
+    finishes the key is forgotten, so later calls run again: this bounds
+    concurrent upstream work by distinct keys, it is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self.calls = 0
+        self.executions = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn for key, or wait for the identical call already in flight"""
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                self.executions += 1
+                future = Future()
+                self._in_flight[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Calls made, calls that executed and calls that shared an in-flight result"""
+        with self._lock:
+            return {'calls': self.calls, 'executions': self.executions, 'coalesced': self.calls - self.executions}
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(group: str) -> SingleFlight:
+    """Return the process-wide single-flight group for a kind of upstream call"""
+    with _groups_lock:
+        if group not in _groups:
+            _groups[group] = SingleFlight()
+        return _groups[group]
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Statistics of every single-flight group"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from flight_history import FlightHistory, get_flight_history
+from flight_ledger import get_flight_ledger
+from snapshot_store import SnapshotStore, get_snapshot_store
+from utils import DEDUP_KEYS, KEY_INDEX_MAX_KEYS, KeyIndex
+
+# Seconds between sweeps of the snapshot store into the flight history
+SNAPSHOT_ARCHIVE_INTERVAL = float(os.environ.get("SNAPSHOT_ARCHIVE_INTERVAL", 30))
+
+
+class SnapshotArchiver:
+    """
+    Stores the OpenSky snapshots of the shared snapshot store in the flight
+    history, whichever app process fetched them
+
+    Only the process that owns the history (see FlightHistory) can write it,
+    and it is not necessarily the one that fetched a snapshot. So the owner
+    sweeps the store on every fetch and on a background thread, and
+    cleans and appends each region's snapshot files newer than the last one
+    it archived. Appends are keyed on (region, snapshot time), so offering a
+    snapshot twice stores it once. The sweep interval has to stay well below
+    the store's keep x fetch interval, or files are pruned before they are
+    archived. The background sweep also mirrors the shared AviationStack
+    ledger (FlightHistory.sync_ledger), so the owner picks up flights that
+    other processes synced while it fetches nothing itself.
+    """
+
+    def __init__(self, store: Optional[SnapshotStore] = None, interval: float = SNAPSHOT_ARCHIVE_INTERVAL):
+        self.store = store
+        self.interval = interval
+        # Newest snapshot time archived (or found stored) per region
+        self._archived: Dict[str, int] = {}
+        # State vectors already archived per region, as in the fetch path's key index
+        self._keys: Dict[str, KeyIndex] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def sweep(self, history: FlightHistory, clean: Callable[[pd.DataFrame], pd.DataFrame],
+              region: Optional[str] = None, cleaned: Optional[Tuple[int, pd.DataFrame]] = None) -> int:
+        """
+        Archive the stored snapshots of a region (every region if None) not
+        archived yet; returns how many were stored
+
+        Args:
+            history: Flight history store (owned by this process)
+            clean: Turns a raw stored snapshot into archived rows
+            region: Region to sweep
+            cleaned: (snapshot time, rows) of a snapshot the caller already
+                cleaned, used instead of reading and cleaning its file again
+        """
+        store = self.store or get_snapshot_store()
+        stored = 0
+        with self._lock:
+            for name in ([region] if region is not None else store.regions()):
+                for snapshot_time, path in store.snapshots(name):
+                    if snapshot_time <= self._archived.get(name, 0):
+                        continue
+                    if cleaned is not None and name == region and snapshot_time == cleaned[0]:
+                        frame = cleaned[1]
+                    else:
+                        try:
+                            frame = clean(store.read(path))
+                        except (OSError, pa.ArrowInvalid):
+                            # Pruned by the process that wrote a newer snapshot
+                            continue
+                    stored += self._archive(history, name, snapshot_time, frame)
+        return stored
+
+    def archive(self, history: FlightHistory, region: str, snapshot_time: int, frame: pd.DataFrame) -> bool:
+        """Archive one cleaned snapshot directly, e.g. one that could not be shared"""
+        with self._lock:
+            return self._archive(history, region, snapshot_time, frame)
+
+    def start(self, clean: Callable[[pd.DataFrame], pd.DataFrame]) -> "SnapshotArchiver":
+        """Sweep every interval seconds on a daemon thread, once per process"""
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(clean,), name="snapshot-archiver", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self, clean: Callable[[pd.DataFrame], pd.DataFrame]) -> None:
+        while True:
+            try:
+                # Raises HistoryLocked in every process but the owner, which may change
+                history = get_flight_history()
+                self.sweep(history, clean)
+                history.sync_ledger(get_flight_ledger())
+            except Exception:
+                # Retried on the next sweep; fetches surface history errors
+                pass
+            time.sleep(self.interval)
+
+    def _archive(self, history: FlightHistory, region: str, snapshot_time: int, frame: pd.DataFrame) -> bool:
+        """Append a snapshot unless it is stored already; caller holds the lock"""
+        at = pd.to_datetime(snapshot_time, unit='s')
+        if history.has_snapshot(region, at):
+            self._archived[region] = max(self._archived.get(region, 0), snapshot_time)
+            return False
+        if region not in self._keys:
+            self._keys[region] = KeyIndex(DEDUP_KEYS["opensky"], max_keys=KEY_INDEX_MAX_KEYS)
+        try:
+            history.append_snapshot(self._keys[region].filter_new(frame), region=region, snapshot_time=at)
+        except Exception:
+            # The failed rows' keys are registered already; forget them so a retry stores them
+            del self._keys[region]
+            raise
+        self._archived[region] = max(self._archived.get(region, 0), snapshot_time)
+        return True
+
+
+_archiver: Optional[SnapshotArchiver] = None
+_archiver_lock = threading.Lock()
+
+
+def get_snapshot_archiver() -> SnapshotArchiver:
+    """Return the process-wide snapshot archiver, created on first use"""
+    global _archiver
+    with _archiver_lock:
+        if _archiver is None:
+            _archiver = SnapshotArchiver()
+        return _archiver
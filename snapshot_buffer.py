@@ -0,0 +1,222 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Bytes of records kept per region; the oldest snapshots are overwritten beyond it
+SNAPSHOT_BUFFER_BYTES = int(os.environ.get("SNAPSHOT_BUFFER_BYTES", 16 * 1024 * 1024))
+
+# One aircraft position, packed: 50 bytes against several hundred as a DataFrame row
+RECORD_DTYPE = np.dtype([
+    ('icao24', 'u4'),
+    ('callsign', 'S8'),
+    ('country', 'u2'),
+    ('airline_icao', 'S3'),
+    ('nearest_airport', 'S4'),
+    ('last_contact', 'u4'),
+    ('latitude', 'f4'),
+    ('longitude', 'f4'),
+    ('altitude_ft', 'f4'),
+    ('speed_mph', 'f4'),
+    ('true_track', 'f4'),
+    ('vertical_rate', 'f4'),
+    ('on_ground', '?')
+])
+
+# Fields that map onto DataFrame columns without conversion
+NUMERIC_FIELDS = ('last_contact', 'latitude', 'longitude', 'altitude_ft', 'speed_mph',
+                  'true_track', 'vertical_rate', 'on_ground')
+
+# Vertical rate (m/s) beyond which an aircraft counts as climbing or descending
+CLIMB_RATE = 1.0
+
+
+class SnapshotRingBuffer:
+    """
+    Fixed-memory ring of the most recent OpenSky snapshots of one region
+
+    Records live in one structured array preallocated from a byte cap. Each
+    snapshot is written as a contiguous run of rows, wrapping to the start
+    when it does not fit at the end, and snapshots whose rows are overwritten
+    are forgotten. Reads return read-only views of those runs, so the live
+    map and recent-activity metrics cost no copies, disk or network I/O.
+    Views stay valid until the ring wraps over them; copy to keep them longer.
+    """
+
+    def __init__(self, max_bytes: int = SNAPSHOT_BUFFER_BYTES):
+        capacity = max_bytes // RECORD_DTYPE.itemsize
+        if capacity < 1:
+            raise ValueError(f"max_bytes must hold at least one {RECORD_DTYPE.itemsize}-byte record")
+
+        self.max_bytes = max_bytes
+        self._records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self._head = 0
+        # (snapshot_time, start, stop) of each buffered snapshot, oldest first
+        self._segments: Deque[Tuple[float, int, int]] = deque()
+        self._countries: List[str] = []
+        self._country_codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return len(self._records)
+
+    def append(self, snapshot: pd.DataFrame, snapshot_time: Optional[float] = None) -> None:
+        """
+        Pack a cleaned snapshot into the ring
+
+        Args:
+            snapshot: Cleaned state vectors (data_fetcher's OpenSky columns)
+            snapshot_time: Epoch seconds of the snapshot (latest last_contact if None)
+        """
+        if snapshot.empty:
+            return
+        if snapshot_time is None:
+            snapshot_time = float(snapshot['last_contact'].max())
+        # A snapshot larger than the whole ring keeps its most recent contacts
+        if len(snapshot) > self.capacity:
+            snapshot = snapshot.nlargest(self.capacity, 'last_contact')
+
+        with self._lock:
+            packed = self._pack(snapshot)
+            count = len(packed)
+            if self._head + count > self.capacity:
+                self._head = 0
+            start, stop = self._head, self._head + count
+
+            self._segments = deque(
+                segment for segment in self._segments
+                if segment[2] <= start or segment[1] >= stop
+            )
+            self._records[start:stop] = packed
+            self._segments.append((float(snapshot_time), start, stop))
+            self._head = stop
+
+    def snapshots(self, since: Optional[float] = None) -> List[Tuple[float, np.ndarray]]:
+        """Read-only record views of the buffered snapshots taken at or after since, oldest first"""
+        with self._lock:
+            segments = [segment for segment in self._segments if since is None or segment[0] >= since]
+            return [(snapshot_time, self._view(start, stop)) for snapshot_time, start, stop in segments]
+
+    def latest(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """The most recent snapshot as a DataFrame over the ring (see frame)"""
+        buffered = self.snapshots()
+        records = buffered[-1][1] if buffered else self._records[:0]
+        return self.frame(records, columns)
+
+    def frame(self, records: np.ndarray, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        DataFrame over a run of records
+
+        Numeric columns are views of the ring; icao24, callsign, origin_country,
+        airline_icao and nearest_airport are decoded to strings, which copies,
+        so leave them out of columns when they are not needed.
+        """
+        columns = list(columns) if columns is not None else ['icao24', 'callsign', 'origin_country', *NUMERIC_FIELDS]
+        data = {}
+        for column in columns:
+            if column in NUMERIC_FIELDS:
+                data[column] = records[column]
+            elif column == 'icao24':
+                data[column] = np.char.mod('%06x', records['icao24'])
+            elif column == 'origin_country':
+                names = np.array(self._countries or [''], dtype=object)
+                data[column] = names[records['country']]
+            elif column in ('callsign', 'airline_icao', 'nearest_airport'):
+                data[column] = np.char.decode(records[column], 'ascii')
+            else:
+                raise KeyError(f"Unknown snapshot buffer column: {column}")
+        return pd.DataFrame(data, copy=False)
+
+    def activity(self, window_seconds: float) -> Dict:
+        """Recent-activity metrics over the snapshots of the last window_seconds"""
+        buffered = self.snapshots()
+        if not buffered:
+            return {'snapshots': 0, 'aircraft_seen': 0, 'airborne': 0, 'climbing': 0, 'descending': 0,
+                    'avg_altitude_ft': None, 'avg_speed_mph': None, 'span_seconds': 0.0}
+
+        latest_time, latest = buffered[-1]
+        recent = [(snapshot_time, records) for snapshot_time, records in buffered
+                  if snapshot_time >= latest_time - window_seconds]
+        seen = np.unique(np.concatenate([records['icao24'] for _, records in recent]))
+
+        airborne = latest[~latest['on_ground']]
+        return {
+            'snapshots': len(recent),
+            'aircraft_seen': int(len(seen)),
+            'airborne': int(len(airborne)),
+            'climbing': int((airborne['vertical_rate'] > CLIMB_RATE).sum()),
+            'descending': int((airborne['vertical_rate'] < -CLIMB_RATE).sum()),
+            'avg_altitude_ft': float(np.nanmean(airborne['altitude_ft'])) if len(airborne) else None,
+            'avg_speed_mph': float(np.nanmean(airborne['speed_mph'])) if len(airborne) else None,
+            'span_seconds': latest_time - recent[0][0]
+        }
+
+    def stats(self) -> Dict:
+        """Occupancy of the ring"""
+        with self._lock:
+            rows = sum(stop - start for _, start, stop in self._segments)
+            return {
+                'snapshots': len(self._segments),
+                'records': rows,
+                'capacity': self.capacity,
+                'bytes_used': rows * RECORD_DTYPE.itemsize,
+                'max_bytes': self.max_bytes,
+                'oldest': self._segments[0][0] if self._segments else None,
+                'newest': self._segments[-1][0] if self._segments else None
+            }
+
+    def _view(self, start: int, stop: int) -> np.ndarray:
+        view = self._records[start:stop]
+        view.flags.writeable = False
+        return view
+
+    def _pack(self, snapshot: pd.DataFrame) -> np.ndarray:
+        packed = np.zeros(len(snapshot), dtype=RECORD_DTYPE)
+        packed['icao24'] = [_parse_icao24(value) for value in snapshot['icao24']]
+        packed['country'] = [self._country_code(value) for value in snapshot['origin_country']]
+        for column in ('callsign', 'airline_icao', 'nearest_airport'):
+            if column in snapshot.columns:
+                packed[column] = _ascii(snapshot[column], RECORD_DTYPE[column].itemsize)
+        for column in NUMERIC_FIELDS:
+            if column in snapshot.columns:
+                packed[column] = snapshot[column].fillna(0 if column in ('last_contact', 'on_ground') else np.nan)
+        return packed
+
+    def _country_code(self, name) -> int:
+        name = name if isinstance(name, str) else ''
+        code = self._country_codes.get(name)
+        if code is None:
+            code = self._country_codes[name] = len(self._countries)
+            self._countries.append(name)
+        return code
+
+
+def _parse_icao24(value) -> int:
+    """24-bit ICAO address from its hex string (0 if malformed)"""
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _ascii(values: pd.Series, width: int) -> np.ndarray:
+    """Fixed-width ASCII bytes of a string column, truncated to width"""
+    text = values.fillna('').astype(str).str.strip().str[:width]
+    return text.str.encode('ascii', errors='replace').to_numpy().astype(f'S{width}')
+
+
+_buffers: Dict[str, SnapshotRingBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_snapshot_buffer(region: str) -> SnapshotRingBuffer:
+    """Return the process-wide ring of recent snapshots for a region (country bounding box)"""
+    with _buffers_lock:
+        if region not in _buffers:
+            _buffers[region] = SnapshotRingBuffer()
+        return _buffers[region]
@@ -0,0 +1,168 @@
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Event types, in the order they are reported
+EVENTS = ('appeared', 'vanished', 'took_off', 'landed')
+
+# State vector fields reported with each event
+_FIELDS = ('icao24', 'callsign', 'origin_country', 'latitude', 'longitude', 'baro_altitude', 'last_contact')
+
+# Hex digit values by ASCII code, for parsing icao24 addresses
+_HEX_DIGITS = np.zeros(256, dtype=np.uint32)
+_HEX_DIGITS[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+_HEX_DIGITS[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+_HEX_DIGITS[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+_HEX_SHIFTS = np.arange(20, -1, -4, dtype=np.uint32)
+
+
+def icao24_keys(values: pd.Series) -> np.ndarray:
+    """24-bit ICAO addresses as integers, parsed without a Python loop (0 if malformed)"""
+    try:
+        # Arrow lays six-character strings out as one contiguous byte buffer
+        fixed = pa.array(values)
+        if isinstance(fixed, pa.ChunkedArray):
+            fixed = fixed.combine_chunks()
+        fixed = fixed.cast(pa.binary(6))
+        digits = np.frombuffer(fixed.buffers()[1], dtype=np.uint8, count=6 * len(fixed)).reshape(-1, 6)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        digits = values.fillna('').to_numpy(dtype='S6').view(np.uint8).reshape(-1, 6)
+    return (_HEX_DIGITS[digits] << _HEX_SHIFTS).sum(axis=1, dtype=np.uint32)
+
+
+class _AlignedSnapshot:
+    """One snapshot's aircraft sorted by icao24, one row (the latest contact) per aircraft"""
+
+    def __init__(self, snapshot: pd.DataFrame, snapshot_time: float):
+        keys = icao24_keys(snapshot['icao24'])
+        last_contact = snapshot['last_contact'].to_numpy(dtype=np.float64)
+        order = np.lexsort((-last_contact, keys))
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+
+        self.time = snapshot_time
+        self.keys = keys[first]
+        self.rows = order[first]
+        self.snapshot = snapshot[[field for field in _FIELDS if field in snapshot.columns]]
+        self.on_ground = snapshot['on_ground'].fillna(False).to_numpy(dtype=bool)[self.rows]
+
+    def take(self, aligned_rows: np.ndarray) -> pd.DataFrame:
+        """State vectors of the aircraft at aligned_rows"""
+        return self.snapshot.iloc[self.rows[aligned_rows]]
+
+
+def diff_snapshots(previous: _AlignedSnapshot, current: _AlignedSnapshot) -> pd.DataFrame:
+    """
+    Events between two aligned snapshots
+
+    A merge-join of the sorted icao24 keys (searchsorted) matches the
+    aircraft in both; the rest appeared or vanished. Matched aircraft that
+    changed on_ground took off or landed. Vanished aircraft are reported
+    with their last known state, everything else with the current one.
+    """
+    position = np.searchsorted(previous.keys, current.keys)
+    if len(previous.keys):
+        matched = previous.keys[np.minimum(position, len(previous.keys) - 1)] == current.keys
+    else:
+        matched = np.zeros(len(current.keys), dtype=bool)
+    seen_again = np.zeros(len(previous.keys), dtype=bool)
+    seen_again[position[matched]] = True
+
+    current_rows = np.flatnonzero(matched)
+    previous_rows = position[matched]
+    was_grounded = previous.on_ground[previous_rows]
+    is_grounded = current.on_ground[current_rows]
+
+    # Aligned rows of current per event type, in EVENTS order after 'vanished'
+    current_events = {
+        'appeared': np.flatnonzero(~matched),
+        'took_off': current_rows[was_grounded & ~is_grounded],
+        'landed': current_rows[~was_grounded & is_grounded]
+    }
+    vanished = np.flatnonzero(~seen_again)
+
+    # Gather each snapshot's event rows once, then label them
+    events = pd.concat([
+        current.take(np.concatenate(list(current_events.values()))),
+        previous.take(vanished)
+    ], ignore_index=True)
+    labels = [EVENTS.index(event) for event in current_events] + [EVENTS.index('vanished')]
+    sizes = [len(rows) for rows in current_events.values()] + [len(vanished)]
+    events.insert(0, 'event', pd.Categorical.from_codes(np.repeat(labels, sizes), categories=EVENTS))
+    events.insert(1, 'time', pd.to_datetime(current.time, unit='s'))
+    return events
+
+
+class SnapshotDeltaEngine:
+    """
+    Turns successive raw OpenSky snapshots of one region into event streams:
+    aircraft that appeared, vanished, took off or landed
+
+    Snapshots must include on-ground aircraft, which the cleaned data drops.
+    They are fetched for the region's bounding box, so an aircraft that
+    leaves the box is reported as vanished and one that enters as appeared.
+    The previous snapshot is kept aligned (sorted by icao24), so each new
+    one costs one sort of integer keys plus vectorized joins, and only the
+    event rows are materialized. Recent events are kept up to max_events.
+    """
+
+    def __init__(self, max_events: int = 20000):
+        self.max_events = max_events
+        self.events = self._empty_events()
+        self._previous: Optional[_AlignedSnapshot] = None
+        self._lock = threading.Lock()
+
+    def ingest(self, snapshot: pd.DataFrame, snapshot_time: Optional[float] = None) -> pd.DataFrame:
+        """
+        Add one snapshot of raw state vectors and return the events since the previous one
+
+        Args:
+            snapshot: State vectors with icao24, on_ground and last_contact
+            snapshot_time: Unix time of the snapshot; defaults to the newest last_contact
+        """
+        if snapshot.empty:
+            return self._empty_events()
+        if snapshot_time is None:
+            snapshot_time = float(snapshot['last_contact'].max())
+        current = _AlignedSnapshot(snapshot, snapshot_time)
+
+        with self._lock:
+            previous, self._previous = self._previous, current
+            if previous is None or previous.time >= current.time:
+                return self._empty_events()
+            events = diff_snapshots(previous, current)
+            if len(events):
+                # Rebind rather than mutate so readers always see a consistent frame
+                combined = pd.concat([self.events, events], ignore_index=True) if len(self.events) else events
+                self.events = combined.tail(self.max_events).reset_index(drop=True)
+            return events
+
+    def counts(self, since: Optional[pd.Timestamp] = None) -> Dict[str, int]:
+        """Events per type, optionally only those at or after since"""
+        events = self.events
+        if since is not None:
+            events = events[events['time'] >= since]
+        return {event: int(count) for event, count in events['event'].value_counts().reindex(EVENTS, fill_value=0).items()}
+
+    @staticmethod
+    def _empty_events() -> pd.DataFrame:
+        frame = pd.DataFrame(columns=['event', 'time', *_FIELDS])
+        frame['event'] = pd.Categorical(frame['event'], categories=EVENTS)
+        return frame
+
+
+_engines: Dict[str, SnapshotDeltaEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_delta_engine(region: str) -> SnapshotDeltaEngine:
+    """Return the process-wide delta engine for a region (country bounding box)"""
+    with _engines_lock:
+        if region not in _engines:
+            _engines[region] = SnapshotDeltaEngine()
+        return _engines[region]
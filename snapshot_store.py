@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Strings are read as pandas' Arrow-backed string dtype (the default from
+# pandas 3), so they stay in the mapped file; older pandas would otherwise
+# copy every value into a Python object
+STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+
+
+class SnapshotStore:
+    """
+    Raw OpenSky snapshots shared between app processes as Arrow IPC files
+
+    The process that fetches a region's snapshot writes it once; every other
+    process opens the file memory-mapped instead of fetching and decoding it
+    again. Numeric and string columns are handed to pandas without copying,
+    so all processes read the same page-cache pages and a load costs little
+    more than the mmap call. Floats are written with NaN as a value rather
+    than as nulls to keep them zero-copy on the way back.
+    """
+
+    def __init__(self, directory: str = "snapshot_store", keep: int = 3):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "SnapshotStore":
+        """Create a store at SNAPSHOT_STORE_DIR"""
+        return cls(os.environ.get("SNAPSHOT_STORE_DIR", "snapshot_store"))
+
+    def write(self, region: str, snapshot_time: float, frame: pd.DataFrame) -> str:
+        """Store a region's snapshot, replacing older ones beyond keep; returns its path"""
+        directory = self._region_directory(region)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{int(snapshot_time)}.arrow")
+
+        table = self._to_table(frame)
+        # Readers only ever see complete files
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(partial, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(partial, path)
+
+        # Mapped files stay readable after unlinking, so readers are unaffected
+        for stale in self._snapshot_paths(region)[:-self.keep]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        return path
+
+    def latest(self, region: str, max_age: Optional[float] = None) -> Optional[Tuple[int, pd.DataFrame]]:
+        """
+        The region's newest snapshot as (snapshot time, DataFrame over the
+        mapped file), or None if there is none younger than max_age seconds
+        """
+        paths = self._snapshot_paths(region)
+        if not paths:
+            return None
+        snapshot_time = int(os.path.basename(paths[-1]).split('.')[0])
+        if max_age is not None and time.time() - snapshot_time > max_age:
+            return None
+        try:
+            return snapshot_time, self.read(paths[-1])
+        except (OSError, pa.ArrowInvalid):
+            # Pruned by another process between listing and opening
+            return None
+
+    def regions(self) -> List[str]:
+        """Regions with a stored snapshot directory"""
+        try:
+            return sorted(unquote(name) for name in os.listdir(self.directory)
+                          if os.path.isdir(os.path.join(self.directory, name)))
+        except FileNotFoundError:
+            return []
+
+    def snapshots(self, region: str) -> List[Tuple[int, str]]:
+        """The region's stored snapshots as (snapshot time, path), oldest first"""
+        return [(int(os.path.basename(path).split('.')[0]), path) for path in self._snapshot_paths(region)]
+
+    @staticmethod
+    def read(path: str) -> pd.DataFrame:
+        """Open a stored snapshot memory-mapped"""
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        return table.to_pandas(split_blocks=True, types_mapper={pa.string(): STRING_DTYPE, pa.large_string(): STRING_DTYPE}.get)
+
+    @staticmethod
+    def _to_table(frame: pd.DataFrame) -> pa.Table:
+        arrays: Dict[str, pa.Array] = {}
+        for column in frame.columns:
+            values = frame[column]
+            if pd.api.types.is_float_dtype(values.dtype):
+                arrays[column] = pa.array(values.to_numpy(), from_pandas=False)
+            else:
+                arrays[column] = pa.Array.from_pandas(values)
+                # pandas' string arrays use 64-bit offsets, so large strings load without a cast
+                if pa.types.is_string(arrays[column].type):
+                    arrays[column] = arrays[column].cast(pa.large_string())
+        # One record batch: columns split across batches are concatenated (copied) on load
+        return pa.table(arrays).combine_chunks()
+
+    def _region_directory(self, region: str) -> str:
+        return os.path.join(self.directory, quote(region, safe=''))
+
+    def _snapshot_paths(self, region: str) -> List[str]:
+        """Stored snapshot files of a region, oldest first"""
+        directory = self._region_directory(region)
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith('.arrow')]
+        except FileNotFoundError:
+            return []
+        names.sort(key=lambda name: int(name.split('.')[0]))
+        return [os.path.join(directory, name) for name in names]
+
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """Return the process-wide snapshot store, created on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore.from_env()
+        return _store
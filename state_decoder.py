@@ -0,0 +1,191 @@
+import codecs
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+_HEADER_TIME = re.compile(r'"time"\s*:\s*(-?\d+)')
+_STATES_START = re.compile(r'"states"\s*:\s*(\[|null)')
+
+# NumPy storage for fixed-width schema kinds; other columns (strings, sensors
+# lists) are converted batch by batch to pandas' default storage for them
+_KIND_DTYPES = {'float': np.float64, 'int': np.int64, 'bool': np.bool_}
+
+
+class StateVectorDecoder:
+    """
+    Incremental decoder for OpenSky ``/states/all`` response bodies
+
+    Feed the body in chunks as they arrive; each state vector is decoded on
+    its own and appended in batches to preallocated typed column arrays, so
+    the whole body is never held as bytes, as a Python object tree and as a
+    DataFrame at the same time. Complete vectors in each chunk are parsed with
+    a single json.loads call, so decoding runs mostly in C.
+    """
+
+    def __init__(self, columns: List[str], schema: Dict[str, str],
+                 batch_size: int = 1024, initial_rows: int = 8192):
+        self.columns = columns
+        self.batch_size = batch_size
+        self.time: Optional[int] = None
+
+        self._kinds = [schema.get(col) for col in columns]
+        self._arrays = {
+            i: np.empty(initial_rows, dtype=_KIND_DTYPES[kind])
+            for i, kind in enumerate(self._kinds) if kind in _KIND_DTYPES
+        }
+        # Under pandas' string dtype each batch of strings is stored compactly
+        # instead of as Python objects until the end
+        self._parts = {i: [] for i in range(len(columns)) if i not in self._arrays}
+        self._rows = 0
+        self._batch: List[list] = []
+
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._state = 'header'  # header -> states -> trailer
+
+    def feed(self, chunk: bytes) -> None:
+        """Decode every complete state vector available after adding a chunk of the body"""
+        self._buffer += self._text.decode(chunk)
+        self._parse()
+
+    def finish(self) -> Tuple[Optional[int], pd.DataFrame]:
+        """
+        Complete decoding once the whole body has been fed
+
+        Returns:
+            Snapshot time of the response (None if absent) and the state
+            vectors as a typed DataFrame
+        """
+        self._buffer += self._text.decode(b'', final=True)
+        self._parse()
+        if self._state == 'states':
+            raise ValueError("Truncated OpenSky response: state vector array is not closed")
+        if self.time is None:
+            self._find_time()
+        self._flush()
+
+        columns = {}
+        for i, col in enumerate(self.columns):
+            if i in self._arrays:
+                columns[col] = self._arrays[i][:self._rows]
+            elif self._parts[i]:
+                columns[col] = pd.concat(self._parts[i], ignore_index=True)
+            else:
+                columns[col] = pd.Series([], dtype=object)
+        # copy=False keeps each column's array as its own block instead of consolidating
+        frame = pd.DataFrame(columns, copy=False)
+        self._arrays, self._parts = {}, {}
+        return self.time, frame
+
+    def _parse(self) -> None:
+        if self._state == 'header':
+            self._find_time()
+            match = _STATES_START.search(self._buffer)
+            if match is None:
+                # The key may be split across chunks; wait for more data
+                return
+            if match.group(1) == 'null':
+                self._state = 'trailer'
+                self._buffer = self._buffer[match.end():]
+                return
+            self._state = 'states'
+            self._buffer = self._buffer[match.end():]
+
+        if self._state == 'states':
+            self._parse_states()
+
+        if self._state == 'trailer' and self.time is None:
+            self._find_time()
+
+    def _parse_states(self) -> None:
+        buffer, decode = self._buffer, self._json.raw_decode
+        pos, end = 0, len(buffer)
+        width = len(self.columns)
+        bulk = True
+
+        while True:
+            while pos < end and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == end:
+                break
+            if buffer[pos] == ']':
+                self._state = 'trailer'
+                pos += 1
+                break
+
+            rows = None
+            if bulk:
+                # Decode every complete vector in the buffer with one C-level parse. A cut
+                # inside a nested list or a string leaves unbalanced JSON and fails, in
+                # which case the rest of this buffer is decoded vector by vector.
+                cut = buffer.rfind('],', pos)
+                if cut > pos:
+                    try:
+                        rows = json.loads('[' + buffer[pos:cut + 1] + ']')
+                        pos = cut + 1
+                    except json.JSONDecodeError:
+                        bulk = False
+            if rows is None:
+                try:
+                    row, pos = decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Incomplete vector at the end of the chunk; wait for more data
+                    break
+                rows = [row]
+
+            for row in rows:
+                if len(row) != width:
+                    row = (row + [None] * width)[:width]
+                self._batch.append(row)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+        self._buffer = buffer[pos:]
+
+    def _find_time(self) -> None:
+        match = _HEADER_TIME.search(self._buffer)
+        if match is not None:
+            self.time = int(match.group(1))
+
+    def _flush(self) -> None:
+        """Convert the pending batch column by column into the typed arrays"""
+        if not self._batch:
+            return
+        count = len(self._batch)
+        start, stop = self._rows, self._rows + count
+
+        capacity = len(next(iter(self._arrays.values()))) if self._arrays else stop
+        if stop > capacity:
+            capacity = max(stop, 2 * capacity)
+            for i, array in self._arrays.items():
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:start] = array[:start]
+                self._arrays[i] = grown
+
+        for i, values in enumerate(zip(*self._batch)):
+            kind = self._kinds[i]
+            if kind == 'float':
+                # None becomes NaN
+                self._arrays[i][start:stop] = np.array(values, dtype=np.float64)
+            elif kind in ('int', 'bool'):
+                # Integer and flag fields are never null in OpenSky responses
+                self._arrays[i][start:stop] = [0 if v is None else v for v in values]
+            else:
+                # fromiter keeps list values (sensors) as single objects
+                self._parts[i].append(pd.Series(np.fromiter(values, dtype=object, count=count)).infer_objects())
+
+        self._rows = stop
+        self._batch = []
+
+
+def decode_states(chunks: Iterable[bytes], columns: List[str], schema: Dict[str, str]) -> Tuple[Optional[int], pd.DataFrame]:
+    """Decode a streamed OpenSky states response into (snapshot time, typed DataFrame)"""
+    decoder = StateVectorDecoder(columns, schema)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.finish()
@@ -1,8 +1,23 @@
 import streamlit as st
 import pandas as pd
-from typing import Any, Dict, Optional
+import numpy as np
+from typing import Any, Dict, List, Optional
+import os
+import threading
 import time
 from datetime import datetime, timedelta
+from jobs import current_job
+
+def notify(kind: str, message: str) -> None:
+    """
+    Show a message with st.error, st.warning, st.info or st.success, or keep
+    it on the background job running on this thread for its session to show
+    """
+    job = current_job()
+    if job is not None:
+        job.notify(kind, message)
+    else:
+        getattr(st, kind)(message)
 
 def format_currency(amount: float, currency: str = "USD") -> str:
     """Format currency values for display"""
@@ -144,27 +159,206 @@ def format_percentage(value: float, decimals: int = 1) -> str:
     except:
         return "0.0%"
 
-def clean_flight_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Clean and standardize flight data"""
+# Identity key of a flight record for each data source
+DEDUP_KEYS = {
+    "opensky": ['icao24', 'last_contact'],
+    "aviationstack": ['flight_number', 'departure_time']
+}
+
+def detect_source(df: pd.DataFrame) -> Optional[str]:
+    """Data source of a DataFrame, based on which source's identity key columns it has"""
+    for source, keys in DEDUP_KEYS.items():
+        if all(col in df.columns for col in keys):
+            return source
+    return None
+
+def hash_keys(df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    """64-bit hash of each row's key columns"""
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+def dedupe_by_key(df: pd.DataFrame, keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Drop rows whose identity key was already seen, hashing only the key columns"""
+    if df.empty:
+        return df
+    keys = keys or DEDUP_KEYS.get(detect_source(df))
+    if not keys:
+        return df.drop_duplicates()
+    
+    duplicated = pd.Series(hash_keys(df, keys)).duplicated().to_numpy()
+    return df[~duplicated] if duplicated.any() else df
+
+# Identity keys remembered per source and region before the oldest are forgotten
+KEY_INDEX_MAX_KEYS = int(os.environ.get("KEY_INDEX_MAX_KEYS", 200_000))
+
+class KeyIndex:
+    """
+    Hash index of identity keys already stored, for incremental deduplication
+    
+    Filtering a new batch hashes only the batch's key columns and probes a
+    set, so merging a page costs O(new rows) regardless of how much is stored.
+    With max_keys, keys are kept in two generations and the older one is
+    dropped once the newer fills half of max_keys, bounding memory while
+    recent keys (the ones later batches repeat) stay indexed.
+    """
+    
+    def __init__(self, keys: List[str], max_keys: Optional[int] = None):
+        self.keys = keys
+        self.max_keys = max_keys
+        self._seen: set = set()
+        self._previous: set = set()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._seen) + len(self._previous)
+    
+    def add(self, df: pd.DataFrame) -> None:
+        """Register the keys of rows that are already stored"""
+        if not df.empty:
+            with self._lock:
+                self._remember(hash_keys(df, self.keys).tolist())
+    
+    def filter_new(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return only rows whose key is not stored yet (first occurrence within the batch), and register them"""
+        if df.empty:
+            return df
+        
+        hashes = hash_keys(df, self.keys)
+        with self._lock:
+            seen, previous = self._seen, self._previous
+            is_new = np.fromiter((h not in seen and h not in previous for h in hashes.tolist()),
+                                 dtype=bool, count=len(hashes))
+            is_new &= ~pd.Series(hashes).duplicated().to_numpy()
+            self._remember(hashes[is_new].tolist())
+        return df[is_new] if not is_new.all() else df
+    
+    def merge(self, stored: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        """Append the rows of new that are not in stored yet"""
+        fresh = self.filter_new(new)
+        if fresh.empty:
+            return stored
+        if stored.empty:
+            return fresh.reset_index(drop=True)
+        return pd.concat([stored, fresh], ignore_index=True)
+    
+    def _remember(self, hashes: List[int]) -> None:
+        """Add hashes to the newest generation, retiring the older one when full; caller holds the lock"""
+        self._seen.update(hashes)
+        if self.max_keys is not None and len(self._seen) >= self.max_keys // 2:
+            self._previous, self._seen = self._seen, set()
+
+_key_indexes: Dict[tuple, KeyIndex] = {}
+_key_indexes_lock = threading.Lock()
+
+def get_key_index(source: str, region: str) -> KeyIndex:
+    """Return the process-wide index of a source's stored record keys for a region"""
+    with _key_indexes_lock:
+        if (source, region) not in _key_indexes:
+            _key_indexes[(source, region)] = KeyIndex(DEDUP_KEYS[source], max_keys=KEY_INDEX_MAX_KEYS)
+        return _key_indexes[(source, region)]
+
+# Column types of each data source's flight records. Kinds: 'string', 'trimmed'
+# (string padded by the source), 'float', 'int', 'bool' and 'datetime'.
+# Columns left out (e.g. OpenSky sensors lists) pass through untouched.
+FLIGHT_SCHEMAS = {
+    "opensky": {
+        'icao24': 'string', 'callsign': 'trimmed', 'origin_country': 'string',
+        'time_position': 'float', 'last_contact': 'int',
+        'longitude': 'float', 'latitude': 'float', 'baro_altitude': 'float',
+        'on_ground': 'bool', 'velocity': 'float', 'true_track': 'float',
+        'vertical_rate': 'float', 'geo_altitude': 'float', 'squawk': 'string',
+        'spi': 'bool', 'position_source': 'int'
+    },
+    "aviationstack": {
+        'flight_number': 'trimmed', 'flight_date': 'string',
+        'airline': 'trimmed', 'airline_iata': 'string',
+        'origin': 'string', 'origin_airport': 'trimmed',
+        'destination': 'string', 'destination_airport': 'trimmed',
+        'departure_time': 'datetime', 'arrival_time': 'datetime',
+        'flight_status': 'string', 'aircraft_type': 'string',
+        'departure_delay': 'float', 'arrival_delay': 'float'
+    }
+}
+
+def _needs_conversion(series: pd.Series, kind: str) -> bool:
+    """Whether a column's dtype differs from its declared kind"""
+    dtype = series.dtype
+    if kind in ('string', 'trimmed'):
+        return not (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype))
+    if kind == 'float':
+        return not pd.api.types.is_float_dtype(dtype)
+    if kind == 'int':
+        return not pd.api.types.is_integer_dtype(dtype)
+    if kind == 'bool':
+        return not pd.api.types.is_bool_dtype(dtype)
+    if kind == 'datetime':
+        return not pd.api.types.is_datetime64_any_dtype(dtype)
+    raise ValueError(f"Unknown column kind: {kind}")
+
+def _convert_column(series: pd.Series, kind: str) -> pd.Series:
+    """Convert one column to its declared kind, keeping missing values missing"""
+    if kind in ('string', 'trimmed'):
+        # Stringify non-null values only, so None/NaN never become 'None'/'nan'
+        return series.where(series.isna(), series.astype(str))
+    if kind == 'float':
+        return pd.to_numeric(series, errors='coerce').astype('float64')
+    if kind == 'int':
+        numbers = pd.to_numeric(series, errors='coerce')
+        return numbers.astype('int64') if numbers.notna().all() else numbers.astype('Int64')
+    if kind == 'bool':
+        return series.astype('boolean')
+    if kind == 'datetime':
+        return pd.to_datetime(series, errors='coerce')
+    raise ValueError(f"Unknown column kind: {kind}")
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Type a DataFrame's columns according to a schema in one pass
+    
+    Only columns whose dtype differs from the schema are converted, and only
+    'trimmed' columns are stripped, so already-typed data costs a dtype check
+    per column. Returns a new DataFrame; the input is not modified.
+    """
+    converted = {}
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if _needs_conversion(series, kind):
+            series = _convert_column(series, kind)
+        if kind == 'trimmed':
+            series = series.str.strip()
+        if series is not df[col]:
+            converted[col] = series
+    
+    return df.assign(**converted) if converted else df
+
+def clean_flight_data(df: pd.DataFrame, source: Optional[str] = None) -> pd.DataFrame:
+    """
+    Clean and standardize flight data
+    
+    Args:
+        df: Flight records
+        source: Data source key of FLIGHT_SCHEMAS; detected from the identity
+            key columns when not given
+    """
     if df.empty:
         return df
     
     try:
-        # Remove duplicates
-        df = df.drop_duplicates()
+        source = source or detect_source(df)
         
-        # Clean string columns
-        string_columns = df.select_dtypes(include=['object']).columns
-        for col in string_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.strip()
-                df[col] = df[col].replace('nan', '')
+        # Remove duplicates by identity key; whole-row comparison only for unknown sources
+        df = dedupe_by_key(df, DEDUP_KEYS.get(source))
         
-        # Clean numeric columns
-        numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        if source in FLIGHT_SCHEMAS:
+            df = apply_schema(df, FLIGHT_SCHEMAS[source])
+        else:
+            # Unknown source: trim columns holding only strings, leave everything else alone
+            text_columns = [
+                col for col in df.select_dtypes(include=['object', 'string']).columns
+                if pd.api.types.infer_dtype(df[col], skipna=True) == 'string'
+            ]
+            df = apply_schema(df, {col: 'trimmed' for col in text_columns})
         
         # Sort by timestamp if available
         if 'timestamp' in df.columns: